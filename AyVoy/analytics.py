@@ -0,0 +1,253 @@
+"""Abordajes por hora y por tipo de tarjeta a partir de las horas de viaje de usuarios.txt.
+
+    python analytics.py --salida C:\\Python\\AyVoy\\USERS\\estadisticas
+    python analytics.py usuarios.20261016.txt usuarios.20261017.txt --workers 8
+
+Sin archivos se leen usuarios.txt y las instantáneas diarias que deja
+settle.py (usuarios.AAAAMMDD.txt). Cada archivo se parte en trozos de
+--chunk-mb alineados a fin de línea; un pool de procesos lee y cuenta cada
+trozo por su cuenta, sin cargar nunca un archivo completo, y el proceso
+principal suma los conteos parciales. Como en settle.py, un folio repetido
+es un solo usuario con los viajes de todas sus líneas, aunque las líneas
+caigan en trozos distintos. Escribe en --salida:
+
+    resumen.json         totales, usuarios y viajes por tipo de tarjeta y
+                         hora pico, en conjunto y por archivo
+    abordajes_hora.csv   abordajes por hora del día y tipo de tarjeta
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+from config import CARDS_PATH, DATA_PATH
+from settle import CARD_TYPES, GENERAL, numpy, read_cards, read_columns
+from storage import atomic_write
+
+BIN_MINUTES = 15  # Resolución del histograma interno
+BINS = 24 * 60 // BIN_MINUTES
+PEAK_MINUTES = 60  # Ventana de la hora pico, se recorre de BIN_MINUTES en BIN_MINUTES
+CHUNK_MB = 16
+
+
+@dataclass
+class RidershipStats:
+    """Conteos sumables: los de un trozo, los de un archivo o los de todos.
+
+    Las listas van por tipo de tarjeta, en el orden de CARD_TYPES.
+    """
+    registros: int = 0  # Folios distintos leídos (uno por día)
+    horas_invalidas: int = 0
+    usuarios: List[int] = field(default_factory=lambda: [0] * len(CARD_TYPES))
+    viajeros: List[int] = field(default_factory=lambda: [0] * len(CARD_TYPES))  # Con algún viaje
+    abordajes: List[List[int]] = field(default_factory=lambda: [[0] * BINS for _ in CARD_TYPES])
+
+    def merge(self, otro: "RidershipStats"):
+        self.registros += otro.registros
+        self.horas_invalidas += otro.horas_invalidas
+        for tipo in range(len(CARD_TYPES)):
+            self.usuarios[tipo] += otro.usuarios[tipo]
+            self.viajeros[tipo] += otro.viajeros[tipo]
+            self.abordajes[tipo] = [a + b for a, b in zip(self.abordajes[tipo], otro.abordajes[tipo])]
+
+    def totals(self) -> List[int]:
+        """Abordajes de todos los tipos por intervalo de BIN_MINUTES."""
+        return [sum(columna) for columna in zip(*self.abordajes)]
+
+    def hourly(self) -> List[List[int]]:
+        """Abordajes por hora del día (24 filas), un valor por tipo de tarjeta."""
+        por_hora = 60 // BIN_MINUTES
+        return [[sum(abordajes[h * por_hora:(h + 1) * por_hora]) for abordajes in self.abordajes]
+                for h in range(24)]
+
+    def peak(self) -> Tuple[int, int]:
+        """Inicio en minutos de la ventana de PEAK_MINUTES con más abordajes, y cuántos."""
+        totales = self.totals()
+        ancho = PEAK_MINUTES // BIN_MINUTES
+        ventana = sum(totales[:ancho])
+        mejor = (ventana, 0)
+        for inicio in range(1, BINS - ancho + 1):
+            ventana += totales[inicio + ancho - 1] - totales[inicio - 1]
+            if ventana > mejor[0]:
+                mejor = (ventana, inicio)
+        return mejor[1] * BIN_MINUTES, mejor[0]
+
+    def summary(self) -> Dict[str, object]:
+        inicio, viajes_pico = self.peak()
+        fin = inicio + PEAK_MINUTES
+        return {
+            "registros": self.registros,
+            "viajes": sum(self.totals()),
+            "horas_invalidas": self.horas_invalidas,
+            "hora_pico": {"inicio": f"{inicio // 60:02d}:{inicio % 60:02d}",
+                          "fin": f"{fin // 60 % 24:02d}:{fin % 60:02d}", "viajes": viajes_pico},
+            "por_tipo": {tipo: {"usuarios": self.usuarios[i], "viajeros": self.viajeros[i],
+                                "viajes": sum(self.abordajes[i])}
+                         for i, tipo in enumerate(CARD_TYPES)},
+        }
+
+
+# Tarjetas por folio en cada proceso del pool, se copian una vez al arrancarlo
+_tarjetas: Dict[str, str] = {}
+
+
+def _init_worker(tarjetas: Dict[str, str]):
+    global _tarjetas
+    _tarjetas = tarjetas
+    # El proceso sólo crea listas de líneas sin ciclos; ver settle.settle_lines
+    gc.disable()
+
+
+def _read_chunk(path: str, inicio: int, fin: int) -> bytes:
+    """Las líneas que empiezan entre ``inicio`` y ``fin``; la última se lee completa."""
+    with open(path, "rb") as archivo:
+        if inicio > 0:
+            archivo.seek(inicio - 1)
+            en_linea = archivo.read(1) != b"\n"
+        else:
+            en_linea = False
+        data = archivo.read(fin - inicio)
+        if data and not data.endswith(b"\n"):
+            data += archivo.readline()
+    if en_linea:
+        # Esa línea empezó antes: es del trozo anterior
+        corte = data.find(b"\n")
+        data = data[corte + 1:] if corte >= 0 else b""
+    return data
+
+
+def count_chunk(path: str, inicio: int, fin: int) -> Tuple[RidershipStats, List[str], List[str]]:
+    """Conteos de un trozo de ``path``, sus folios y los que viajaron; corre en un proceso del pool."""
+    lineas = _read_chunk(path, inicio, fin).decode("latin-1").splitlines(keepends=True)
+    columnas = read_columns(lineas, {}, _tarjetas)
+    stats = RidershipStats(registros=len(columnas.folios),
+                           horas_invalidas=columnas.minutos.count(-1))
+    n_tipos = len(CARD_TYPES)
+    if numpy is not None:
+        tipos = numpy.frombuffer(columnas.tipos, dtype=numpy.int8).astype(numpy.intp)
+        viajes = numpy.frombuffer(columnas.viajes, dtype=numpy.uint32)
+        minutos = numpy.frombuffer(columnas.minutos, dtype=numpy.int16)
+        tipo_viaje = numpy.repeat(tipos, viajes)
+        validas = minutos >= 0
+        casilla = tipo_viaje[validas] * BINS + minutos[validas] // BIN_MINUTES
+        stats.abordajes = numpy.bincount(casilla, minlength=n_tipos * BINS).reshape(n_tipos, BINS).tolist()
+        stats.usuarios = numpy.bincount(tipos, minlength=n_tipos).tolist()
+        stats.viajeros = numpy.bincount(tipos[viajes > 0], minlength=n_tipos).tolist()
+        return stats, columnas.folios, [columnas.folios[i] for i in numpy.flatnonzero(viajes).tolist()]
+
+    k = 0
+    for tipo, viajes in zip(columnas.tipos, columnas.viajes):
+        stats.usuarios[tipo] += 1
+        stats.viajeros[tipo] += viajes > 0
+        for minuto in columnas.minutos[k:k + viajes]:
+            if minuto >= 0:
+                stats.abordajes[tipo][minuto // BIN_MINUTES] += 1
+        k += viajes
+    return stats, columnas.folios, [folio for folio, viajes in zip(columnas.folios, columnas.viajes) if viajes]
+
+
+def _drop_repeated(stats: RidershipStats, folios: List[str], viajaron: List[str],
+                   vistos: Tuple[Set[str], Set[str]], tarjetas: Dict[str, str]):
+    """Descuenta de ``stats`` los folios que otro trozo del mismo archivo ya contó.
+
+    ``vistos`` son los folios ya contados del archivo y los que ya contaron como viajeros.
+    """
+    usuarios, viajeros = vistos
+    tipos = {tipo: i for i, tipo in enumerate(CARD_TYPES)}
+    for folio in usuarios.intersection(folios):
+        tipo = tipos[tarjetas.get(folio, GENERAL)]
+        stats.registros -= 1
+        stats.usuarios[tipo] -= 1
+    for folio in viajeros.intersection(viajaron):
+        stats.viajeros[tipos[tarjetas.get(folio, GENERAL)]] -= 1
+    usuarios.update(folios)
+    viajeros.update(viajaron)
+
+
+def chunks(path: str, size: int) -> List[Tuple[str, int, int]]:
+    total = os.path.getsize(path)
+    return [(path, inicio, min(inicio + size, total)) for inicio in range(0, total, size)]
+
+
+def default_files(usuarios: str) -> List[str]:
+    """usuarios.txt y sus instantáneas diarias, de la más antigua a la más reciente."""
+    base, extension = os.path.splitext(usuarios)
+    diarias = sorted(glob.glob(f"{glob.escape(base)}.[0-9]*{extension}"))
+    return diarias + ([usuarios] if os.path.exists(usuarios) else [])
+
+
+def analyze(archivos: List[str], tarjetas: Dict[str, str], workers: int = None,
+            chunk_size: int = CHUNK_MB << 20) -> Tuple[RidershipStats, Dict[str, RidershipStats]]:
+    """Conteos de todos los archivos juntos y de cada uno."""
+    total = RidershipStats()
+    por_archivo = {archivo: RidershipStats() for archivo in archivos}
+    # Folios ya contados de cada archivo, hasta que llegan todos sus trozos
+    vistos: Dict[str, Tuple[Set[str], Set[str]]] = {archivo: (set(), set()) for archivo in archivos}
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tarjetas,)) as pool:
+        futuros = {pool.submit(count_chunk, *trozo): trozo[0]
+                   for archivo in archivos for trozo in chunks(archivo, chunk_size)}
+        pendientes = Counter(futuros.values())
+        for futuro in as_completed(futuros):
+            archivo = futuros[futuro]
+            parcial, folios, viajaron = futuro.result()
+            _drop_repeated(parcial, folios, viajaron, vistos[archivo], tarjetas)
+            pendientes[archivo] -= 1
+            if not pendientes[archivo]:
+                del vistos[archivo]
+            por_archivo[archivo].merge(parcial)
+            total.merge(parcial)
+    return total, por_archivo
+
+
+def write_summary(salida: str, total: RidershipStats, por_archivo: Dict[str, RidershipStats]):
+    os.makedirs(salida, exist_ok=True)
+    resumen = total.summary()
+    resumen["archivos"] = {os.path.basename(archivo): stats.summary() for archivo, stats in por_archivo.items()}
+    atomic_write(os.path.join(salida, "resumen.json"),
+                 [json.dumps(resumen, ensure_ascii=False, indent=2), "\n"], encoding="utf-8")
+    encabezado = ",".join(["hora", *CARD_TYPES, "total"]) + "\n"
+    filas = (f"{hora:02d}:00,{','.join(map(str, fila))},{sum(fila)}\n"
+             for hora, fila in enumerate(total.hourly()))
+    atomic_write(os.path.join(salida, "abordajes_hora.csv"), [encabezado, *filas], encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("archivos", nargs="*", help="usuarios.txt o instantáneas diarias")
+    parser.add_argument("--usuarios", default=f"{DATA_PATH}/usuarios.txt",
+                        help="de dónde tomar los archivos si no se dan")
+    parser.add_argument("--tarjetas", default=CARDS_PATH)
+    parser.add_argument("--salida", default=f"{DATA_PATH}/estadisticas")
+    parser.add_argument("--workers", type=int, default=None, help="procesos (por omisión, uno por núcleo)")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_MB, help="tamaño de cada trozo en MB")
+    args = parser.parse_args()
+
+    archivos = args.archivos or default_files(args.usuarios)
+    if not archivos:
+        parser.error(f"No hay archivos de usuarios junto a {args.usuarios}")
+    inicio = time.perf_counter()
+    try:
+        total, por_archivo = analyze(archivos, read_cards(args.tarjetas), args.workers, args.chunk_mb << 20)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+    write_summary(args.salida, total, por_archivo)
+
+    resumen = total.summary()
+    pico = resumen["hora_pico"]
+    print(f"{len(archivos)} archivos, {resumen['registros']} registros, {resumen['viajes']} viajes "
+          f"en {time.perf_counter() - inicio:.1f} s")
+    print(f"  hora pico {pico['inicio']}-{pico['fin']}: {pico['viajes']} viajes")
+    for tipo, datos in resumen["por_tipo"].items():
+        if datos["usuarios"]:
+            print(f"  {tipo:<14} {datos['usuarios']} usuarios, {datos['viajes']} viajes")
+    print(f"  resumen en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Servidor HTTP/JSON con las operaciones del kiosco para varias terminales.
+
+    python api.py --port 8080 --workers 8
+
+    GET  /folios/<folio>                        {"folio", "valido"}
+    GET  /folios/<folio>/saldo                  {"folio", "saldo"}
+    POST /folios/<folio>/recargas  {"monto"}    {"folio", "saldo"}
+    GET  /folios/<folio>/movimientos?offset=&limit=&dias=
+                                                {"total", "movimientos": [...]}
+    GET  /rutas?q=&limit=                       {"rutas": [...]}
+    GET  /rutas/<ruta>                          {"ruta", "descripcion"}
+    GET  /rutas/<ruta>/geometria?zoom=          {"ruta", "trazo", "paradas"}
+    GET  /rutas/cerca?punto=lat,lon&radio=      {"rutas": [{"ruta", "metros"}]}
+    GET  /viajes?desde=lat,lon&hasta=lat,lon    {"resumen", "segundos", "tramos": [...]}
+
+asyncio atiende las conexiones (HTTP/1.1 con keep-alive) y las llamadas a
+KioskService, que leen disco y toman candados, corren en un pool de hilos;
+una consulta lenta no detiene a las demás terminales. Los errores se
+responden como {"error": "..."} con 400, 401, 404 o 503; cualquier otro
+es un error del servidor y va como 500.
+
+Escucha sólo en 127.0.0.1. Las recargas piden el encabezado
+``Authorization: Bearer <token>`` con el token de AYVOY_API_TOKEN (o
+--token); sin token configurado el servidor no acepta recargas.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from functools import partial
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from service import NEAR_RADIUS, InvalidInput, KioskService
+from storage import UnknownFolio
+
+MAX_BODY = 64 * 1024
+MAX_PAGE = 200  # Movimientos o rutas máximos por respuesta
+KEEPALIVE_TIMEOUT = 15.0
+MAX_RADIUS = 5000  # m, para /rutas/cerca
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(query: Dict[str, List[str]], nombre: str, default: Optional[int],
+               minimo: int = 0, maximo: Optional[int] = None) -> Optional[int]:
+    valores = query.get(nombre)
+    if not valores:
+        return default
+    try:
+        valor = int(valores[0])
+    except ValueError:
+        raise HTTPError(400, f"{nombre} debe ser un entero")
+    if valor < minimo or (maximo is not None and valor > maximo):
+        raise HTTPError(400, f"{nombre} fuera de rango")
+    return valor
+
+
+def _point_param(query: Dict[str, List[str]], nombre: str) -> Tuple[float, float]:
+    try:
+        lat, lon = (float(c) for c in query[nombre][0].split(","))
+    except (KeyError, ValueError):
+        raise HTTPError(400, f"{nombre} debe ser lat,lon")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPError(400, f"{nombre} fuera de rango")
+    return lat, lon
+
+
+class KioskAPI:
+    """Rutas del API sobre un KioskService; cada manejador corre en el pool de hilos."""
+
+    def __init__(self, service: KioskService, workers: int = 8, token: Optional[str] = None):
+        self.service = service
+        self.token = token  # Para las rutas que escriben (POST); sin él se rechazan
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="api")
+        self.routes: List[Tuple[str, Pattern, Callable]] = [
+            ("GET", re.compile(r"/folios/([^/]+)"), self.folio),
+            ("GET", re.compile(r"/folios/([^/]+)/saldo"), self.saldo),
+            ("POST", re.compile(r"/folios/([^/]+)/recargas"), self.recarga),
+            ("GET", re.compile(r"/folios/([^/]+)/movimientos"), self.movimientos),
+            ("GET", re.compile(r"/rutas"), self.buscar_rutas),
+            ("GET", re.compile(r"/rutas/cerca"), self.rutas_cerca),
+            ("GET", re.compile(r"/rutas/([^/]+)"), self.ruta),
+            ("GET", re.compile(r"/rutas/([^/]+)/geometria"), self.geometria),
+            ("GET", re.compile(r"/viajes"), self.viaje),
+        ]
+
+    # Manejadores: (parámetros de la ruta, query, cuerpo JSON) -> respuesta JSON
+
+    def folio(self, folio: str, query, cuerpo) -> Dict[str, Any]:
+        return {"folio": folio, "valido": self.service.validate_folio(folio)}
+
+    def saldo(self, folio: str, query, cuerpo) -> Dict[str, Any]:
+        saldo = self.service.balance(folio)
+        if saldo is None:
+            raise UnknownFolio(folio)
+        return {"folio": folio, "saldo": saldo}
+
+    def recarga(self, folio: str, query, cuerpo) -> Dict[str, Any]:
+        monto = cuerpo.get("monto") if isinstance(cuerpo, dict) else None
+        if isinstance(monto, bool) or not isinstance(monto, (int, float)):
+            raise HTTPError(400, "monto debe ser un número")
+        return {"folio": folio, "saldo": self.service.recharge(folio, float(monto))}
+
+    def movimientos(self, folio: str, query, cuerpo) -> Dict[str, Any]:
+        offset = _int_param(query, "offset", 0)
+        limit = _int_param(query, "limit", 50, 1, MAX_PAGE)
+        dias = _int_param(query, "dias", None, 1)
+        if self.service.balance(folio) is None:
+            raise UnknownFolio(folio)
+        total = self.service.movement_count(folio, dias)
+        pagina = self.service.movements(folio, offset, min(limit, max(0, total - offset)))
+        return {"total": total, "movimientos": [asdict(m) for m in pagina]}
+
+    def buscar_rutas(self, query, cuerpo) -> Dict[str, Any]:
+        limit = _int_param(query, "limit", 50, 1, MAX_PAGE)
+        texto = query.get("q", [""])[0].strip()
+        rutas = self.service.search_routes(texto, limit) if texto else self.service.routes()[:limit]
+        return {"rutas": rutas}
+
+    def rutas_cerca(self, query, cuerpo) -> Dict[str, Any]:
+        punto = _point_param(query, "punto")
+        radio = _int_param(query, "radio", int(NEAR_RADIUS), 1, MAX_RADIUS)
+        return {"rutas": [{"ruta": ruta, "metros": round(metros)}
+                          for ruta, metros in self.service.routes_near(punto, radio)]}
+
+    def ruta(self, ruta: str, query, cuerpo) -> Dict[str, Any]:
+        descripcion = self.service.route_description(ruta)
+        if descripcion is None:
+            raise HTTPError(404, f"No existe {ruta}")
+        return {"ruta": ruta, "descripcion": descripcion}
+
+    def geometria(self, ruta: str, query, cuerpo) -> Dict[str, Any]:
+        zoom = _int_param(query, "zoom", 13, 0, 22)
+        forma = self.service.route_shape(ruta)
+        if forma is None:
+            raise HTTPError(404, f"No existe {ruta}")
+        return {"ruta": ruta, "trazo": [list(p) for p in forma.simplified(zoom)],
+                "paradas": [list(p) for p in forma.stop_points()]}
+
+    def viaje(self, query, cuerpo) -> Dict[str, Any]:
+        origen, destino = _point_param(query, "desde"), _point_param(query, "hasta")
+        plan = self.service.plan_trip(origen, destino)
+        if plan is None:
+            raise HTTPError(404, "No hay un viaje entre esos puntos")
+        return {"resumen": plan.resumen(), "segundos": round(plan.segundos),
+                "tramos": [asdict(tramo) for tramo in plan.tramos]}
+
+    # HTTP
+
+    def _authorized(self, encabezados: Dict[str, str]) -> bool:
+        esquema, _, token = encabezados.get("authorization", "").partition(" ")
+        return (self.token is not None and esquema.lower() == "bearer"
+                and hmac.compare_digest(token.strip().encode("utf-8"), self.token.encode("utf-8")))
+
+    async def dispatch(self, metodo: str, objetivo: str, cuerpo: bytes,
+                       encabezados: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, Any]]:
+        partes = urlsplit(objetivo)
+        ruta = partes.path.rstrip("/") or "/"
+        permitido = False
+        for metodo_ruta, patron, manejador in self.routes:
+            coincidencia = patron.fullmatch(ruta)
+            if coincidencia is None:
+                continue
+            if metodo_ruta != metodo:
+                permitido = True
+                continue
+            if metodo != "GET" and not self._authorized(encabezados or {}):
+                if self.token is None:
+                    return 403, {"error": "El servidor no acepta escrituras sin AYVOY_API_TOKEN"}
+                return 401, {"error": "Token no válido"}
+            try:
+                datos = json.loads(cuerpo) if cuerpo else None
+            except ValueError:
+                return 400, {"error": "cuerpo JSON no válido"}
+            parametros = [unquote(g) for g in coincidencia.groups()]
+            llamada = partial(manejador, *parametros, parse_qs(partes.query), datos)
+            try:
+                return 200, await asyncio.get_running_loop().run_in_executor(self.pool, llamada)
+            except HTTPError as e:
+                return e.status, {"error": str(e)}
+            except UnknownFolio as e:
+                return 404, {"error": f"No existe {e.args[0]}"}
+            except InvalidInput as e:
+                return 400, {"error": str(e)}
+            except FileNotFoundError:
+                return 503, {"error": "Almacenamiento no disponible"}
+            except Exception:
+                traceback.print_exc()
+                return 500, {"error": "Error interno del servidor"}
+        if permitido:
+            return 405, {"error": "Método no permitido"}
+        return 404, {"error": "Ruta no encontrada"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    linea = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not linea:
+                    break
+                try:
+                    metodo, objetivo, version = linea.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Petición no válida"}, False)
+                    break
+                encabezados = {}
+                while True:
+                    encabezado = await reader.readline()
+                    if encabezado in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = encabezado.decode("latin-1").partition(":")
+                    encabezados[nombre.strip().lower()] = valor.strip()
+
+                conexion = encabezados.get("connection", "").lower()
+                seguir = conexion != "close" if version == "HTTP/1.1" else conexion == "keep-alive"
+                try:
+                    largo = int(encabezados.get("content-length", "0"))
+                except ValueError:
+                    largo = -1
+                if largo < 0 or largo > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "Cuerpo demasiado grande"}, False)
+                    break
+                cuerpo = await reader.readexactly(largo) if largo else b""
+
+                status, respuesta = await self.dispatch(metodo.upper(), objetivo, cuerpo, encabezados)
+                await self._respond(writer, status, respuesta, seguir)
+                if not seguir:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, respuesta: Dict[str, Any],
+                       seguir: bool):
+        cuerpo = json.dumps(respuesta, ensure_ascii=False).encode("utf-8")
+        encabezados = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                       "Content-Type: application/json; charset=utf-8\r\n"
+                       f"Content-Length: {len(cuerpo)}\r\n"
+                       f"Connection: {'keep-alive' if seguir else 'close'}\r\n\r\n")
+        writer.write(encabezados.encode("latin-1") + cuerpo)
+        await writer.drain()
+
+    async def serve(self, host: str, port: int):
+        servidor = await asyncio.start_server(self.handle, host, port)
+        direcciones = ", ".join(str(s.getsockname()) for s in servidor.sockets)
+        print(f"API del kiosco en {direcciones}")
+        async with servidor:
+            await servidor.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="sólo localhost por omisión; para la red, detrás de un proxy con TLS")
+    parser.add_argument("--token", default=os.environ.get("AYVOY_API_TOKEN"),
+                        help="token de las recargas (por omisión AYVOY_API_TOKEN)")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="hilos para las consultas al almacenamiento")
+    args = parser.parse_args()
+
+    service = KioskService()
+    service.start()
+    api = KioskAPI(service, args.workers, args.token)
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
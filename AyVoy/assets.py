@@ -0,0 +1,49 @@
+import os
+import tempfile
+from typing import Tuple
+
+from PIL import Image
+
+# Subcarpeta de ASSETS_PATH con las variantes ya reducidas
+VARIANTS_DIR = "cache"
+
+
+def variant_path(path: str, size: Tuple[int, int]) -> str:
+    directorio, nombre = os.path.split(path)
+    base = os.path.splitext(nombre)[0]
+    return os.path.join(directorio, VARIANTS_DIR, f"{base}_{size[0]}x{size[1]}.png")
+
+
+def load_variant(path: str, size: Tuple[int, int]) -> Image.Image:
+    """Imagen de ``path`` reducida para caber en ``size``, conservando proporción.
+
+    La versión reducida se guarda junto al original la primera vez y se
+    vuelve a generar sólo si el original es más nuevo, así las siguientes
+    cargas decodifican un PNG de unos cuantos KB en lugar del completo. Si
+    la carpeta no se puede escribir la imagen se reduce en memoria.
+    """
+    variante = variant_path(path, size)
+    try:
+        if os.path.getmtime(variante) >= os.path.getmtime(path):
+            image = Image.open(variante)
+            image.load()
+            return image
+    except OSError:
+        pass
+
+    image = Image.open(path)
+    image.thumbnail(size)
+    try:
+        os.makedirs(os.path.dirname(variante), exist_ok=True)
+        # Nombre único: otro hilo o proceso puede estar generando la misma variante
+        fd, temporal = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(variante))
+        try:
+            with os.fdopen(fd, "wb") as archivo:
+                image.save(archivo, format="PNG")
+            os.replace(temporal, variante)
+        except OSError:
+            os.remove(temporal)
+            raise
+    except OSError:
+        pass
+    return image
@@ -0,0 +1,265 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from config import DATA_PATH, DB_PATH, ROUTES_PATH, STORAGE_BACKEND
+from storage import UnknownFolio, UserRecord, UserStore
+
+
+class StorageBackend(ABC):
+    """Almacenamiento de usuarios y rutas que usa la App.
+
+    Los métodos de usuarios lanzan FileNotFoundError si falta el archivo de
+    datos y ``recargar`` lanza UnknownFolio si el folio no existe.
+    """
+
+    @abstractmethod
+    def exists(self, folio: str) -> bool:
+        ...
+
+    @abstractmethod
+    def get_user(self, folio: str) -> Optional[UserRecord]:
+        ...
+
+    @abstractmethod
+    def recargar(self, folio: str, monto: float) -> float:
+        ...
+
+    def balance(self, folio: str) -> Optional[float]:
+        usuario = self.get_user(folio)
+        return usuario.saldo if usuario is not None else None
+
+    def movement_count(self, folio: str) -> int:
+        usuario = self.get_user(folio)
+        return len(usuario.movimientos) if usuario is not None else 0
+
+    def movements(self, folio: str, offset: int, limit: int) -> List[str]:
+        """Una página de los movimientos del folio, en el orden en que se registraron."""
+        usuario = self.get_user(folio)
+        return usuario.movimientos[offset:offset + limit] if usuario is not None else []
+
+    @abstractmethod
+    def routes(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def descriptions(self) -> Dict[str, str]:
+        ...
+
+    def routes_version(self) -> Optional[Hashable]:
+        """Cambia cuando cambian las rutas o sus descripciones (None: nunca cambian)."""
+        return None
+
+    def start_compactor(self):
+        """Arranca el mantenimiento en segundo plano, si el almacenamiento lo necesita."""
+
+    def close(self):
+        pass
+
+
+class TextBackend(StorageBackend):
+    """Los archivos planos de siempre: usuarios.txt (con su bitácora), rutas.txt y destinos.txt."""
+
+    def __init__(self, users_path: str, routes_path: str, descriptions_path: str):
+        self.users = UserStore(users_path)
+        self.routes_path = routes_path
+        self.descriptions_path = descriptions_path
+
+    def exists(self, folio: str) -> bool:
+        return self.users.exists(folio)
+
+    def get_user(self, folio: str) -> Optional[UserRecord]:
+        return self.users.get(folio)
+
+    def recargar(self, folio: str, monto: float) -> float:
+        return self.users.recargar(folio, monto)
+
+    def routes(self) -> List[str]:
+        with open(self.routes_path, "r") as archivo:
+            return [line.strip() for line in archivo if line.strip()]
+
+    def descriptions(self) -> Dict[str, str]:
+        descripciones = {}
+        with open(self.descriptions_path, "r", encoding="utf-8") as archivo:
+            for line in archivo:
+                nombre, separador, descripcion = line.partition(":")
+                if separador:
+                    descripciones[nombre.strip()] = descripcion.strip()
+        return descripciones
+
+    def routes_version(self) -> Hashable:
+        rutas = os.stat(self.routes_path)
+        destinos = os.stat(self.descriptions_path)
+        return (rutas.st_mtime_ns, rutas.st_size, destinos.st_mtime_ns, destinos.st_size)
+
+    def start_compactor(self):
+        self.users.start_compactor()
+
+    def close(self):
+        self.users.close()
+
+
+class SQLiteBackend(StorageBackend):
+    """Usuarios y rutas en SQLite con WAL e índices por folio y por ruta.
+
+    Cada hilo usa su propia conexión. Las consultas son constantes con
+    parámetros, así sqlite3 reutiliza la sentencia ya preparada de su caché
+    en lugar de compilarla en cada acción de la interfaz. Los saldos se
+    guardan en centavos para que las recargas no acumulen error de redondeo.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS usuarios (
+            folio TEXT PRIMARY KEY,
+            saldo INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS movimientos (
+            folio TEXT NOT NULL,
+            orden INTEGER NOT NULL,
+            hora TEXT NOT NULL,
+            PRIMARY KEY (folio, orden)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS rutas (
+            orden INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL UNIQUE,
+            descripcion TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            clave TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """
+    SQL_EXISTS = "SELECT 1 FROM usuarios WHERE folio = ?"
+    SQL_SALDO = "SELECT saldo FROM usuarios WHERE folio = ?"
+    SQL_MOVIMIENTOS = "SELECT hora FROM movimientos WHERE folio = ? ORDER BY orden"
+    SQL_MOVIMIENTOS_PAGINA = ("SELECT hora FROM movimientos WHERE folio = ? "
+                              "ORDER BY orden LIMIT ? OFFSET ?")
+    SQL_CUENTA_MOVIMIENTOS = "SELECT count(*) FROM movimientos WHERE folio = ?"
+    SQL_RECARGAR = "UPDATE usuarios SET saldo = saldo + ? WHERE folio = ?"
+    SQL_RUTAS = "SELECT nombre FROM rutas ORDER BY orden"
+    SQL_DESCRIPCIONES = "SELECT nombre, descripcion FROM rutas WHERE descripcion IS NOT NULL"
+    SQL_VERSION_RUTAS = "SELECT valor FROM meta WHERE clave = 'rutas'"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+        self._drop_search_column()
+
+    def _drop_search_column(self):
+        """Quita nombre_min de las bases de cuando la búsqueda de rutas era en SQL (ver search.py)."""
+        def tiene_columna(conn):
+            return any(columna == "nombre_min" for _, columna, *_ in conn.execute("PRAGMA table_info(rutas)"))
+        if not tiene_columna(self._conn()):
+            return
+        with self._transaction() as conn:
+            # Otro kiosco pudo quitarla mientras tanto
+            if tiene_columna(conn):
+                conn.execute("ALTER TABLE rutas DROP COLUMN nombre_min")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def exists(self, folio: str) -> bool:
+        return self._conn().execute(self.SQL_EXISTS, (folio,)).fetchone() is not None
+
+    def get_user(self, folio: str) -> Optional[UserRecord]:
+        conn = self._conn()
+        fila = conn.execute(self.SQL_SALDO, (folio,)).fetchone()
+        if fila is None:
+            return None
+        movimientos = [hora for (hora,) in conn.execute(self.SQL_MOVIMIENTOS, (folio,))]
+        return UserRecord(folio, fila[0] / 100, movimientos)
+
+    def balance(self, folio: str) -> Optional[float]:
+        fila = self._conn().execute(self.SQL_SALDO, (folio,)).fetchone()
+        return fila[0] / 100 if fila else None
+
+    def movement_count(self, folio: str) -> int:
+        return self._conn().execute(self.SQL_CUENTA_MOVIMIENTOS, (folio,)).fetchone()[0]
+
+    def movements(self, folio: str, offset: int, limit: int) -> List[str]:
+        # El recorrido va por la llave primaria (folio, orden), sin leer el resto del historial
+        return [hora for (hora,) in self._conn().execute(
+            self.SQL_MOVIMIENTOS_PAGINA, (folio, limit, offset))]
+
+    def recargar(self, folio: str, monto: float) -> float:
+        with self._transaction() as conn:
+            if conn.execute(self.SQL_RECARGAR, (round(monto * 100), folio)).rowcount == 0:
+                raise UnknownFolio(folio)
+            return conn.execute(self.SQL_SALDO, (folio,)).fetchone()[0] / 100
+
+    def routes(self) -> List[str]:
+        return [nombre for (nombre,) in self._conn().execute(self.SQL_RUTAS)]
+
+    def descriptions(self) -> Dict[str, str]:
+        return dict(self._conn().execute(self.SQL_DESCRIPCIONES))
+
+    def routes_version(self) -> Hashable:
+        fila = self._conn().execute(self.SQL_VERSION_RUTAS).fetchone()
+        return fila[0] if fila else 0
+
+    def import_users(self, usuarios: Iterable[UserRecord]) -> int:
+        """Carga usuarios en una sola transacción; un folio repetido conserva el primero."""
+        total = 0
+        with self._transaction() as conn:
+            for usuario in usuarios:
+                cursor = conn.execute("INSERT OR IGNORE INTO usuarios VALUES (?, ?)",
+                                      (usuario.folio, round(usuario.saldo * 100)))
+                if cursor.rowcount:
+                    conn.executemany("INSERT INTO movimientos VALUES (?, ?, ?)",
+                                     ((usuario.folio, i, hora)
+                                      for i, hora in enumerate(usuario.movimientos)))
+                    total += 1
+        return total
+
+    def apply_deltas(self, deltas: Iterable[Tuple[str, float]]):
+        with self._transaction() as conn:
+            conn.executemany(self.SQL_RECARGAR,
+                             ((round(monto * 100), folio) for folio, monto in deltas))
+
+    def import_routes(self, rutas: Iterable[Tuple[str, Optional[str]]]) -> int:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rutas")
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO rutas (nombre, descripcion) VALUES (?, ?)", rutas)
+            conn.execute("INSERT INTO meta VALUES ('rutas', 1) "
+                         "ON CONFLICT(clave) DO UPDATE SET valor = valor + 1")
+            return cursor.rowcount
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_backend(kind: str = STORAGE_BACKEND) -> StorageBackend:
+    if kind == "sqlite":
+        return SQLiteBackend(DB_PATH)
+    if kind == "text":
+        return TextBackend(f"{DATA_PATH}/usuarios.txt",
+                           f"{ROUTES_PATH}/rutas.txt",
+                           f"{ROUTES_PATH}/destinos.txt")
+    raise ValueError(f"Almacenamiento desconocido: {kind}")
@@ -0,0 +1,159 @@
+"""Prueba de carga de recargas concurrentes sobre un mismo directorio de datos.
+
+Lanza escritores en hilos y en procesos contra una copia sintética de
+usuarios.txt, con un compactador corriendo al mismo tiempo, y al final
+compara el saldo de cada folio contra lo que se recargó. Si algún saldo no
+cuadra hubo una actualización perdida. Antes revisa un kiosco que se
+queda sin recargar mientras otro compacta dos veces.
+
+    python bench_concurrency.py --threads 8 --processes 4 --ops 500
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from storage import UserStore
+
+
+def _crear_usuarios(path: str, folios: int):
+    with open(path, "w") as archivo:
+        for i in range(folios):
+            archivo.write(f"{1000000 + i}, 0, 7:00, 14:00\n")
+
+
+def _escritor(path: str, folios: int, ops: int, semilla: int, store: UserStore = None) -> Counter:
+    propio = store is None
+    if propio:
+        store = UserStore(path)
+    rng = random.Random(semilla)
+    recargas = Counter()
+    for _ in range(ops):
+        folio = str(1000000 + rng.randrange(folios))
+        store.recargar(folio, 1.0)
+        recargas[folio] += 1
+    if propio:
+        store.close()
+    return recargas
+
+
+def _escritor_proceso(args) -> Counter:
+    return _escritor(*args)
+
+
+def _compactador(path: str, alto: threading.Event, intervalo: float):
+    store = UserStore(path)
+    while not alto.wait(intervalo):
+        store.compact()
+    store.close()
+
+
+def _verificar(path: str, esperado: Counter) -> int:
+    store = UserStore(path)
+    perdidas = 0
+    for folio, recargas in esperado.items():
+        saldo = store.get(folio).saldo
+        if abs(saldo - recargas) > 1e-6:
+            perdidas += 1
+            print(f"  folio {folio}: saldo {saldo:.2f}, esperado {recargas:.2f}")
+    store.close()
+    return perdidas
+
+
+def correr_inactivo(folios: int) -> bool:
+    """Un kiosco sin recargar mientras otro compacta dos veces; su siguiente recarga no se pierde.
+
+    Dos compactaciones borran la bitácora que el kiosco inactivo tenía abierta
+    y también la siguiente.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        path = os.path.join(directorio, "usuarios.txt")
+        _crear_usuarios(path, folios)
+        inactivo, otro = UserStore(path), UserStore(path)
+        esperado = Counter()
+        folio = "1000000"
+        for store in (inactivo, otro):
+            store.recargar(folio, 1.0)
+            esperado[folio] += 1
+        otro.compact()
+        otro.recargar(folio, 1.0)
+        esperado[folio] += 1
+        otro.compact()
+        saldo = inactivo.recargar(folio, 1.0)
+        esperado[folio] += 1
+        inactivo.close()
+        otro.close()
+
+        perdidas = _verificar(path, esperado)
+        correcto = abs(saldo - esperado[folio]) <= 1e-6
+        if not correcto:
+            print(f"  recargar regresó {saldo:.2f}, esperado {esperado[folio]:.2f}")
+        print(f"inactivo: recarga después de dos compactaciones ajenas, "
+              f"folios con saldo incorrecto: {perdidas}")
+        return perdidas == 0 and correcto
+
+
+def correr(modo: str, escritores: int, ops: int, folios: int, compactar_cada: float) -> bool:
+    with tempfile.TemporaryDirectory() as directorio:
+        path = os.path.join(directorio, "usuarios.txt")
+        _crear_usuarios(path, folios)
+
+        alto = threading.Event()
+        compactador = threading.Thread(target=_compactador, args=(path, alto, compactar_cada))
+        compactador.start()
+
+        inicio = time.perf_counter()
+        esperado = Counter()
+        if modo == "hilos":
+            store = UserStore(path)
+            resultados = []
+            hilos = [threading.Thread(target=lambda s=i: resultados.append(
+                _escritor(path, folios, ops, s, store))) for i in range(escritores)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            store.close()
+        else:
+            with multiprocessing.Pool(escritores) as pool:
+                resultados = pool.map(_escritor_proceso,
+                                      [(path, folios, ops, i) for i in range(escritores)])
+        duracion = time.perf_counter() - inicio
+
+        alto.set()
+        compactador.join()
+        for recargas in resultados:
+            esperado.update(recargas)
+
+        total = escritores * ops
+        perdidas = _verificar(path, esperado)
+        print(f"{modo:>9}: {escritores} escritores, {total} recargas en {duracion:.2f} s "
+              f"({total / duracion:,.0f} recargas/s), folios con saldo incorrecto: {perdidas}")
+        return perdidas == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8, help="escritores en hilos")
+    parser.add_argument("--processes", type=int, default=4, help="escritores en procesos")
+    parser.add_argument("--ops", type=int, default=500, help="recargas por escritor")
+    parser.add_argument("--folios", type=int, default=50,
+                        help="folios distintos (pocos = más contención)")
+    parser.add_argument("--compact-every", type=float, default=0.2,
+                        help="segundos entre compactaciones concurrentes")
+    args = parser.parse_args()
+
+    ok = correr_inactivo(args.folios)
+    if args.threads:
+        ok &= correr("hilos", args.threads, args.ops, args.folios, args.compact_every)
+    if args.processes:
+        ok &= correr("procesos", args.processes, args.ops, args.folios, args.compact_every)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
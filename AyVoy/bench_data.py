@@ -0,0 +1,250 @@
+"""Benchmark de las operaciones de la interfaz sobre datos sintéticos de varios tamaños.
+
+Genera usuarios.txt, rutas.txt, destinos.txt y geometrias.txt con N
+renglones y mide, sin ventana, lo que hace la App en cada pantalla a
+través de KioskService: iniciar sesión (Validar_Folio), ver el saldo
+(Abrir_Saldo), recargar (confirmar_recarga), buscar rutas (Buscar_Rutas)
+y dibujar una ruta (Dibujar_Ruta). Reporta p50/p99 por operación, el
+tiempo de la primera llamada (cuando se cargan los índices) y la memoria
+que ocupan los datos cargados. Ver_Red consulta la red completa
+(overlay.py) en una vista del tamaño del mapa a un zoom de 3 a 17: de
+lejos la vista cubre millones de cubetas vacías.
+
+    python bench_data.py --sizes 1000 100000 1000000 --save base.json
+    python bench_data.py --sizes 1000 100000 1000000 --compare base.json
+
+Con --compare sale con código 1 si alguna operación es más lenta que la
+línea base por más de --tolerance. Con --dir los datos generados se
+conservan y se reutilizan entre corridas (10⁷ usuarios tardan en generarse).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from backends import SQLiteBackend, TextBackend
+from geometry import STOPS_SEPARATOR, GeometryStore, encode_polyline
+from migrate import leer_rutas, leer_usuarios
+from movements import MovementLog
+from overlay import mercator
+from service import KioskService
+
+PALABRAS = ["centro", "norte", "sur", "oriente", "poniente", "jardines", "valle", "lomas",
+            "fraccionamiento", "hospital", "universidad", "mercado", "estadio", "panteón",
+            "terminal", "aeropuerto", "morelos", "insurgentes", "ojocaliente", "pirámides"]
+CENTRO = (21.88234, -102.28259)
+PAGE = 50  # Filas que pide la lista de movimientos al abrir el saldo
+MAP_PIXELS = (360, 300)  # Mapa de Abrir_Mapa
+MAX_ROUTES = 100000
+
+
+def _con_error(palabra: str, rng: random.Random) -> str:
+    """La palabra con una letra cambiada, como un error de dedo en el kiosco."""
+    i = rng.randrange(len(palabra))
+    return palabra[:i] + rng.choice("aeiounrst") + palabra[i + 1:]
+
+
+def generar(directorio: str, usuarios: int, rutas: int, semilla: int = 1):
+    rng = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, "usuarios.txt"), "w") as archivo:
+        for i in range(usuarios):
+            horas = ", ".join(f"{rng.randrange(5, 23)}:{rng.randrange(60):02d}"
+                              for _ in range(rng.randrange(0, 9)))
+            archivo.write(f"{1000000 + i}, {rng.randrange(0, 500)}, {horas}\n")
+
+    with open(os.path.join(directorio, "rutas.txt"), "w") as nombres, \
+            open(os.path.join(directorio, "destinos.txt"), "w", encoding="utf-8") as destinos, \
+            open(os.path.join(directorio, "geometrias.txt"), "w", encoding="utf-8") as geometrias:
+        for i in range(1, rutas + 1):
+            nombre = f"Ruta {i}"
+            origen, destino = rng.sample(PALABRAS, 2)
+            nombres.write(f"{nombre}\n")
+            destinos.write(f"{nombre}: Va de {origen} a {destino} pasando por {rng.choice(PALABRAS)}.\n")
+            # Caminata aleatoria de unos cientos de vértices alrededor del centro
+            lat, lon = CENTRO[0] + rng.uniform(-0.05, 0.05), CENTRO[1] + rng.uniform(-0.05, 0.05)
+            puntos = []
+            for _ in range(rng.randrange(100, 600)):
+                lat += rng.uniform(-0.0005, 0.0005)
+                lon += rng.uniform(-0.0005, 0.0005)
+                puntos.append((lat, lon))
+            paradas = puntos[::40] + [puntos[-1]]
+            geometrias.write(f"{nombre}:{encode_polyline(puntos)}{STOPS_SEPARATOR}"
+                             f"{encode_polyline(paradas)}\n")
+
+
+def _datos(base: str, usuarios: int, rutas: int) -> str:
+    directorio = os.path.join(base, f"n{usuarios}_r{rutas}")
+    marca = os.path.join(directorio, "listo")
+    if not os.path.exists(marca):
+        inicio = time.perf_counter()
+        generar(directorio, usuarios, rutas)
+        open(marca, "w").close()
+        print(f"  datos generados en {time.perf_counter() - inicio:.1f} s")
+    return directorio
+
+
+def _servicio(directorio: str, trabajo: str, backend: str) -> KioskService:
+    rutas = os.path.join(directorio, "rutas.txt")
+    destinos = os.path.join(directorio, "destinos.txt")
+    if backend == "sqlite":
+        almacen = SQLiteBackend(os.path.join(trabajo, "ayvoy.db"))
+        almacen.import_users(leer_usuarios(os.path.join(directorio, "usuarios.txt")))
+        almacen.import_routes(leer_rutas(rutas, destinos))
+    else:
+        # Copia: las recargas escriben bitácora junto a usuarios.txt
+        usuarios = os.path.join(trabajo, "usuarios.txt")
+        shutil.copyfile(os.path.join(directorio, "usuarios.txt"), usuarios)
+        almacen = TextBackend(usuarios, rutas, destinos)
+    return KioskService(almacen, MovementLog(os.path.join(trabajo, "movimientos")),
+                        GeometryStore(os.path.join(directorio, "geometrias.txt")))
+
+
+def _medir(operacion: Callable[[random.Random], object], ops: int, semilla: int) -> Dict[str, float]:
+    rng = random.Random(semilla)
+    tiempos = []
+    for _ in range(ops):
+        inicio = time.perf_counter()
+        operacion(rng)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return {"p50_ms": round(tiempos[len(tiempos) // 2] * 1000, 4),
+            "p99_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))] * 1000, 4)}
+
+
+def correr(base: str, usuarios: int, rutas: int, ops: int, backend: str) -> Dict[str, object]:
+    directorio = _datos(base, usuarios, rutas)
+    with tempfile.TemporaryDirectory() as trabajo:
+        # tracemalloc sólo durante la carga: encendido haría más lentas las mediciones.
+        # Los tiempos de carga sí lo incluyen; sirven para comparar entre corridas
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        servicio = _servicio(directorio, trabajo, backend)
+        servicio.validate_folio("1000000")
+        usuarios_ms = (time.perf_counter() - inicio) * 1000
+        inicio = time.perf_counter()
+        servicio.search_routes("centro", 50)
+        rutas_ms = (time.perf_counter() - inicio) * 1000
+        memoria = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        def folio(rng):
+            return str(1000000 + rng.randrange(usuarios))
+
+        def ruta(rng):
+            return f"Ruta {rng.randint(1, rutas)}"
+
+        def saldo(rng):
+            f = folio(rng)
+            servicio.balance(f)
+            total = servicio.movement_count(f)
+            servicio.movements(f, 0, PAGE)
+            servicio.legacy_movements(f, 0, PAGE - min(total, PAGE))
+
+        def busqueda(rng):
+            palabra = rng.choice(PALABRAS)
+            consulta = _con_error(palabra, rng) if rng.random() < 0.3 else palabra[:rng.randint(3, len(palabra))]
+            servicio.search_routes(consulta, 50)
+
+        def dibujo(rng):
+            forma = servicio.route_shape(ruta(rng))
+            forma.simplified(rng.randint(11, 17))
+            forma.stop_points()
+
+        red = servicio.network_overlay()
+
+        def vista(rng):
+            # Como Revisar_Red: la vista del mapa más su margen
+            zoom = rng.randint(3, 17)
+            x, y = mercator(CENTRO[0] + rng.uniform(-0.05, 0.05), CENTRO[1] + rng.uniform(-0.05, 0.05))
+            ancho, alto = (p * 1.5 / (256 * 2 ** zoom) for p in MAP_PIXELS)
+            caja = (x - ancho, y - alto, x + ancho, y + alto)
+            red.chunks_in(caja)
+            red.clusters(caja, zoom)
+
+        operaciones = {
+            "Validar_Folio": lambda rng: servicio.validate_folio(folio(rng)),
+            "Abrir_Saldo": saldo,
+            "confirmar_recarga": lambda rng: servicio.recharge(folio(rng), 10.0),
+            "Buscar_Rutas": busqueda,
+            "Dibujar_Ruta": dibujo,
+            "Ver_Red": vista,
+        }
+        resultado = {"carga_usuarios_ms": round(usuarios_ms, 1), "carga_rutas_ms": round(rutas_ms, 1),
+                     "memoria_mb": round(memoria[0] / 2 ** 20, 1),
+                     "memoria_pico_mb": round(memoria[1] / 2 ** 20, 1)}
+        for i, (nombre, operacion) in enumerate(operaciones.items()):
+            resultado[nombre] = _medir(operacion, ops, i)
+        servicio.close()
+    return resultado
+
+
+def comparar(actual: Dict[str, Dict], base: Dict[str, Dict], tolerancia: float) -> List[str]:
+    regresiones = []
+    for tamano, operaciones in actual.items():
+        for nombre, medidas in operaciones.items():
+            anterior = base.get(tamano, {}).get(nombre)
+            if not isinstance(medidas, dict) or not isinstance(anterior, dict):
+                continue
+            for clave, valor in medidas.items():
+                previo = anterior.get(clave)
+                if previo and valor > previo * (1 + tolerancia):
+                    regresiones.append(f"{tamano} {nombre} {clave}: {previo:.3f} -> {valor:.3f} ms")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="usuarios por corrida (10³ a 10⁷)")
+    parser.add_argument("--max-routes", type=int, default=MAX_ROUTES,
+                        help="tope de rutas; cada corrida usa min(tamaño, tope)")
+    parser.add_argument("--ops", type=int, default=500, help="mediciones por operación")
+    parser.add_argument("--backend", choices=["text", "sqlite"], default="text")
+    parser.add_argument("--dir", help="carpeta donde conservar los datos generados")
+    parser.add_argument("--save", help="guarda los resultados como línea base JSON")
+    parser.add_argument("--compare", help="línea base JSON contra la cual comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="aumento relativo permitido antes de marcar regresión")
+    args = parser.parse_args()
+
+    base = args.dir or tempfile.mkdtemp(prefix="ayvoy_bench_")
+    resultados = {}
+    try:
+        for usuarios in args.sizes:
+            rutas = min(usuarios, args.max_routes)
+            print(f"{usuarios:,} usuarios, {rutas:,} rutas ({args.backend})")
+            resultado = correr(base, usuarios, rutas, args.ops, args.backend)
+            resultados[str(usuarios)] = resultado
+            print(f"  carga: usuarios {resultado['carga_usuarios_ms']:.0f} ms, "
+                  f"rutas {resultado['carga_rutas_ms']:.0f} ms, memoria {resultado['memoria_mb']:.1f} MB "
+                  f"(pico {resultado['memoria_pico_mb']:.1f} MB)")
+            for nombre, medidas in resultado.items():
+                if isinstance(medidas, dict):
+                    print(f"  {nombre:<18} p50 {medidas['p50_ms']:8.3f} ms   p99 {medidas['p99_ms']:8.3f} ms")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(base, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as archivo:
+            json.dump({"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                       "backend": args.backend, "ops": args.ops, "resultados": resultados},
+                      archivo, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as archivo:
+            linea_base = json.load(archivo)
+        regresiones = comparar(resultados, linea_base["resultados"], args.tolerance)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        raise SystemExit(1 if regresiones else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Revisa la liquidación y las estadísticas sobre archivos pequeños con casos conocidos.
+
+Cada caso escribe un usuarios.txt a mano en un directorio temporal, lo
+liquida y compara saldos, renglones e historial contra lo esperado. Se
+corre con y sin NumPy, porque cada camino convierte los viajes distinto.
+Las estadísticas de analytics.py deben dar lo mismo con cualquier número
+de procesos y tamaño de trozo, y los mismos usuarios y viajes que settle.py.
+
+    python check_data.py
+"""
+import argparse
+import os
+import random
+import tempfile
+
+import analytics
+import settle
+from movements import MovementLog
+from storage import UserStore
+
+FECHA = "20261017"
+
+
+def _liquidar(directorio: str, contenido: str, tarjetas=None) -> settle.SettlementReport:
+    path = os.path.join(directorio, "usuarios.txt")
+    with open(path, "w") as archivo:
+        archivo.write(contenido)
+    return settle.settle(path, FECHA, tarjetas or {}, MovementLog(os.path.join(directorio, "movimientos")))
+
+
+def _comparar(nombre: str, obtenido, esperado) -> bool:
+    if obtenido != esperado:
+        print(f"  {nombre}: {obtenido!r}, esperado {esperado!r}")
+        return False
+    return True
+
+
+def revisar_repetidos() -> bool:
+    """Los viajes de un folio repetido se cobran en su primera línea y el renglón se quita."""
+    with tempfile.TemporaryDirectory() as directorio:
+        reporte = _liquidar(directorio, "1001, 50.00, 7:00\n"
+                                        "1002, 30.00\n"
+                                        "1001, 99.00, 10:00, 23:30\n")
+        path = os.path.join(directorio, "usuarios.txt")
+        with open(path) as archivo:
+            renglones = archivo.read().splitlines()[1:]
+        store = UserStore(path)
+        # 7:00 y 10:00 diurnas, 23:30 nocturna; el saldo es el de la primera línea
+        ok = _comparar("saldo", store.get("1001").saldo, 50.00 - 11 - 11 - 14)
+        store.close()
+        ok &= _comparar("renglones", renglones, ["1001, 14.00", "1002, 30.00"])
+        ok &= _comparar("repetidos", reporte.repetidos, 1)
+        ok &= _comparar("viajes", reporte.viajes, 3)
+        ok &= _comparar("historial", MovementLog(os.path.join(directorio, "movimientos")).count("1001"), 3)
+    return ok
+
+
+def revisar_negativos() -> bool:
+    """Un cobro mayor que el saldo se aplica y el folio queda en el reporte."""
+    with tempfile.TemporaryDirectory() as directorio:
+        reporte = _liquidar(directorio, "2001, 5.00, 8:00, 9:00\n"
+                                        "2002, 20.00, 8:00\n")
+        store = UserStore(os.path.join(directorio, "usuarios.txt"))
+        ok = _comparar("saldo", store.get("2001").saldo, 5.00 - 22)
+        store.close()
+        ok &= _comparar("saldos_negativos", reporte.saldos_negativos, 1)
+        ok &= _comparar("folios_negativos", reporte.folios_negativos, ["2001"])
+    return ok
+
+
+def revisar_estadisticas() -> bool:
+    """Las estadísticas no cambian con los procesos ni con el tamaño de trozo."""
+    rng = random.Random(1)
+    lineas = []
+    for i in range(300):
+        # Uno de cada diez folios se repite más adelante, en otro trozo
+        folio = str(3000 + (rng.randrange(i) if i > 30 and rng.random() < 0.1 else i))
+        horas = [f"{rng.randrange(24)}:{rng.randrange(60):02d}" for _ in range(rng.randrange(4))]
+        lineas.append(", ".join([folio, "100.00", *horas]) + "\n")
+    tarjetas = {str(3000 + i): rng.choice(settle.CARD_TYPES) for i in range(0, 300, 3)}
+    with tempfile.TemporaryDirectory() as directorio:
+        path = os.path.join(directorio, "usuarios.txt")
+        with open(path, "w") as archivo:
+            archivo.writelines(lineas)
+        resumenes = {(workers, trozo): analytics.analyze([path], tarjetas, workers, trozo)[0].summary()
+                     for workers, trozo in ((1, analytics.CHUNK_MB << 20), (2, 512), (4, 97))}
+        reporte = _liquidar(directorio, "".join(lineas), tarjetas)
+    base = resumenes[(1, analytics.CHUNK_MB << 20)]
+    ok = True
+    for clave, resumen in resumenes.items():
+        ok &= _comparar(f"resumen con {clave[0]} procesos y trozos de {clave[1]} bytes", resumen, base)
+    ok &= _comparar("registros contra settle", base["registros"], reporte.usuarios)
+    ok &= _comparar("viajes contra settle", base["viajes"], reporte.viajes)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    ok = True
+    con_numpy = settle.numpy
+    for modo, numpy in (("numpy", con_numpy), ("array", None)):
+        if modo == "numpy" and numpy is None:
+            continue
+        settle.numpy = numpy
+        try:
+            for revision in (revisar_repetidos, revisar_negativos):
+                correcto = revision()
+                print(f"{modo:>6}: {revision.__doc__.splitlines()[0]} {'ok' if correcto else 'FALLA'}")
+                ok &= correcto
+        finally:
+            settle.numpy = con_numpy
+    correcto = revisar_estadisticas()
+    print(f"{'pool':>6}: {revisar_estadisticas.__doc__.splitlines()[0]} {'ok' if correcto else 'FALLA'}")
+    ok &= correcto
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
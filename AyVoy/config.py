@@ -0,0 +1,29 @@
+# Constants
+ASSETS_PATH = r"C:\Python\AyVoy\INTER"
+DATA_PATH = r"C:\Python\AyVoy\USERS"
+ROUTES_PATH = r"C:\Python\AyVoy\ROUTES"
+DOCS_PATH = r"C:\Python\AyVoy\TRAMITES"
+MAPS_PATH = r"C:\Python\AyVoy\MAPAS"
+
+# "text" usa los archivos planos; "sqlite" la base creada con migrate.py
+STORAGE_BACKEND = "text"
+DB_PATH = f"{DATA_PATH}/ayvoy.db"
+
+# Historial de movimientos por folio: segmentos mensuales e índices (ver movements.py)
+MOVEMENTS_PATH = f"{DATA_PATH}/movimientos"
+
+# Tipo de tarjeta con descuento por folio, "folio,tipo" (ver settle.py)
+CARDS_PATH = f"{DATA_PATH}/tarjetas.txt"
+
+# Trazos de las rutas (ver geometry.py)
+GEOMETRY_PATH = f"{ROUTES_PATH}/geometrias.txt"
+
+# Caché de teselas del mapa (ver tiles.py); con TILES_OFFLINE no se usa la red
+TILES_PATH = f"{MAPS_PATH}/teselas.mbtiles"
+TILE_SERVER = "https://a.tile.openstreetmap.org/{z}/{x}/{y}.png"
+TILES_OFFLINE = False
+
+# Fotos de trámites: lado máximo en pixeles, calidad JPEG y lado de la miniatura
+DOC_IMAGE_MAX_SIDE = 1600
+DOC_IMAGE_QUALITY = 80
+DOC_THUMBNAIL_SIDE = 256
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 1 << 20
+
+Progress = Callable[[int, int], None]
+
+
+@dataclass
+class DocumentRecord:
+    tramite: str
+    documento: str
+    digest: str
+    size: int
+    nombre: str  # Nombre original del archivo
+
+
+class DocumentStore:
+    """Documentos de trámites guardados una sola vez por contenido.
+
+    Cada archivo se copia por bloques calculando su sha256 al mismo tiempo y
+    queda en ``blobs/ab/abcdef...``; si ya había un blob con ese digest la
+    copia se descarta, así el mismo INE subido para tres tarjetas ocupa
+    disco una vez. Un archivo de origen ya visto (misma ruta, tamaño y fecha)
+    ni siquiera se vuelve a leer.
+
+    Qué documento subió cada solicitante va en ``manifiestos/<folio>.csv``,
+    una línea por subida ``tramite,documento,digest,tamaño,nombre``; la más
+    reciente de cada (trámite, documento) es la vigente. Consultar a un
+    solicitante es leer su archivo, sin recorrer la carpeta.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.manifests_dir = os.path.join(root, "manifiestos")
+        self._sources: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def normalized_path(self, digest: str) -> str:
+        """Versión reducida de una foto (ver imaging.py); sustituye al blob original."""
+        return self.blob_path(digest) + ".jpg"
+
+    def thumbnail_path(self, digest: str) -> str:
+        return self.blob_path(digest) + ".mini.jpg"
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self.blob_path(digest)) or os.path.exists(self.normalized_path(digest))
+
+    def open_path(self, digest: str) -> str:
+        """Archivo a abrir para revisar el documento: la versión reducida si existe."""
+        normalizado = self.normalized_path(digest)
+        return normalizado if os.path.exists(normalizado) else self.blob_path(digest)
+
+    def manifest_path(self, folio: str) -> str:
+        # Sin folio todos los solicitantes compartirían un manifiesto y se pisarían
+        if not folio:
+            raise ValueError("Se necesita un folio para guardar documentos de trámites")
+        return os.path.join(self.manifests_dir, f"{folio}.csv")
+
+    def put(self, origen: str, progreso: Optional[Progress] = None) -> Tuple[str, int, bool]:
+        """Guarda el contenido de ``origen``. Regresa (digest, tamaño, si es nuevo)."""
+        info = os.stat(origen)
+        huella = (os.path.realpath(origen), info.st_size, info.st_mtime_ns)
+        with self._lock:
+            digest = self._sources.get(huella)
+        if digest is not None and self.has(digest):
+            if progreso is not None:
+                progreso(info.st_size, info.st_size)
+            return digest, info.st_size, False
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        temporal = os.path.join(self.blobs_dir, f"{os.getpid()}.{threading.get_ident()}.tmp")
+        sha = hashlib.sha256()
+        buffer = bytearray(CHUNK_SIZE)
+        vista = memoryview(buffer)
+        copiados = 0
+        try:
+            with open(origen, "rb") as f_origen, open(temporal, "wb") as f_destino:
+                while True:
+                    n = f_origen.readinto(buffer)
+                    if not n:
+                        break
+                    sha.update(vista[:n])
+                    f_destino.write(vista[:n])
+                    copiados += n
+                    if progreso is not None:
+                        progreso(copiados, info.st_size)
+            digest = sha.hexdigest()
+            destino = self.blob_path(digest)
+            nuevo = not self.has(digest)
+            if nuevo:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(temporal, destino)
+            else:
+                os.remove(temporal)
+        except BaseException:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._sources[huella] = digest
+        return digest, copiados, nuevo
+
+    def add(self, folio: str, tramite: str, documento: str, origen: str,
+            progreso: Optional[Progress] = None) -> Tuple[DocumentRecord, bool]:
+        """Guarda ``origen`` como ``documento`` del trámite del folio."""
+        manifiesto = self.manifest_path(folio)
+        digest, size, nuevo = self.put(origen, progreso)
+        registro = DocumentRecord(tramite, documento, digest, size, os.path.basename(origen))
+        linea = f"{tramite},{documento},{digest},{size},{registro.nombre}\n"
+        with self._lock:
+            os.makedirs(self.manifests_dir, exist_ok=True)
+            with open(manifiesto, "a", encoding="utf-8") as archivo:
+                archivo.write(linea)
+        return registro, nuevo
+
+    def documents(self, folio: str) -> List[DocumentRecord]:
+        """Documentos vigentes del folio, en el orden en que se subieron por primera vez."""
+        vigentes: Dict[Tuple[str, str], DocumentRecord] = {}
+        try:
+            with open(self.manifest_path(folio), "r", encoding="utf-8") as archivo:
+                for linea in archivo:
+                    datos = linea.rstrip("\n").split(",", 4)
+                    if len(datos) == 5:
+                        tramite, documento, digest, size, nombre = datos
+                        vigentes[(tramite, documento)] = DocumentRecord(
+                            tramite, documento, digest, int(size), nombre)
+        except FileNotFoundError:
+            return []
+        return list(vigentes.values())
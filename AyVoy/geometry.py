@@ -0,0 +1,305 @@
+"""Trazos de las rutas guardados en ROUTES/geometrias.txt.
+
+Una línea por ruta, ``Nombre:trazo`` o ``Nombre:trazo/paradas``. Trazo y
+paradas van como polilínea codificada (el formato de Google, precisión 1e-5)
+o en texto plano ``lat,lon;lat,lon``; el texto plano siempre empieza con
+dígito o signo menos, que igual que "/" no existen en el alfabeto de la
+polilínea. Para comprimir un archivo en texto plano:
+
+    python geometry.py --comprimir geometrias.txt
+"""
+import argparse
+import math
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from storage import atomic_write
+
+# Precisión de la polilínea codificada (5 decimales, ~1 m)
+POLYLINE_FACTOR = 1e5
+# Separa el trazo de las paradas en una línea del archivo
+STOPS_SEPARATOR = "/"
+# Error máximo del trazo simplificado, en pixeles del mapa
+LOD_PIXEL_TOLERANCE = 1.0
+# Tope de vértices que se mandan a set_path, sin importar el zoom
+MAX_PATH_POINTS = 2000
+TILE_SIZE = 256
+
+
+def encode_polyline(puntos: Iterable[Tuple[float, float]]) -> str:
+    salida = []
+    previo_lat = previo_lon = 0
+    for lat, lon in puntos:
+        lat_i, lon_i = round(lat * POLYLINE_FACTOR), round(lon * POLYLINE_FACTOR)
+        for delta in (lat_i - previo_lat, lon_i - previo_lon):
+            valor = ~(delta << 1) if delta < 0 else delta << 1
+            while valor >= 0x20:
+                salida.append(chr((0x20 | (valor & 0x1F)) + 63))
+                valor >>= 5
+            salida.append(chr(valor + 63))
+        previo_lat, previo_lon = lat_i, lon_i
+    return "".join(salida)
+
+
+def decode_polyline(texto: str) -> array:
+    """Regresa ``array('d')`` plano: lat0, lon0, lat1, lon1..."""
+    coords = array("d")
+    valores = [0, 0]
+    i = k = 0
+    while i < len(texto):
+        resultado = desplazamiento = 0
+        while True:
+            byte = ord(texto[i]) - 63
+            i += 1
+            resultado |= (byte & 0x1F) << desplazamiento
+            desplazamiento += 5
+            if byte < 0x20:
+                break
+        valores[k] += ~(resultado >> 1) if resultado & 1 else resultado >> 1
+        coords.append(valores[k] / POLYLINE_FACTOR)
+        k ^= 1
+    return coords
+
+
+def parse_geometry(texto: str) -> array:
+    texto = texto.strip()
+    if texto and texto[0] in "-0123456789":
+        coords = array("d")
+        for punto in texto.split(";"):
+            lat, lon = punto.split(",")
+            coords.append(float(lat))
+            coords.append(float(lon))
+        return coords
+    return decode_polyline(texto)
+
+
+def as_points(coords: Sequence[float]) -> List[Tuple[float, float]]:
+    """De ``array('d')`` plano a la lista de (lat, lon) que pide el mapa."""
+    return list(zip(coords[0::2], coords[1::2]))
+
+
+def dp_significance(coords: Sequence[float]) -> array:
+    """Tolerancia de Douglas-Peucker a partir de la cual se descarta cada vértice.
+
+    Una sola pasada de Douglas-Peucker anota para cada vértice la distancia
+    con que se conservó, acotada por la de su segmento padre; el trazo
+    simplificado con tolerancia ``t`` son los vértices con valor >= ``t``.
+    Las distancias van en grados de longitud, con la latitud estirada como
+    en Mercator para que equivalgan a pixeles en cualquier dirección.
+    """
+    n = len(coords) // 2
+    significancia = array("d", bytes(8 * n))
+    if n == 0:
+        return significancia
+    significancia[0] = significancia[n - 1] = math.inf
+    estira = 1 / max(math.cos(math.radians(coords[0])), 1e-6)
+    pila = [(0, n - 1, math.inf)]
+    while pila:
+        a, b, tope = pila.pop()
+        if b - a < 2:
+            continue
+        ay, ax = coords[2 * a] * estira, coords[2 * a + 1]
+        dy, dx = coords[2 * b] * estira - ay, coords[2 * b + 1] - ax
+        largo2 = dx * dx + dy * dy
+        mejor, k = -1.0, a + 1
+        for i in range(a + 1, b):
+            py, px = coords[2 * i] * estira - ay, coords[2 * i + 1] - ax
+            if largo2:
+                cruz = dx * py - dy * px
+                d2 = cruz * cruz / largo2
+            else:
+                d2 = px * px + py * py
+            if d2 > mejor:
+                mejor, k = d2, i
+        d = min(math.sqrt(mejor), tope)
+        significancia[k] = d
+        pila.append((a, k, d))
+        pila.append((k, b, d))
+    return significancia
+
+
+def terminals(coords: array) -> array:
+    """Paradas por omisión de un trazo sin paradas registradas: sus dos extremos."""
+    return coords[:2] + coords[-2:] if len(coords) > 2 else coords[:]
+
+
+class RouteShape:
+    """Trazo de una ruta, sus paradas y sus versiones simplificadas por zoom."""
+
+    def __init__(self, coords: array, stops: Optional[array] = None):
+        self.coords = coords
+        self.stops = stops if stops is not None else terminals(coords)
+        self._significance = dp_significance(coords)
+        self._levels: Dict[int, List[Tuple[float, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.coords) // 2
+
+    def simplified(self, zoom: int) -> List[Tuple[float, float]]:
+        """Vértices a dibujar en ``zoom``: error menor a LOD_PIXEL_TOLERANCE pixeles."""
+        nivel = self._levels.get(zoom)
+        if nivel is None:
+            tolerancia = LOD_PIXEL_TOLERANCE * 360 / (TILE_SIZE * 2 ** zoom)
+            if len(self._significance) > MAX_PATH_POINTS:
+                tope = sorted(self._significance, reverse=True)[MAX_PATH_POINTS - 1]
+                tolerancia = max(tolerancia, math.nextafter(tope, math.inf))
+            nivel = [(self.coords[2 * i], self.coords[2 * i + 1])
+                     for i, s in enumerate(self._significance) if s >= tolerancia]
+            self._levels[zoom] = nivel
+        return nivel
+
+    def stop_points(self) -> List[Tuple[float, float]]:
+        return as_points(self.stops)
+
+
+class GeometryStore:
+    """Trazos de ruta con carga perezosa.
+
+    La primera consulta recorre el archivo una sola vez para anotar dónde
+    empieza y cuánto mide la línea de cada ruta; los trazos se decodifican
+    hasta que se piden y se guardan en un LRU de ``cache_size`` rutas como
+    RouteShape, con el trazo en ``array('d')`` (16 bytes por vértice) y sus
+    niveles de detalle. Si el archivo cambia en disco el índice y el LRU se
+    descartan.
+    """
+
+    def __init__(self, path: str, cache_size: int = 32):
+        self.path = path
+        self.cache_size = cache_size
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._cache: "OrderedDict[str, RouteShape]" = OrderedDict()
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        info = os.stat(self.path)
+        stamp = (info.st_mtime_ns, info.st_size)
+        if stamp == self._stamp:
+            return
+        offsets = {}
+        offset = 0
+        with open(self.path, "rb") as archivo:
+            for linea in archivo:
+                nombre, separador, _ = linea.partition(b":")
+                if separador:
+                    inicio = offset + len(nombre) + 1
+                    offsets.setdefault(nombre.decode("utf-8").strip(),
+                                       (inicio, len(linea) - len(nombre) - 1))
+                offset += len(linea)
+        self._offsets = offsets
+        self._cache.clear()
+        self._stamp = stamp
+
+    def names(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._offsets)
+
+    def paths(self) -> Iterator[Tuple[str, List[Tuple[float, float]], List[Tuple[float, float]]]]:
+        """(ruta, trazo, paradas) de todas las rutas en una pasada, para construir índices.
+
+        No usa ni llena el LRU. Lanza FileNotFoundError si no existe el archivo.
+        """
+        vistas = set()
+        with open(self.path, "r", encoding="utf-8") as archivo:
+            for linea in archivo:
+                nombre, separador, texto = linea.partition(":")
+                nombre = nombre.strip()
+                if not separador or nombre in vistas:
+                    continue
+                vistas.add(nombre)
+                trazo, separador, paradas = texto.partition(STOPS_SEPARATOR)
+                coords = parse_geometry(trazo)
+                yield nombre, as_points(coords), as_points(
+                    parse_geometry(paradas) if separador else terminals(coords))
+
+    def version(self) -> Tuple[int, int]:
+        """Cambia cuando cambia el archivo de geometrías."""
+        with self._lock:
+            self._refresh()
+            return self._stamp
+
+    def _read(self, ruta: str) -> Optional[str]:
+        ubicacion = self._offsets.get(ruta)
+        if ubicacion is None:
+            return None
+        with open(self.path, "rb") as archivo:
+            archivo.seek(ubicacion[0])
+            return archivo.read(ubicacion[1]).decode("utf-8")
+
+    def stops(self, ruta: str) -> Optional[List[Tuple[float, float]]]:
+        """Sólo las paradas de ``ruta``, sin decodificar ni guardar su trazo."""
+        with self._lock:
+            self._refresh()
+            forma = self._cache.get(ruta)
+            if forma is not None:
+                return forma.stop_points()
+            texto = self._read(ruta)
+        if texto is None:
+            return None
+        trazo, separador, paradas = texto.partition(STOPS_SEPARATOR)
+        return as_points(parse_geometry(paradas) if separador else terminals(parse_geometry(trazo)))
+
+    def get(self, ruta: str) -> Optional[RouteShape]:
+        """Trazo y paradas de ``ruta``, o None si no tiene.
+
+        Lanza FileNotFoundError si no existe el archivo de geometrías.
+        """
+        with self._lock:
+            self._refresh()
+            forma = self._cache.get(ruta)
+            if forma is not None:
+                self._cache.move_to_end(ruta)
+                return forma
+            texto = self._read(ruta)
+            if texto is None:
+                return None
+            trazo, separador, paradas = texto.partition(STOPS_SEPARATOR)
+            forma = RouteShape(parse_geometry(trazo),
+                               parse_geometry(paradas) if separador else None)
+            self._cache[ruta] = forma
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return forma
+
+
+def write_geometries(path: str, trazos: Dict[str, Sequence[Tuple[float, float]]],
+                     paradas: Optional[Dict[str, Sequence[Tuple[float, float]]]] = None):
+    paradas = paradas or {}
+
+    def linea(nombre, puntos):
+        texto = f"{nombre}:{encode_polyline(puntos)}"
+        if nombre in paradas:
+            texto += STOPS_SEPARATOR + encode_polyline(paradas[nombre])
+        return texto + "\n"
+
+    atomic_write(path, (linea(nombre, puntos) for nombre, puntos in trazos.items()),
+                 encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comprimir", metavar="ARCHIVO", required=True,
+                        help="reescribe los trazos del archivo como polilíneas codificadas")
+    args = parser.parse_args()
+
+    trazos, paradas = {}, {}
+    with open(args.comprimir, "r", encoding="utf-8") as archivo:
+        for linea in archivo:
+            nombre, separador, texto = linea.partition(":")
+            nombre = nombre.strip()
+            if separador and nombre not in trazos:
+                trazo, separador, texto = texto.partition(STOPS_SEPARATOR)
+                trazos[nombre] = as_points(parse_geometry(trazo))
+                if separador:
+                    paradas[nombre] = as_points(parse_geometry(texto))
+    antes = os.path.getsize(args.comprimir)
+    write_geometries(args.comprimir, trazos, paradas)
+    print(f"{len(trazos)} trazos, {antes} -> {os.path.getsize(args.comprimir)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,30 @@
+from startup import StartupMarks, first_frame, importtime_enabled, lazy_import, profile
+marcas = StartupMarks()  # Antes de cualquier otro import, para medir el arranque
+
 import customtkinter as ctk
-from PIL import Image
+import argparse
 import os
-from tkintermapview import TkinterMapView  # Importar la librería para el mapa interactivo
-from tkinter import filedialog, messagebox
-from typing import Dict, List, Tuple, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple, Optional
 from dataclasses import dataclass
 from functools import partial
+from config import ASSETS_PATH, DOCS_PATH, TILE_SERVER, TILES_OFFLINE, TILES_PATH
+from assets import load_variant
+from docstore import DocumentStore
+from planner import RIDE
+from service import KioskService
+from uploads import UploadQueue
 
-# Constants
-ASSETS_PATH = r"C:\Python\AyVoy\INTER"
-DATA_PATH = r"C:\Python\AyVoy\USERS"
-ROUTES_PATH = r"C:\Python\AyVoy\ROUTES"
-DOCS_PATH = r"C:\Python\AyVoy\TRAMITES"
+# Sólo se cargan al usarse por primera vez: tkintermapview y sus dependencias
+# al abrir el mapa, el pool de fotos con la primera imagen, los diálogos al mostrarse
+filedialog = lazy_import("tkinter.filedialog")
+messagebox = lazy_import("tkinter.messagebox")
+mapview = lazy_import("mapview")  # Mapa interactivo con caché local de teselas
+tiles = lazy_import("tiles")
+imaging = lazy_import("imaging")
+marcas.mark("imports")
 
 @dataclass
 class AppConfig:
@@ -19,6 +32,23 @@ class AppConfig:
     TITLE = "Ventana Principal"
     MAP_CENTER = (21.88234, -102.28259)
     MAP_ZOOM = 13
+    SEARCH_DEBOUNCE_MS = 150  # Espera tras la última tecla antes de buscar
+    MAX_SEARCH_RESULTS = 50  # Opciones máximas en la lista desplegable
+    ZOOM_POLL_MS = 250  # Cada cuánto se revisa el zoom para ajustar el detalle del trazo
+    NETWORK_BATCH = 100  # Trazos o marcadores de la red que se dibujan por vuelta del ciclo de Tk
+    NETWORK_MARGIN = 0.5  # Fracción de pantalla que se dibuja de más alrededor, para arrastrar sin huecos
+    NETWORK_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#9467bd", "#8c564b", "#e377c2", "#17becf", "#bcbd22"]
+    # Imágenes de la interfaz: (archivo en ASSETS_PATH, tamaño máximo, ajustar a la proporción)
+    LOGO_IMAGE = ("ayVOY.png", (200, 200), True)
+    FOLDER_ICON = ("FOLDER.png", (30, 30), False)
+    SALDO_ICON = ("DINERO.png", (400, 40), True)
+    MAX_CACHED_IMAGES = 32
+    UPLOAD_WORKERS = 2  # Documentos que se copian a la vez; el resto espera en cola
+    UPLOAD_POLL_MS = 100  # Cada cuánto se actualiza el avance de las subidas
+    UPLOAD_STATUS_MS = 3000  # Tiempo que queda visible el aviso al terminar
+    MOVEMENT_ROWS = 7  # Filas de movimientos que existen a la vez en la pantalla de saldo
+    MOVEMENT_PAGE_SIZE = 50  # Movimientos que se leen del almacenamiento por consulta
+    RECENT_DAYS = 30  # Periodo que muestra la pantalla de saldo por defecto
     BUTTON_STYLE = {
         "corner_radius": 20,
         "font": ("Arial Black", 14),
@@ -26,20 +56,69 @@ class AppConfig:
     }
 
 class ResourceManager:
-    def __init__(self):
-        self._cached_images: Dict[str, ctk.CTkImage] = {}
+    """Imágenes de la interfaz ya reducidas; ``warm`` las decodifica en un hilo al arrancar."""
+
+    def __init__(self, max_images: int = AppConfig.MAX_CACHED_IMAGES):
+        self.max_images = max_images
+        self._cached_images: "OrderedDict[str, ctk.CTkImage]" = OrderedDict()
+        self._decoded: Dict[str, Future] = {}  # Una decodificación por imagen, en curso o lista
+        self._lock = threading.Lock()
     
-    def get_image(self, path: str, size: Tuple[int, int]) -> ctk.CTkImage:
-        cache_key = f"{path}_{size}"
-        if cache_key not in self._cached_images:
-            image = Image.open(path)
-            image.thumbnail(size)
-            self._cached_images[cache_key] = ctk.CTkImage(
-                light_image=image,
-                dark_image=image,
-                size=size
-            )
-        return self._cached_images[cache_key]
+    def warm(self, specs: List[Tuple[str, Tuple[int, int]]]):
+        with self._lock:
+            pendientes = [(path, size, self._decoded.setdefault(f"{path}_{size}", Future()))
+                          for path, size in specs if f"{path}_{size}" not in self._decoded]
+        def decodificar():
+            for path, size, futuro in pendientes:
+                try:
+                    futuro.set_result(load_variant(path, size))
+                except OSError as e:
+                    print(f"Error al precargar {path}: {e}")
+                    futuro.set_exception(e)
+        threading.Thread(target=decodificar, daemon=True).start()
+    
+    def _decode(self, path: str, size: Tuple[int, int]) -> "Image.Image":
+        """La imagen de warm si ya la tiene o la está decodificando; si no, se decodifica aquí."""
+        key = f"{path}_{size}"
+        with self._lock:
+            futuro = self._decoded.get(key)
+            propio = futuro is None or (futuro.done() and futuro.exception() is not None)
+            if propio:
+                futuro = self._decoded[key] = Future()
+        if not propio:
+            try:
+                return futuro.result()
+            except OSError:
+                pass  # warm ya lo avisó; se reintenta abajo
+            with self._lock:
+                futuro = self._decoded[key] = Future()
+        try:
+            futuro.set_result(load_variant(path, size))
+        except OSError as e:
+            futuro.set_exception(e)
+        return futuro.result()
+    
+    def get_image(self, path: str, size: Tuple[int, int], fit: bool = False) -> ctk.CTkImage:
+        """CTkImage de ``path``; con ``fit`` se muestra con la proporción original dentro de ``size``."""
+        cache_key = f"{path}_{size}_{fit}"
+        image_ctk = self._cached_images.get(cache_key)
+        if image_ctk is not None:
+            self._cached_images.move_to_end(cache_key)
+            return image_ctk
+        image = self._decode(path, size)
+        image_ctk = ctk.CTkImage(
+            light_image=image,
+            dark_image=image,
+            size=image.size if fit else size
+        )
+        self._cached_images[cache_key] = image_ctk
+        if len(self._cached_images) > self.max_images:
+            self._cached_images.popitem(last=False)
+        return image_ctk
+    
+    def asset(self, spec: Tuple[str, Tuple[int, int], bool]) -> ctk.CTkImage:
+        nombre, size, fit = spec
+        return self.get_image(os.path.join(ASSETS_PATH, nombre), size, fit)
 
 class DocumentManager:
     REQUIRED_DOCS = {
@@ -74,34 +153,6 @@ class DocumentManager:
                          command=partial(upload_callback, doc)
                          ).pack(side="right", padx=10)
 
-class RouteManager:
-    def __init__(self):
-        self._routes: Dict[str, List[Tuple[float, float]]] = {}
-        self._descriptions: Dict[str, str] = {}
-        self._load_routes()
-        self._load_descriptions()
-
-    def _load_routes(self):
-        try:
-            with open(f"{ROUTES_PATH}/rutas.txt", "r") as f:
-                self._routes = {line.strip(): [] for line in f}
-        except FileNotFoundError:
-            print("Routes file not found")
-
-    def _load_descriptions(self):
-        try:
-            with open(f"{ROUTES_PATH}/destinos.txt", "r", encoding="utf-8") as f:
-                self._descriptions = dict(
-                    line.strip().split(":", 1) for line in f if ":" in line
-                )
-        except FileNotFoundError:
-            print("Descriptions file not found")
-
-    def search_routes(self, query: str) -> List[str]:
-        if not query:
-            return list(self._routes.keys())
-        return [r for r in self._routes if query.lower() in r.lower()]
-
 class UIFactory:
     @staticmethod
     def create_button(parent, **kwargs) -> ctk.CTkButton:
@@ -118,6 +169,126 @@ class UIFactory:
     def create_entry(parent, **kwargs) -> ctk.CTkEntry:
         return ctk.CTkEntry(parent, **kwargs)
 
+class ScreenManager:
+    """Pantallas construidas una sola vez que se alternan con pack_forget."""
+
+    def __init__(self, root):
+        self.root = root
+        self._frames: Dict[str, ctk.CTkFrame] = {}
+        self._bindings: List[str] = []
+        self.current: Optional[str] = None
+
+    def show(self, name: str, fresh: bool = False) -> Tuple[ctk.CTkFrame, bool]:
+        for sequence in self._bindings:
+            self.root.unbind(sequence)
+        self._bindings = []
+        if self.current is not None and self.current in self._frames:
+            self._frames[self.current].pack_forget()
+        if fresh and name in self._frames:
+            self._frames.pop(name).destroy()
+        frame = self._frames.get(name)
+        nueva = frame is None
+        if nueva:
+            frame = ctk.CTkFrame(self.root, fg_color="transparent")
+            self._frames[name] = frame
+        frame.pack(fill="both", expand=True)
+        frame.tkraise()
+        self.current = name
+        return frame, nueva
+
+    def bind(self, sequence: str, callback):
+        self.root.bind(sequence, callback)
+        self._bindings.append(sequence)
+
+    def discard(self, name: Optional[str] = None):
+        """Destruye una pantalla (o todas) para que se construya de nuevo."""
+        nombres = [name] if name is not None else list(self._frames)
+        for nombre in nombres:
+            frame = self._frames.pop(nombre, None)
+            if frame is not None:
+                frame.destroy()
+        if self.current in nombres:
+            self.current = None
+
+    @staticmethod
+    def set_visible(widget, visible: bool, **pack_options):
+        if visible:
+            widget.pack(**pack_options)
+        else:
+            widget.pack_forget()
+
+class VirtualList(ctk.CTkFrame):
+    """Lista larga que sólo crea las filas que caben a la vista y pide los datos por páginas."""
+
+    def __init__(self, parent, total: int, fetch: Callable[[int, int], List[str]],
+                 rows: int = AppConfig.MOVEMENT_ROWS, page_size: int = AppConfig.MOVEMENT_PAGE_SIZE,
+                 max_pages: int = 8, empty_text: str = "", **kwargs):
+        super().__init__(parent, **kwargs)
+        self.total = total
+        self.fetch = fetch
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.first = 0
+        self._pages: "OrderedDict[int, List[str]]" = OrderedDict()
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._scroll_command)
+        self.scrollbar.pack(side="right", fill="y", pady=5)
+        self._labels = [ctk.CTkLabel(self, text="", font=("Arial", 12), text_color="#333333", anchor="w")
+                        for _ in range(rows)]
+        for label in self._labels:
+            label.pack(fill="x", padx=10, pady=2)
+        for widget in [self] + self._labels:
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                widget.bind(sequence, self._wheel)
+        if total == 0:
+            self._labels[0].configure(text=empty_text, text_color="#666666", anchor="center")
+        self._render()
+
+    def _row(self, index: int) -> str:
+        numero, posicion = divmod(index, self.page_size)
+        pagina = self._pages.get(numero)
+        if pagina is None:
+            pagina = self.fetch(numero * self.page_size, self.page_size)
+            self._pages[numero] = pagina
+            if len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(numero)
+        return pagina[posicion] if posicion < len(pagina) else ""
+
+    def _render(self):
+        if self.total == 0:
+            self.scrollbar.set(0, 1)
+            return
+        for i, label in enumerate(self._labels):
+            indice = self.first + i
+            label.configure(text=self._row(indice) if indice < self.total else "")
+        fin = min(self.first + len(self._labels), self.total)
+        self.scrollbar.set(self.first / self.total, fin / self.total)
+
+    def scroll_to(self, first: int):
+        first = max(0, min(first, self.total - len(self._labels)))
+        if first != self.first:
+            self.first = first
+            self._render()
+
+    def _scroll_command(self, accion: str, valor, unidades: str = "units"):
+        # Mismo protocolo que el command de una barra de tkinter
+        if accion == "moveto":
+            self.scroll_to(round(float(valor) * self.total))
+        else:
+            paso = len(self._labels) if unidades == "pages" else 1
+            self.scroll_to(self.first + int(valor) * paso)
+
+    def _wheel(self, event):
+        if event.num == 4:
+            delta = -1
+        elif event.num == 5:
+            delta = 1
+        else:
+            delta = -1 if event.delta > 0 else 1
+        self._scroll_command("scroll", delta)
+
 class App:
     def __init__(self, root):
         self.root = root
@@ -128,41 +299,63 @@ class App:
         ctk.set_default_color_theme("blue")
         self.sesion_iniciada = False
         self.folio_actual = None  # Nueva variable para almacenar el folio
+        # Folios, saldos, historial y rutas; la misma lógica que sirve api.py
+        self.servicio = KioskService()
+        self.servicio.start()  # Mantenimiento del almacenamiento en segundo plano
+        self.tile_cache = None  # Teselas del mapa guardadas en disco, se abre con el mapa
+        self.busqueda_pendiente = None  # Búsqueda programada con root.after
+        self.ultima_busqueda = None
+        self.forma_actual = None  # Ruta dibujada en el mapa y su línea
+        self.trazo_actual = None
+        self.zoom_dibujado = None
+        self.revision_zoom = None  # Revisión de zoom programada con root.after
+        self.objetos_mapa = []  # Marcadores y líneas de la ruta, viaje o búsqueda actual
+        self.red = None  # Todas las rutas en tramos (overlay.py), se construye en un hilo al encender el switch
+        self.red_error = None
+        self.red_tramos = {}  # Tramo dibujado -> (línea, zoom con que se simplificó)
+        self.red_grupos = {}  # Grupo de paradas dibujado -> marcador
+        self.red_vista = None  # Última vista revisada y lo que debe verse en ella
+        self.red_objetivo = (set(), {}, None)
+        self.revision_red = None
+        self.screens = ScreenManager(self.root)  # Cada pantalla se construye una vez
+        self.documentos = DocumentStore(DOCS_PATH)  # Un archivo por contenido, índice por folio
+        self.procesador = None  # Fotos reducidas en otros procesos, se crea con la primera
+        self.subidas = UploadQueue(AppConfig.UPLOAD_WORKERS)  # Copias de documentos en segundo plano
+        self.revision_subidas = None
+        self.Crear_Aviso_Subidas()
+        self.resources = ResourceManager()  # Imágenes ya reducidas, precargadas en segundo plano
+        self.resources.warm([(os.path.join(ASSETS_PATH, nombre), size) for nombre, size, _ in
+                             (AppConfig.LOGO_IMAGE, AppConfig.FOLDER_ICON, AppConfig.SALDO_ICON)])
         self.Menu_Principal()
 
     def Menu_Principal(self):
         self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("menu")
         
-        # Cargar y redimensionar la imagen
-        image_path = r"C:\Python\AyVoy\INTER\ayVOY.png"
-        original_image = Image.open(image_path)
-        original_image.thumbnail((200, 200))
-        logo_image = ctk.CTkImage(
-            light_image=original_image,
-            dark_image=original_image,
-            size=original_image.size
-        )
-        
-        # Etiqueta con la imagen
-        ctk.CTkLabel(self.root, image=logo_image, text="", bg_color="#F5F5F5").pack(pady=(130, 40))
-        
-        # Etiqueta de bienvenida
-        ctk.CTkLabel(
-            self.root,
-            text="Bienvenido",
-            font=("Bahnschrift Light", 22, "bold"),
-            text_color="#0056b3",
-            bg_color="#F5F5F5"
-        ).pack(pady=10)
-        
-        # Botones
-        UIFactory.create_button(self.root, text="Iniciar Sesión", command=self.Abrir_Menu).pack(pady=10, ipadx=10, ipady=5)
-        UIFactory.create_button(self.root, text="Trámites", command=self.Abrir_Tramites).pack(pady=10, ipadx=10, ipady=5)
-        UIFactory.create_button(self.root, text="Ver Mapa", command=self.Abrir_Mapa).pack(pady=10, ipadx=10, ipady=5)
+        if nueva:
+            # Logo ya reducido por el ResourceManager
+            logo_image = self.resources.asset(AppConfig.LOGO_IMAGE)
+            
+            # Etiqueta con la imagen
+            ctk.CTkLabel(pantalla, image=logo_image, text="", bg_color="#F5F5F5").pack(pady=(130, 40))
+            
+            # Etiqueta de bienvenida
+            ctk.CTkLabel(
+                pantalla,
+                text="Bienvenido",
+                font=("Bahnschrift Light", 22, "bold"),
+                text_color="#0056b3",
+                bg_color="#F5F5F5"
+            ).pack(pady=10)
+            
+            # Botones
+            UIFactory.create_button(pantalla, text="Iniciar Sesión", command=self.Abrir_Menu).pack(pady=10, ipadx=10, ipady=5)
+            UIFactory.create_button(pantalla, text="Trámites", command=self.Abrir_Tramites).pack(pady=10, ipadx=10, ipady=5)
+            UIFactory.create_button(pantalla, text="Ver Mapa", command=self.Abrir_Mapa).pack(pady=10, ipadx=10, ipady=5)
+            self.menu_cerrar_sesion = UIFactory.create_button(pantalla, text="Cerrar Sesión", command=self.Cerrar_Sesion)
         
         # Botón de cerrar sesión (visible solo si la sesión está iniciada)
-        if self.sesion_iniciada:
-            UIFactory.create_button(self.root, text="Cerrar Sesión", command=self.Cerrar_Sesion).pack(pady=10, ipadx=10, ipady=5)
+        ScreenManager.set_visible(self.menu_cerrar_sesion, self.sesion_iniciada, pady=10, ipadx=10, ipady=5)
 
     def Alternar_Modo_Oscuro(self):
         """Alterna entre modo claro y oscuro."""
@@ -176,37 +369,41 @@ class App:
 
         # Actualizar la página actual con el nuevo fondo
         self.Limpiar_Ventana()
+        self.screens.discard()
+        self.forma_actual = self.trazo_actual = None
         self.Menu_Principal()
 
     def Abrir_Menu(self):
         self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("sesion")
         
-        ctk.CTkLabel(self.root, text="Iniciar Sesión", font=("Arial", 16), text_color="#0056b3").pack(pady=10)
-        ctk.CTkLabel(self.root, text="Folio: ", text_color="#0056b3").pack(pady=5)
+        if nueva:
+            ctk.CTkLabel(pantalla, text="Iniciar Sesión", font=("Arial", 16), text_color="#0056b3").pack(pady=10)
+            ctk.CTkLabel(pantalla, text="Folio: ", text_color="#0056b3").pack(pady=5)
+            
+            # Entrada de texto para el folio con binding de Enter
+            self.folio_entry = UIFactory.create_entry(pantalla)
+            self.folio_entry.pack(pady=5)
+            self.folio_entry.bind("<Return>", lambda event: self.Validar_Folio())  # Al dar Enter, valida el folio
+            
+            # Etiqueta para mensajes de error
+            self.error_label = ctk.CTkLabel(pantalla, text="", font=("Arial", 12), text_color="red")
+            self.error_label.pack(pady=5)
+            
+            # Botones
+            UIFactory.create_button(pantalla, text="Ingresar", command=self.Validar_Folio).pack(pady=10, ipadx=10, ipady=5)
+            UIFactory.create_button(pantalla, text="Regresar", command=self.Menu_Principal).pack(pady=10, ipadx=10, ipady=5)
         
-        # Entrada de texto para el folio con binding de Enter
-        self.folio_entry = UIFactory.create_entry(self.root)
-        self.folio_entry.pack(pady=5)
-        self.folio_entry.bind("<Return>", lambda event: self.Validar_Folio())  # Al dar Enter, valida el folio
+        # Cada visita empieza con el formulario vacío
+        self.folio_entry.delete(0, "end")
+        self.error_label.configure(text="")
         self.folio_entry.focus()  # Dar foco al campo de entrada
-        
-        # Etiqueta para mensajes de error
-        self.error_label = ctk.CTkLabel(self.root, text="", font=("Arial", 12), text_color="red")
-        self.error_label.pack(pady=5)
-        
-        # Botones
-        UIFactory.create_button(self.root, text="Ingresar", command=self.Validar_Folio).pack(pady=10, ipadx=10, ipady=5)
-        UIFactory.create_button(self.root, text="Regresar", command=self.Menu_Principal).pack(pady=10, ipadx=10, ipady=5)
     
     def Validar_Folio(self):
         folio = self.folio_entry.get().strip()
-        archivo_path = r"C:\Python\AyVoy\USERS\usuarios.txt"
         
         try:
-            with open(archivo_path, "r") as archivo:
-                folios = [line.strip().split(',')[0] for line in archivo.readlines()]
-            
-            if folio in folios:
+            if self.servicio.validate_folio(folio):
                 self.sesion_iniciada = True
                 self.folio_actual = folio  # Guardar el folio actual
                 self.Abrir_Mapa()
@@ -217,39 +414,32 @@ class App:
     
     def Abrir_Mapa(self):
         self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("mapa")
         
-        # Título
-        ctk.CTkLabel(self.root, text="Busca tu ruta!", font=("Arial", 16), text_color="#0056b3").pack(pady=10)
-        
-        # Frame para el buscador y el botón de saldo
-        search_frame = ctk.CTkFrame(self.root, fg_color="transparent")
-        search_frame.pack(pady=5)
-        
-        # Entrada de texto para buscar rutas
-        self.search_entry = UIFactory.create_entry(search_frame, placeholder_text="Buscar ruta...")
-        self.search_entry.pack(side="left", pady=5)
-        self.search_entry.bind("<KeyRelease>", self.Buscar_Rutas)
-        self.search_entry.focus()
-        
-        # Botón de saldo (solo visible si la sesión está iniciada)
-        if self.sesion_iniciada:
+        # El mapa se construye una sola vez: al regresar conserva sus teselas y la ruta dibujada
+        if nueva:
+            # Título
+            ctk.CTkLabel(pantalla, text="Busca tu ruta!", font=("Arial", 16), text_color="#0056b3").pack(pady=10)
+            
+            # Frame para el buscador y el botón de saldo
+            search_frame = ctk.CTkFrame(pantalla, fg_color="transparent")
+            search_frame.pack(pady=5)
+            
+            # Entrada de texto para buscar rutas
+            self.search_entry = UIFactory.create_entry(search_frame, placeholder_text="Buscar ruta...")
+            self.search_entry.pack(side="left", pady=5)
+            self.search_entry.bind("<KeyRelease>", self.Buscar_Rutas)
+            
+            # Botón de saldo (se muestra sólo si la sesión está iniciada)
+            self.saldo_button = None
             try:
-                dinero_path = r"C:\Python\AyVoy\INTER\DINERO.png"
+                dinero_path = os.path.join(ASSETS_PATH, AppConfig.SALDO_ICON[0])
                 if os.path.exists(dinero_path):
-                    dinero_image = Image.open(dinero_path)
-                    # Calcular dimensiones manteniendo proporción
-                    original_width, original_height = dinero_image.size
-                    target_height = 40  # Altura deseada
-                    aspect_ratio = original_width / original_height
-                    target_width = int(target_height * aspect_ratio)
-                    
-                    dinero_icon = ctk.CTkImage(
-                        light_image=dinero_image,
-                        dark_image=dinero_image,
-                        size=(target_width, target_height)
-                    )
+                    # Ícono de 40 px de alto manteniendo proporción
+                    dinero_icon = self.resources.asset(AppConfig.SALDO_ICON)
+                    target_width, target_height = dinero_icon.cget("size")
                     
-                    saldo_button = ctk.CTkButton(
+                    self.saldo_button = ctk.CTkButton(
                         search_frame,
                         text="",
                         image=dinero_icon,
@@ -259,96 +449,127 @@ class App:
                         width=target_width,
                         height=target_height
                     )
-                    saldo_button.pack(side="left", padx=10)
             except Exception as e:
                 print(f"Error al cargar el ícono de saldo: {e}")
-        
-        # Lista desplegable para mostrar resultados
-        self.result_dropdown = ctk.CTkOptionMenu(
-            self.root, 
-            values=["Selecciona una ruta"], 
-            width=300,
-            command=self.Mostrar_Descripcion_Ruta
-        )
-        self.result_dropdown.pack(pady=5)
-        
-        # Mapa interactivo
-        self.map_widget = TkinterMapView(self.root, width=360, height=300, corner_radius=0)
-        self.map_widget.pack(pady=10)
-        self.map_widget.set_position(21.88234, -102.28259)
-        self.map_widget.set_zoom(13)
-        
-        # Etiqueta para mostrar la descripción de la ruta
-        self.descripcion_label = ctk.CTkLabel(
-            self.root, 
-            text="", 
-            font=("Arial", 12), 
-            text_color="#0056b3", 
-            wraplength=300
-        )
-        self.descripcion_label.pack(pady=10)
-        
-        # Botones
-        UIFactory.create_button(
-            self.root, 
-            text="Regresar",
-            command=self.Menu_Principal
-        ).pack(pady=10)
-        
-        # Botón de cerrar sesión (visible solo si la sesión está iniciada)
-        if self.sesion_iniciada:
+            
+            # Lista desplegable para mostrar resultados
+            self.result_dropdown = ctk.CTkOptionMenu(
+                pantalla, 
+                values=["Selecciona una ruta"], 
+                width=300,
+                command=self.Mostrar_Descripcion_Ruta
+            )
+            self.result_dropdown.pack(pady=5)
+            
+            # Mapa interactivo
+            # El mapa y tiles.py seed usan el mismo servidor; la caché guarda de cuál son sus teselas
+            try:
+                self.tile_cache = tiles.TileCache(TILES_PATH, TILE_SERVER)
+            except ValueError as e:
+                print(f"No se usa la caché de teselas: {e}")
+                self.tile_cache = None
+            self.map_widget = mapview.CachedMapView(pantalla, tile_cache=self.tile_cache, offline=TILES_OFFLINE,
+                                                    width=360, height=300, corner_radius=0)
+            self.map_widget.set_tile_server(TILE_SERVER)
+            self.map_widget.pack(pady=10)
+            self.map_widget.set_position(21.88234, -102.28259)
+            self.map_widget.set_zoom(13)
+            
+            # Viajes combinando rutas: clic derecho en el mapa para marcar salida y llegada
+            self.viaje_origen = None
+            self.map_widget.add_right_click_menu_command("Salir de aquí", self.Marcar_Origen, pass_coords=True)
+            self.map_widget.add_right_click_menu_command("Llegar aquí", self.Marcar_Destino, pass_coords=True)
+            # Clic en el mapa: rutas que pasan cerca de ese punto
+            self.map_widget.add_left_click_map_command(self.Rutas_Cercanas)
+            
+            # Toda la red encima del mapa; sólo se dibuja lo que cae en la vista
+            self.red_switch = ctk.CTkSwitch(pantalla, text="Ver todas las rutas", command=self.Alternar_Red)
+            self.red_switch.pack(pady=5)
+            
+            # Etiqueta para mostrar la descripción de la ruta
+            self.descripcion_label = ctk.CTkLabel(
+                pantalla, 
+                text="", 
+                font=("Arial", 12), 
+                text_color="#0056b3", 
+                wraplength=300
+            )
+            self.descripcion_label.pack(pady=10)
+            
+            # Botones
             UIFactory.create_button(
-                self.root, 
+                pantalla, 
+                text="Regresar",
+                command=self.Menu_Principal
+            ).pack(pady=10)
+            self.mapa_cerrar_sesion = UIFactory.create_button(
+                pantalla, 
                 text="Cerrar Sesión",
                 command=self.Cerrar_Sesion
-            ).pack(pady=10)
+            )
+            
+            # Cargar las rutas después de crear el dropdown
+            self.Cargar_Rutas()
+        
+        # Botones de saldo y de cerrar sesión (visibles solo si la sesión está iniciada)
+        if self.saldo_button is not None:
+            ScreenManager.set_visible(self.saldo_button, self.sesion_iniciada, side="left", padx=10)
+        ScreenManager.set_visible(self.mapa_cerrar_sesion, self.sesion_iniciada, pady=10)
+        self.search_entry.focus()
         
-        # Cargar las rutas después de crear el dropdown
-        self.Cargar_Rutas()
+        # Retomar el ajuste de detalle de la ruta que quedó dibujada
+        if self.forma_actual is not None and self.revision_zoom is None:
+            self.revision_zoom = self.root.after(AppConfig.ZOOM_POLL_MS, self.Revisar_Zoom)
+        if self.red_switch.get() and self.revision_red is None:
+            self.revision_red = self.root.after(AppConfig.ZOOM_POLL_MS, self.Revisar_Red)
 
     def Cargar_Rutas(self):
         """Carga las rutas desde el archivo"""
-        archivo_path = r"C:\Python\AyVoy\ROUTES\rutas.txt"
         try:
-            with open(archivo_path, "r") as archivo:
-                rutas = [line.strip() for line in archivo.readlines()]
-                self.result_dropdown.configure(values=rutas)
-                self.result_dropdown.set("Selecciona una ruta")
+            rutas = self.servicio.routes()
+            self.result_dropdown.configure(values=rutas)
+            self.result_dropdown.set("Selecciona una ruta")
+            self.ultima_busqueda = ""
         except FileNotFoundError:
             self.result_dropdown.configure(values=["Error: Archivo no encontrado"])
             self.result_dropdown.set("Error: Archivo no encontrado")
 
     def Mostrar_Descripcion_Ruta(self, ruta_seleccionada):
-        archivo_path = r"C:\Python\AyVoy\ROUTES\destinos.txt"
         try:
-            with open(archivo_path, "r", encoding="utf-8") as archivo:
-                lineas = archivo.readlines()
-                descripciones = {line.split(":")[0].strip(): line.split(":")[1].strip() for line in lineas}
-                
-                # Mostrar la descripción de la ruta seleccionada
-                if ruta_seleccionada in descripciones:
-                    self.descripcion_label.configure(text=descripciones[ruta_seleccionada])
-                    self.Dibujar_Ruta(ruta_seleccionada)  # Dibujar la ruta en el mapa
-                else:
-                    self.descripcion_label.configure(text="Descripción no disponible.")
+            descripcion = self.servicio.route_description(ruta_seleccionada)
+            
+            # Mostrar la descripción de la ruta seleccionada
+            if descripcion is not None:
+                self.descripcion_label.configure(text=descripcion)
+                self.Dibujar_Ruta(ruta_seleccionada)  # Dibujar la ruta en el mapa
+            else:
+                self.descripcion_label.configure(text="Descripción no disponible.")
         except FileNotFoundError:
             self.descripcion_label.configure(text="Error: Archivo de descripciones no encontrado.")
 
     def Buscar_Rutas(self, event):
+        """Reprograma la búsqueda en cada tecla; sólo corre cuando se deja de escribir."""
+        if self.busqueda_pendiente is not None:
+            self.root.after_cancel(self.busqueda_pendiente)
+        self.busqueda_pendiente = self.root.after(AppConfig.SEARCH_DEBOUNCE_MS, self.Aplicar_Busqueda)
+    
+    def Aplicar_Busqueda(self):
+        self.busqueda_pendiente = None
         query = self.search_entry.get().strip().lower()
-        archivo_path = r"C:\Python\AyVoy\ROUTES\rutas.txt"
+        
+        # Teclas que no cambian el texto (flechas, Shift...) no actualizan la lista
+        if query == self.ultima_busqueda:
+            return
+        self.ultima_busqueda = query
         
         try:
-            with open(archivo_path, "r") as archivo:
-                rutas = [line.strip() for line in archivo.readlines()]
-            
             # Si el buscador está vacío, mostrar todas las rutas
             if not query:
-                self.result_dropdown.configure(values=rutas)
+                self.result_dropdown.configure(values=self.servicio.routes())
                 self.result_dropdown.set("Selecciona una ruta")
             else:
-                # Filtrar rutas que coincidan con la búsqueda
-                resultados = [ruta for ruta in rutas if query in ruta.lower()]
+                # Rutas por relevancia: nombre o descripción, sin acentos y con errores de dedo
+                resultados = self.servicio.search_routes(query, AppConfig.MAX_SEARCH_RESULTS)
                 
                 # Actualizar la lista desplegable con los resultados
                 if resultados:
@@ -361,172 +582,318 @@ class App:
             self.result_dropdown.configure(values=["Error: Archivo no encontrado"])
             self.result_dropdown.set("Error: Archivo no encontrado")
     
+    def Limpiar_Mapa(self):
+        # Limpiar marcadores y rutas anteriores; la red de fondo se queda
+        for objeto in self.objetos_mapa:
+            objeto.delete()
+        self.objetos_mapa = []
+        self.forma_actual = self.trazo_actual = None
+
+    def Poner_Marcador(self, lat, lon, texto):
+        marcador = self.map_widget.set_marker(lat, lon, text=texto)
+        self.objetos_mapa.append(marcador)
+        return marcador
+
+    def Poner_Linea(self, puntos, **estilo):
+        linea = self.map_widget.set_path(puntos, **estilo)
+        self.objetos_mapa.append(linea)
+        return linea
+
     def Dibujar_Ruta(self, ruta_seleccionada):
-        # Diccionario con coordenadas aproximadas de las rutas
-        rutas_coordenadas = {
-            "Ruta 1": [(21.88234, -102.28259), (21.885, -102.29)],  # Ojocaliente al centro
-            "Ruta 2": [(21.885, -102.29), (21.88, -102.28)],  # Morelos al centro
-            "Ruta 3": [(21.88, -102.28), (21.88234, -102.28259)],  # Insurgentes al centro
-            "Ruta 4": [(21.88234, -102.28259), (21.886, -102.27)],  # Héroes al centro
-            "Ruta 5": [(21.88234, -102.28259), (21.88, -102.26)],  # Pilar Blanco al centro
-            "Ruta 6": [(21.88234, -102.28259), (21.89, -102.25)],  # Villas de Nuestra Señora de la Asunción al centro
-            "Ruta 7": [(21.88234, -102.28259), (21.88, -102.24)],  # Mirador de las Culturas al centro
-            "Ruta 8": [(21.88234, -102.28259), (21.87, -102.23)],  # Lomas del Ajedrez al centro
-            "Ruta 9": [(21.88234, -102.28259), (21.86, -102.22)],  # Villa Montaña al centro
-            "Ruta 10": [(21.88234, -102.28259), (21.85, -102.21)],  # Villas del Puertecito al centro
-            "Ruta 11": [(21.88234, -102.28259), (21.84, -102.20)],  # Municipio Libre al centro
-            "Ruta 12": [(21.88234, -102.28259), (21.83, -102.19)],  # Valle de los Cactus al centro
-            "Ruta 14": [(21.88234, -102.28259), (21.82, -102.18)],  # Rodolfo Landeros al centro
-            "Ruta 16": [(21.88234, -102.28259), (21.81, -102.17)],  # Villas de la Cantera al centro
-            "Ruta 18": [(21.88234, -102.28259), (21.80, -102.16)],  # Villa Teresa al centro
-            "Ruta 19": [(21.88234, -102.28259), (21.79, -102.15)],  # Colinas del Río al fraccionamiento Morelos
-            "Ruta 20N": [(21.88234, -102.28259), (21.88, -102.28), (21.89, -102.29)],  # Circuito Primer Anillo Norte
-            "Ruta 20S": [(21.88234, -102.28259), (21.87, -102.27), (21.86, -102.26)],  # Circuito Primer Anillo Sur
-            "Ruta 23": [(21.88234, -102.28259), (21.89, -102.25)],  # Villas de Nuestra Señora de la Asunción al centro
-            "Ruta 24": [(21.88234, -102.28259), (21.88, -102.24)],  # Jesús Terán al centro
-            "Ruta 25": [(21.88234, -102.28259), (21.87, -102.23)],  # Villa de las Palmas al centro
-            "Ruta 27": [(21.88234, -102.28259), (21.86, -102.22)],  # Lomas del Mirador al centro
-            "Ruta 28": [(21.88234, -102.28259), (21.85, -102.21)],  # Los Pericos al centro
-            "Ruta 29": [(21.88234, -102.28259), (21.84, -102.20)],  # Villas de Nuestra Señora de la Asunción Sector Guadalupe al centro
-            "Ruta 30": [(21.88234, -102.28259), (21.83, -102.19)],  # Villa Montaña al centro
-            "Ruta 33": [(21.88234, -102.28259), (21.82, -102.18)],  # Villa Taurina al centro
-            "Ruta 34": [(21.88234, -102.28259), (21.81, -102.17)],  # Vistas del Sol al centro
-            "Ruta 35": [(21.88234, -102.28259), (21.80, -102.16)],  # Villa de las Norias al centro
-            "Ruta 40": [(21.88234, -102.28259), (21.89, -102.29), (21.88, -102.28)],  # Segundo Anillo de Circunvalación
-            "Ruta 50": [(21.88234, -102.28259), (21.87, -102.27), (21.86, -102.26)],  # Tercer Anillo de Circunvalación
-            "Ruta Especial UTR": [(21.88234, -102.28259), (21.85, -102.21)],  # Universidad Tecnológica de Aguascalientes
-        }
-        
-        # Limpiar marcadores y rutas anteriores
-        self.map_widget.delete_all_marker()
-        self.map_widget.delete_all_path()
+        self.Limpiar_Mapa()
+        self.viaje_origen = None
+        
+        try:
+            forma = self.servicio.route_shape(ruta_seleccionada)
+        except FileNotFoundError:
+            print("Archivo de geometrías no encontrado.")
+            return
         
         # Verificar si la ruta seleccionada tiene coordenadas
-        if ruta_seleccionada in rutas_coordenadas:
-            coordenadas = rutas_coordenadas[ruta_seleccionada]
+        if forma is not None and len(forma) >= 2:
+            # Marcadores sólo en las paradas, no en cada vértice del trazo
+            for i, (lat, lon) in enumerate(forma.stop_points(), 1):
+                self.Poner_Marcador(lat, lon, f"Parada {i}")
             
-            # Agregar marcadores en los puntos de la ruta
-            for lat, lon in coordenadas:
-                self.map_widget.set_marker(lat, lon, text=f"Punto ({lat}, {lon})")
-            
-            # Dibujar la línea de la ruta
-            self.map_widget.set_path(coordenadas, color="red", width=3)
+            # Dibujar la línea de la ruta con el detalle que pide el zoom actual
+            self.forma_actual = forma
+            self.Dibujar_Trazo()
+            if self.revision_zoom is None:
+                self.revision_zoom = self.root.after(AppConfig.ZOOM_POLL_MS, self.Revisar_Zoom)
         else:
             print("Ruta no encontrada o sin coordenadas definidas.")
+    
+    def Dibujar_Trazo(self):
+        zoom = round(self.map_widget.zoom)
+        # Copia: el mapa puede modificar su lista y la simplificada queda en caché
+        puntos = list(self.forma_actual.simplified(zoom))
+        if self.trazo_actual is None:
+            self.trazo_actual = self.Poner_Linea(puntos, color="red", width=3)
+        else:
+            self.trazo_actual.set_position_list(puntos)
+        self.zoom_dibujado = zoom
+    
+    def Revisar_Zoom(self):
+        # TkinterMapView no avisa cuando cambia el zoom, así que se consulta
+        self.revision_zoom = None
+        if self.forma_actual is None:
+            return
+        if round(self.map_widget.zoom) != self.zoom_dibujado:
+            self.Dibujar_Trazo()
+        self.revision_zoom = self.root.after(AppConfig.ZOOM_POLL_MS, self.Revisar_Zoom)
 
-    def Abrir_Tramites(self):
-        self.Limpiar_Ventana()
-        
-        # Título del menú
-        ctk.CTkLabel(self.root, text="Trámites", font=("Arial", 20, "bold"), 
-                     text_color="#0056b3").pack(pady=20)
+    def Alternar_Red(self):
+        if not self.red_switch.get():
+            self.Quitar_Red()
+            return
+        # Decodificar y simplificar todos los trazos tarda; Revisar_Red espera al hilo
+        self.red, self.red_error = None, None
+        threading.Thread(target=self.Cargar_Red, daemon=True).start()
+        if self.revision_red is None:
+            self.Revisar_Red()
+
+    def Cargar_Red(self):
+        try:
+            self.red = self.servicio.network_overlay()
+        except FileNotFoundError as e:
+            self.red_error = e
+
+    def Quitar_Red(self):
+        if self.revision_red is not None:
+            self.root.after_cancel(self.revision_red)
+            self.revision_red = None
+        for linea, _ in self.red_tramos.values():
+            linea.delete()
+        for marcador in self.red_grupos.values():
+            marcador.delete()
+        self.red_tramos, self.red_grupos = {}, {}
+        self.red_vista, self.red_objetivo = None, (set(), {}, None)
+
+    def Revisar_Red(self):
+        # Como con el zoom, se consulta la vista; sólo cambia lo que entró o salió de ella
+        self.revision_red = None
+        if self.red is None:
+            if self.red_error is not None:
+                self.descripcion_label.configure(text="Error: Archivo de geometrías no encontrado.")
+                self.red_switch.deselect()
+                return
+            self.revision_red = self.root.after(AppConfig.ZOOM_POLL_MS, self.Revisar_Red)
+            return
+        vista = self.map_widget.viewport()
+        if vista != self.red_vista:
+            self.red_vista = vista
+            (x0, y0, x1, y1), zoom = vista
+            mx, my = (x1 - x0) * AppConfig.NETWORK_MARGIN, (y1 - y0) * AppConfig.NETWORK_MARGIN
+            caja = (x0 - mx, y0 - my, x1 + mx, y1 + my)
+            self.red_objetivo = (self.red.chunks_in(caja), self.red.clusters(caja, zoom), zoom)
+        pendiente = self.Aplicar_Red(AppConfig.NETWORK_BATCH)
+        # Con trabajo pendiente se sigue en cuanto Tk atienda los eventos, no en ZOOM_POLL_MS
+        self.revision_red = self.root.after(1 if pendiente else AppConfig.ZOOM_POLL_MS, self.Revisar_Red)
+
+    def Aplicar_Red(self, limite):
+        """Acerca lo dibujado a red_objetivo con a lo más ``limite`` trazos o marcadores nuevos.
+
+        Regresa True si quedó trabajo para la siguiente vuelta.
+        """
+        tramos, grupos, zoom = self.red_objetivo
+        for tramo in [t for t in self.red_tramos if t not in tramos]:
+            self.red_tramos.pop(tramo)[0].delete()
+        for clave in [c for c in self.red_grupos if c not in grupos]:
+            self.red_grupos.pop(clave).delete()
         
-        # Botones de trámites
-        UIFactory.create_button(self.root, text="Tarjeta Discapacitado", 
-                     command=self.Tarjeta_Discapacitado).pack(pady=10, ipadx=10, ipady=5)
+        for tramo in tramos:
+            linea, dibujado = self.red_tramos.get(tramo, (None, None))
+            if dibujado == zoom:
+                continue
+            if limite == 0:
+                return True
+            puntos = self.red.chunk_points(tramo, zoom)
+            if linea is None:
+                color = AppConfig.NETWORK_COLORS[self.red.route_of(tramo) % len(AppConfig.NETWORK_COLORS)]
+                linea = self.map_widget.set_path(puntos, color=color, width=2)
+            else:
+                linea.set_position_list(puntos)
+            self.red_tramos[tramo] = (linea, zoom)
+            limite -= 1
+        for clave, (lat, lon, paradas) in grupos.items():
+            if clave in self.red_grupos:
+                continue
+            if limite == 0:
+                return True
+            self.red_grupos[clave] = self.map_widget.set_marker(
+                lat, lon, text=f"{paradas} paradas" if paradas > 1 else None,
+                marker_color_circle="white", marker_color_outside="#0056b3", text_color="#0056b3")
+            limite -= 1
+        return False
+
+    def Marcar_Origen(self, coords):
+        self.Limpiar_Mapa()
+        self.viaje_origen = tuple(coords)
+        self.Poner_Marcador(*self.viaje_origen, "Salida")
+        self.descripcion_label.configure(text="Ahora marca a dónde quieres llegar (clic derecho).")
+
+    def Marcar_Destino(self, coords):
+        if self.viaje_origen is None:
+            self.descripcion_label.configure(text="Primero marca de dónde sales (clic derecho).")
+            return
+        destino = tuple(coords)
+        try:
+            viaje = self.servicio.plan_trip(self.viaje_origen, destino)
+        except FileNotFoundError:
+            self.descripcion_label.configure(text="Error: Archivo de geometrías no encontrado.")
+            return
+        if viaje is None:
+            self.descripcion_label.configure(text="No encontramos un viaje entre esos puntos.")
+            return
         
-        UIFactory.create_button(self.root, text="Tarjeta Adulto Mayor",
-                     command=self.Tarjeta_Adulto_Mayor).pack(pady=10, ipadx=10, ipady=5)
+        origen = self.viaje_origen
+        self.Limpiar_Mapa()
+        self.Poner_Marcador(*origen, "Salida")
+        self.Poner_Marcador(*destino, "Llegada")
+        for tramo in viaje.tramos:
+            if tramo.modo == RIDE:
+                self.Poner_Linea(tramo.puntos, color="red", width=4)
+                self.Poner_Marcador(*tramo.puntos[0], f"Sube a {tramo.ruta}")
+            else:
+                self.Poner_Linea(tramo.puntos, color="gray", width=2)
+        self.descripcion_label.configure(text=viaje.resumen())
+        self.viaje_origen = None
+
+    def Abrir_Tramites(self):
+        self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("tramites")
         
-        UIFactory.create_button(self.root, text="Tarjeta Estudiante",
-                     command=self.Tarjeta_Estudiante).pack(pady=10, ipadx=10, ipady=5)
+        if nueva:
+            # Título del menú
+            ctk.CTkLabel(pantalla, text="Trámites", font=("Arial", 20, "bold"), 
+                         text_color="#0056b3").pack(pady=20)
+            
+            # Aviso y acceso a la sesión, visibles sólo sin folio
+            self.tramites_aviso = ctk.CTkLabel(pantalla, text="Inicia sesión con tu folio para subir\nlos documentos de un trámite.",
+                                               font=("Arial", 12), text_color="#666666")
+            self.tramites_sesion = UIFactory.create_button(pantalla, text="Iniciar Sesión", command=self.Abrir_Menu)
+            
+            # Botones de trámites
+            self.botones_tramite = [
+                UIFactory.create_button(pantalla, text="Tarjeta Discapacitado", command=self.Tarjeta_Discapacitado),
+                UIFactory.create_button(pantalla, text="Tarjeta Adulto Mayor", command=self.Tarjeta_Adulto_Mayor),
+                UIFactory.create_button(pantalla, text="Tarjeta Estudiante", command=self.Tarjeta_Estudiante),
+            ]
+            for boton in self.botones_tramite:
+                boton.pack(pady=10, ipadx=10, ipady=5)
+            
+            # Botón de regresar
+            UIFactory.create_button(pantalla, text="Regresar",
+                         command=self.Menu_Principal).pack(pady=20, ipadx=10, ipady=5)
         
-        # Botón de regresar
-        UIFactory.create_button(self.root, text="Regresar",
-                     command=self.Menu_Principal).pack(pady=20, ipadx=10, ipady=5)
+        # Los documentos se guardan por folio: sin sesión los trámites quedan deshabilitados
+        sin_sesion = self.folio_actual is None
+        for boton in self.botones_tramite:
+            boton.configure(state="disabled" if sin_sesion else "normal")
+        ScreenManager.set_visible(self.tramites_aviso, sin_sesion, pady=5, before=self.botones_tramite[0])
+        ScreenManager.set_visible(self.tramites_sesion, sin_sesion, pady=10, ipadx=10, ipady=5,
+                                  before=self.botones_tramite[0])
 
     def Tarjeta_Discapacitado(self):
         self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("tarjeta_discapacitado")
+        self.screens.bind("<Return>", lambda event: self.Abrir_Tramites())  # Enter regresa a Trámites mientras esta pantalla esté visible
+        if not nueva:
+            return
         
         # Título
-        ctk.CTkLabel(self.root, text="Documentos Requeridos", 
+        ctk.CTkLabel(pantalla, text="Documentos Requeridos", 
                      font=("Arial", 20, "bold"), text_color="#0056b3").pack(pady=10)
         
-        # Cargar icono de carpeta
-        folder_path = r"C:\Python\AyVoy\INTER\FOLDER.png"
-        folder_image = Image.open(folder_path)
-        folder_image.thumbnail((30, 30))
-        folder_icon = ctk.CTkImage(light_image=folder_image, dark_image=folder_image, size=(30, 30))
+        # Icono de carpeta, compartido por las tres pantallas de tarjeta
+        folder_icon = self.resources.asset(AppConfig.FOLDER_ICON)
         
         # Crear frames de documentos
         doc_manager = DocumentManager()
-        doc_manager.create_doc_frame(self.root, "discapacitado", folder_icon, self.Subir_Documento)
+        doc_manager.create_doc_frame(pantalla, "discapacitado", folder_icon,
+                                     partial(self.Subir_Documento, tramite="discapacitado"))
         
         # Sección de reactivación
-        ctk.CTkLabel(self.root, text="En caso de ser reactivación:", 
+        ctk.CTkLabel(pantalla, text="En caso de ser reactivación:", 
                      font=("Arial", 14), text_color="red").pack(pady=(20,5))
         
         # Frame para Tarjeta Soluciones YOVOY
-        frame = ctk.CTkFrame(self.root, fg_color="transparent")
+        frame = ctk.CTkFrame(pantalla, fg_color="transparent")
         frame.pack(pady=5, padx=20, fill="x")
         
         ctk.CTkLabel(frame, text="Tarjeta Soluciones YOVOY", 
                      font=("Arial Black", 12)).pack(side="left", padx=10)
         ctk.CTkButton(frame, text="", image=folder_icon, width=30, height=30,
-                     command=lambda: self.Subir_Documento("Tarjeta YOVOY")).pack(side="right", padx=10)
+                     command=lambda: self.Subir_Documento("Tarjeta YOVOY", tramite="discapacitado")).pack(side="right", padx=10)
         
         # Botón de regresar
-        UIFactory.create_button(self.root, text="Regresar", command=self.Abrir_Tramites).pack(pady=20)
-        self.root.bind("<Return>", lambda event: self.Abrir_Tramites())  # Agregar binding de Enter al último botón de documento
+        UIFactory.create_button(pantalla, text="Regresar", command=self.Abrir_Tramites).pack(pady=20)
 
     def Tarjeta_Estudiante(self):
         self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("tarjeta_estudiante")
+        self.screens.bind("<Return>", lambda event: self.Abrir_Tramites())  # Enter regresa a Trámites mientras esta pantalla esté visible
+        if not nueva:
+            return
         
         # Título
-        ctk.CTkLabel(self.root, text="Documentos Requeridos", 
+        ctk.CTkLabel(pantalla, text="Documentos Requeridos", 
                      font=("Arial", 20, "bold"), text_color="#0056b3").pack(pady=10)
         
-        # Cargar icono de carpeta
-        folder_path = r"C:\Python\AyVoy\INTER\FOLDER.png"
-        folder_image = Image.open(folder_path)
-        folder_image.thumbnail((30, 30))
-        folder_icon = ctk.CTkImage(light_image=folder_image, dark_image=folder_image, size=(30, 30))
+        # Icono de carpeta, compartido por las tres pantallas de tarjeta
+        folder_icon = self.resources.asset(AppConfig.FOLDER_ICON)
         
         # Crear frames de documentos
         doc_manager = DocumentManager()
-        doc_manager.create_doc_frame(self.root, "estudiante", folder_icon, self.Subir_Documento)
+        doc_manager.create_doc_frame(pantalla, "estudiante", folder_icon,
+                                     partial(self.Subir_Documento, tramite="estudiante"))
         
         # Sección de reactivación
-        ctk.CTkLabel(self.root, text="En caso de ser reactivación:", 
+        ctk.CTkLabel(pantalla, text="En caso de ser reactivación:", 
                      font=("Arial", 14), text_color="red").pack(pady=(20,5))
         
         # Frame para Tarjeta Soluciones YOVOY
-        frame = ctk.CTkFrame(self.root, fg_color="transparent")
+        frame = ctk.CTkFrame(pantalla, fg_color="transparent")
         frame.pack(pady=5, padx=20, fill="x")
         
         ctk.CTkLabel(frame, text="Tarjeta Soluciones YOVOY", 
                      font=("Arial Black", 12)).pack(side="left", padx=10)
         ctk.CTkButton(frame, text="", image=folder_icon, width=30, height=30,
-                     command=lambda: self.Subir_Documento("Tarjeta YOVOY")).pack(side="right", padx=10)
+                     command=lambda: self.Subir_Documento("Tarjeta YOVOY", tramite="estudiante")).pack(side="right", padx=10)
         
         # Botón de regresar
-        UIFactory.create_button(self.root, text="Regresar", command=self.Abrir_Tramites).pack(pady=20)
-        self.root.bind("<Return>", lambda event: self.Abrir_Tramites())  # Agregar binding de Enter al último botón de documento
+        UIFactory.create_button(pantalla, text="Regresar", command=self.Abrir_Tramites).pack(pady=20)
 
     def Tarjeta_Adulto_Mayor(self):
         self.Limpiar_Ventana()
+        pantalla, nueva = self.screens.show("tarjeta_adulto_mayor")
+        self.screens.bind("<Return>", lambda event: self.Abrir_Tramites())  # Enter regresa a Trámites mientras esta pantalla esté visible
+        if not nueva:
+            return
         
         # Título
-        ctk.CTkLabel(self.root, text="Documentos Requeridos", 
+        ctk.CTkLabel(pantalla, text="Documentos Requeridos", 
                      font=("Arial", 20, "bold"), text_color="#0056b3").pack(pady=10)
         
-        # Cargar icono de carpeta
-        folder_path = r"C:\Python\AyVoy\INTER\FOLDER.png"
-        folder_image = Image.open(folder_path)
-        folder_image.thumbnail((30, 30))  # Redimensionar a 30x30 manteniendo proporción
-        folder_icon = ctk.CTkImage(light_image=folder_image, dark_image=folder_image, size=(30, 30))
+        # Icono de carpeta, compartido por las tres pantallas de tarjeta
+        folder_icon = self.resources.asset(AppConfig.FOLDER_ICON)
         
         # Crear frames de documentos
         doc_manager = DocumentManager()
-        doc_manager.create_doc_frame(self.root, "adulto_mayor", folder_icon, self.Subir_Documento)
+        doc_manager.create_doc_frame(pantalla, "adulto_mayor", folder_icon,
+                                     partial(self.Subir_Documento, tramite="adulto_mayor"))
         
         # Botón de regresar
-        UIFactory.create_button(self.root, text="Regresar", command=self.Abrir_Tramites).pack(pady=20)
-        self.root.bind("<Return>", lambda event: self.Abrir_Tramites())  # Agregar binding de Enter al último botón de documento
+        UIFactory.create_button(pantalla, text="Regresar", command=self.Abrir_Tramites).pack(pady=20)
 
-    def Subir_Documento(self, tipo_documento):
-        # Abrir diálogo para seleccionar archivo
-        archivo = filedialog.askopenfile(
+    def Subir_Documento(self, tipo_documento, tramite):
+        # Los documentos se guardan por folio: sin sesión no hay de quién son
+        if self.folio_actual is None:
+            messagebox.showwarning("Inicia sesión", "Inicia sesión con tu folio para subir documentos.")
+            return
+        
+        # Abrir diálogo para seleccionar uno o varios archivos
+        archivos = filedialog.askopenfilenames(
             title=f"Seleccionar {tipo_documento}",
             filetypes=[
                 ("Archivos PDF", "*.pdf"),
@@ -534,102 +901,167 @@ class App:
             ]
         )
         
-        if archivo:
-            # Crear directorio de trámites si no existe
-            tramites_dir = r"C:\Python\AyVoy\TRAMITES"
-            if not os.path.exists(tramites_dir):
-                os.makedirs(tramites_dir)
-            
-            # Copiar archivo a la carpeta de trámites
-            nombre_archivo = f"{tipo_documento}_{os.path.basename(archivo.name)}"
-            destino = os.path.join(tramites_dir, nombre_archivo)
+        if archivos:
+            # Encolar las copias; corren en segundo plano y la ventana sigue respondiendo.
+            # Un contenido ya guardado (el mismo INE para otra tarjeta) no se vuelve a copiar.
+            for ruta in archivos:
+                self.subidas.submit(tipo_documento, partial(
+                    self.documentos.add, self.folio_actual, tramite, tipo_documento, ruta))
             
-            try:
-                with open(archivo.name, 'rb') as f_origen:
-                    with open(destino, 'wb') as f_destino:
-                        f_destino.write(f_origen.read())
-                messagebox.showinfo("Éxito", f"Documento {tipo_documento} subido correctamente")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al subir el documento: {str(e)}")
+            self.subida_label.configure(text=f"Subiendo {tipo_documento}...")
+            self.subida_barra.set(0)
+            self.subida_frame.place(relx=0.5, rely=1.0, y=-10, anchor="s")
+            self.subida_frame.lift()
+            if self.revision_subidas is not None:
+                self.root.after_cancel(self.revision_subidas)
+            self.revision_subidas = self.root.after(AppConfig.UPLOAD_POLL_MS, self.Revisar_Subidas)
+
+    def Crear_Aviso_Subidas(self):
+        """Aviso flotante con el avance de las subidas, sobre cualquier pantalla."""
+        self.subida_frame = ctk.CTkFrame(self.root, fg_color="#E8F0FE", corner_radius=10)
+        self.subida_label = ctk.CTkLabel(self.subida_frame, text="", font=("Arial", 12),
+                                         text_color="#0056b3", wraplength=300)
+        self.subida_label.pack(padx=10, pady=(5, 0))
+        self.subida_barra = ctk.CTkProgressBar(self.subida_frame, width=280)
+        self.subida_barra.pack(padx=10, pady=(0, 10))
+
+    def Revisar_Subidas(self):
+        self.revision_subidas = None
+        for evento in self.subidas.poll():
+            if evento.estado == "error":
+                messagebox.showerror("Error", f"Error al subir el documento: {evento.error}")
+            elif evento.estado == "listo":
+                registro, nuevo = evento.resultado
+                # Las fotos nuevas se reducen después, sin detener la subida ni la ventana
+                if nuevo and imaging.ImageProcessor.wants(registro.nombre):
+                    if self.procesador is None:
+                        self.procesador = imaging.ImageProcessor(self.documentos)
+                    self.procesador.submit(registro.digest)
+                aviso = "subido correctamente" if nuevo else "subido correctamente (ya estaba guardado)"
+                self.subida_label.configure(text=f"Documento {evento.etiqueta} {aviso}")
+                self.subida_barra.set(1)
+            else:
+                avance = evento.copiados / evento.total if evento.total else 1
+                self.subida_label.configure(text=f"Subiendo {evento.etiqueta}... {avance:.0%}")
+                self.subida_barra.set(avance)
+        
+        pendientes = self.subidas.pending()
+        if pendientes:
+            if pendientes > 1:
+                self.subida_label.configure(text=f"{self.subida_label.cget('text')} ({pendientes} en cola)")
+            self.revision_subidas = self.root.after(AppConfig.UPLOAD_POLL_MS, self.Revisar_Subidas)
+        else:
+            # Dejar visible el último aviso un momento y ocultarlo
+            self.revision_subidas = self.root.after(AppConfig.UPLOAD_STATUS_MS, self.subida_frame.place_forget)
 
     def Limpiar_Ventana(self):
-        for widget in self.root.winfo_children():
-            widget.destroy()
+        """Detiene lo programado para la pantalla que se deja; ScreenManager la oculta."""
+        # Una búsqueda programada no debe correr sobre una pantalla oculta
+        if self.busqueda_pendiente is not None:
+            self.root.after_cancel(self.busqueda_pendiente)
+            self.busqueda_pendiente = None
+        # El zoom del mapa oculto no cambia; se retoma al volver a Abrir_Mapa
+        if self.revision_zoom is not None:
+            self.root.after_cancel(self.revision_zoom)
+            self.revision_zoom = None
+        if self.revision_red is not None:
+            self.root.after_cancel(self.revision_red)
+            self.revision_red = None
+
+    def Rutas_Cercanas(self, coords):
+        try:
+            cercanas = self.servicio.routes_near(tuple(coords))
+        except FileNotFoundError:
+            self.descripcion_label.configure(text="Error: Archivo de geometrías no encontrado.")
+            return
+        
+        self.Limpiar_Mapa()
+        self.viaje_origen = None
+        self.Poner_Marcador(*coords, "Aquí")
+        if cercanas:
+            rutas = [ruta for ruta, _ in cercanas[:AppConfig.MAX_SEARCH_RESULTS]]
+            self.result_dropdown.configure(values=rutas)
+            self.result_dropdown.set("Selecciona una ruta")
+            detalle = ", ".join(f"{ruta} ({metros:.0f} m)" for ruta, metros in cercanas[:3])
+            self.descripcion_label.configure(text=f"Rutas cerca de aquí: {detalle}")
+        else:
+            self.result_dropdown.configure(values=["No hay rutas cerca"])
+            self.result_dropdown.set("No hay rutas cerca")
+            self.descripcion_label.configure(text="No pasa ninguna ruta cerca de este punto.")
+        # La siguiente búsqueda por nombre debe volver a llenar la lista
+        self.ultima_busqueda = None
 
     def Seleccionar_Primera_Ruta(self, event):
         # Obtener valores actuales del dropdown
         valores = self.result_dropdown.cget("values")
-        if valores and valores[0] != "No hay coincidencias" and valores[0] != "Error: Archivo no encontrado":
+        if valores and valores[0] not in ("No hay coincidencias", "No hay rutas cerca", "Error: Archivo no encontrado"):
             # Seleccionar primera ruta y mostrar su descripción
             self.result_dropdown.set(valores[0])
             self.Mostrar_Descripcion_Ruta(valores[0])
 
     def Abrir_Saldo(self):
         self.Limpiar_Ventana()
+        # Saldo y movimientos cambian: la pantalla se arma de nuevo en cada visita
+        pantalla, _ = self.screens.show("saldo", fresh=True)
         
         # Título del menú
-        ctk.CTkLabel(self.root, text="Saldo Actual", 
+        ctk.CTkLabel(pantalla, text="Saldo Actual", 
                      font=("Arial", 24, "bold"), 
                      text_color="#0056b3").pack(pady=(50, 20))
         
         # Frame principal para el contenido
-        main_frame = ctk.CTkFrame(self.root, fg_color="transparent")
+        main_frame = ctk.CTkFrame(pantalla, fg_color="transparent")
         main_frame.pack(fill="both", expand=True, padx=20)
         
         # Obtener el saldo y movimientos del usuario actual
-        archivo_path = r"C:\Python\AyVoy\USERS\usuarios.txt"
         try:
-            with open(archivo_path, "r") as archivo:
-                usuario_encontrado = False
-                for linea in archivo:
-                    datos = linea.strip().split(",")
-                    if len(datos) >= 2 and datos[0].strip() == self.folio_actual:
-                        usuario_encontrado = True
-                        # Mostrar saldo actual
-                        saldo = datos[1].strip()
-                        ctk.CTkLabel(main_frame, 
-                                   text=f"${saldo}", 
-                                   font=("Arial Black", 36),
-                                   text_color="#2E7D32").pack(pady=20)
-                        
-                        # Título de movimientos
-                        ctk.CTkLabel(main_frame, 
-                                   text="Movimientos realizados",
-                                   font=("Arial", 18, "bold"),
-                                   text_color="#0056b3").pack(pady=(20, 10))
-                        
-                        # Frame para la lista de movimientos con scroll
-                        movimientos_frame = ctk.CTkScrollableFrame(main_frame, 
-                                                                 width=300, 
-                                                                 height=200,
-                                                                 fg_color="#F0F0F0")
-                        movimientos_frame.pack(pady=10, fill="both", expand=True)
-                        
-                        # Mostrar cada movimiento
-                        if len(datos) > 2:
-                            for movimiento in datos[2:]:
-                                movimiento = movimiento.strip()
-                                if movimiento:  # Solo si el movimiento no está vacío
-                                    ctk.CTkLabel(movimientos_frame,
-                                               text=movimiento,
-                                               font=("Arial", 12),
-                                               text_color="#333333").pack(
-                                                   pady=5, 
-                                                   padx=10, 
-                                                   anchor="w"
-                                               )
-                        else:
-                            ctk.CTkLabel(movimientos_frame,
-                                       text="No hay movimientos registrados",
-                                       font=("Arial", 12),
-                                       text_color="#666666").pack(pady=10)
-                        break
+            saldo = self.servicio.balance(self.folio_actual)
+            if saldo is not None:
+                # Mostrar saldo actual
+                ctk.CTkLabel(main_frame, 
+                           text=f"${saldo:.2f}", 
+                           font=("Arial Black", 36),
+                           text_color="#2E7D32").pack(pady=20)
+                
+                # Título de movimientos
+                ctk.CTkLabel(main_frame, 
+                           text="Movimientos realizados",
+                           font=("Arial", 18, "bold"),
+                           text_color="#0056b3").pack(pady=(20, 10))
                 
-                if not usuario_encontrado:
-                    ctk.CTkLabel(main_frame, 
-                               text="Usuario no encontrado. Verifica tu folio.", 
-                               font=("Arial", 16),
-                               text_color="red").pack(pady=20)
+                recientes = f"Últimos {AppConfig.RECENT_DAYS} días"
+                periodo = ctk.CTkSegmentedButton(main_frame, values=[recientes, "Todo"])
+                periodo.pack(pady=(0, 5))
+                lista = ctk.CTkFrame(main_frame, fg_color="transparent")
+                lista.pack(fill="both", expand=True)
+
+                def mostrar_periodo(valor):
+                    for widget in lista.winfo_children():
+                        widget.destroy()
+                    folio = self.folio_actual
+                    if valor == recientes:
+                        total = self.servicio.movement_count(folio, AppConfig.RECENT_DAYS)
+                        anteriores = 0
+                    else:
+                        total = self.servicio.movement_count(folio)
+                        anteriores = self.servicio.legacy_movement_count(folio)
+                    # Lista de movimientos: sólo existen las filas visibles y el
+                    # historial se lee por páginas, del más reciente hacia atrás
+                    VirtualList(lista,
+                                total + anteriores,
+                                partial(self.Pagina_Movimientos, folio, total, anteriores > 0),
+                                empty_text="No hay movimientos registrados",
+                                width=300,
+                                fg_color="#F0F0F0").pack(pady=10, fill="both", expand=True)
+
+                periodo.configure(command=mostrar_periodo)
+                periodo.set(recientes)
+                mostrar_periodo(recientes)
+            else:
+                ctk.CTkLabel(main_frame, 
+                           text="Usuario no encontrado. Verifica tu folio.", 
+                           font=("Arial", 16),
+                           text_color="red").pack(pady=20)
         except FileNotFoundError:
             ctk.CTkLabel(main_frame, 
                         text="Error: Archivo de usuarios no encontrado", 
@@ -637,35 +1069,52 @@ class App:
                         text_color="red").pack(pady=20)
         
         # Botón de recargar tarjeta
-        UIFactory.create_button(self.root, 
+        UIFactory.create_button(pantalla, 
                       text="Recargar Tarjeta", 
                       command=self.Recargar_Tarjeta).pack(pady=10)
 
         # Botón de regresar
-        UIFactory.create_button(self.root, 
+        UIFactory.create_button(pantalla, 
                       text="Regresar", 
                       command=self.Abrir_Mapa).pack(pady=20)
 
+    def Pagina_Movimientos(self, folio, total, anteriores, offset, limit):
+        """Filas de la lista de saldo: primero el historial, luego los movimientos de antes.
+
+        Los movimientos guardados en usuarios.txt antes del historial sólo
+        tienen la hora; se muestran al final, sin fecha.
+        """
+        filas = []
+        if offset < total:
+            filas = [m.etiqueta() for m in self.servicio.movements(folio, offset, min(limit, total - offset))]
+        if anteriores and len(filas) < limit:
+            inicio = max(0, offset - total)
+            filas += [f"{hora}  Viaje (sin fecha)"
+                      for hora in self.servicio.legacy_movements(folio, inicio, limit - len(filas))]
+        return filas
+
     def Recargar_Tarjeta(self):
         self.Limpiar_Ventana()
+        # El formulario empieza vacío en cada visita
+        pantalla, _ = self.screens.show("recarga", fresh=True)
         
         # Título del menú
-        ctk.CTkLabel(self.root, text="Recargar Tarjeta", 
+        ctk.CTkLabel(pantalla, text="Recargar Tarjeta", 
                      font=("Arial", 24, "bold"), 
                      text_color="#0056b3").pack(pady=(20, 10))
         
         # Entrada para el número de tarjeta
-        ctk.CTkLabel(self.root, text="Número de Tarjeta:", 
+        ctk.CTkLabel(pantalla, text="Número de Tarjeta:", 
                      font=("Arial", 16), 
                      text_color="#0056b3").pack(pady=5)
-        tarjeta_entry = UIFactory.create_entry(self.root)
+        tarjeta_entry = UIFactory.create_entry(pantalla)
         tarjeta_entry.pack(pady=5)
         
         # Entrada para la fecha de expiración
-        ctk.CTkLabel(self.root, text="Fecha de Expiración (MM/AA):", 
+        ctk.CTkLabel(pantalla, text="Fecha de Expiración (MM/AA):", 
                      font=("Arial", 16), 
                      text_color="#0056b3").pack(pady=5)
-        expiracion_frame = ctk.CTkFrame(self.root, fg_color="transparent")
+        expiracion_frame = ctk.CTkFrame(pantalla, fg_color="transparent")
         expiracion_frame.pack(pady=5)
         mes_entry = UIFactory.create_entry(expiracion_frame, width=50, placeholder_text="MM")
         mes_entry.pack(side="left", padx=5)
@@ -673,30 +1122,30 @@ class App:
         anio_entry.pack(side="left", padx=5)
         
         # Entrada para el titular de la tarjeta
-        ctk.CTkLabel(self.root, text="Titular de la Tarjeta:", 
+        ctk.CTkLabel(pantalla, text="Titular de la Tarjeta:", 
                      font=("Arial", 16), 
                      text_color="#0056b3").pack(pady=5)
-        titular_entry = UIFactory.create_entry(self.root)
+        titular_entry = UIFactory.create_entry(pantalla)
         titular_entry.pack(pady=5)
         
         # Entrada para el código de seguridad
-        ctk.CTkLabel(self.root, text="Código de Seguridad (CVV):", 
+        ctk.CTkLabel(pantalla, text="Código de Seguridad (CVV):", 
                      font=("Arial", 16), 
                      text_color="#0056b3").pack(pady=5)
-        cvv_entry = UIFactory.create_entry(self.root, show="*")
+        cvv_entry = UIFactory.create_entry(pantalla, show="*")
         cvv_entry.pack(pady=5)
         
         # Entrada para el monto a recargar
-        ctk.CTkLabel(self.root, text="Monto a Recargar:", 
+        ctk.CTkLabel(pantalla, text="Monto a Recargar:", 
                      font=("Arial", 16), 
                      text_color="#0056b3").pack(pady=5)
-        monto_entry = UIFactory.create_entry(self.root)
+        monto_entry = UIFactory.create_entry(pantalla)
         monto_entry.pack(pady=5)
         
         # Checkbox para guardar los datos de la tarjeta
         guardar_datos_var = ctk.BooleanVar()
         guardar_datos_checkbox = ctk.CTkCheckBox(
-            self.root, 
+            pantalla, 
             text="Guardar los datos de esta tarjeta para pagos futuros", 
             variable=guardar_datos_var
         )
@@ -725,36 +1174,27 @@ class App:
             
             # Aquí puedes agregar lógica para procesar el pago con los datos ingresados
             
-            # Actualizar el saldo en el archivo
-            archivo_path = r"C:\Python\AyVoy\USERS\usuarios.txt"
+            # Registrar la recarga en la bitácora (un solo anexado, sin reescribir el archivo)
+            # y en el historial del folio
             try:
-                with open(archivo_path, "r") as archivo:
-                    lineas = archivo.readlines()
-                
-                with open(archivo_path, "w") as archivo:
-                    for linea in lineas:
-                        datos = linea.strip().split(",")
-                        if len(datos) >= 2 and datos[0].strip() == self.folio_actual:
-                            saldo_actual = float(datos[1].strip())
-                            nuevo_saldo = saldo_actual + monto
-                            datos[1] = f"{nuevo_saldo:.2f}"
-                            archivo.write(",".join(datos) + "\n")
-                            messagebox.showinfo("Éxito", f"Se recargaron ${monto:.2f} correctamente.")
-                        else:
-                            archivo.write(linea)
+                self.servicio.recharge(self.folio_actual, monto)
             except FileNotFoundError:
                 messagebox.showerror("Error", "Archivo de usuarios no encontrado.")
                 return
+            except KeyError:
+                messagebox.showerror("Error", "Usuario no encontrado. Verifica tu folio.")
+                return
+            messagebox.showinfo("Éxito", f"Se recargaron ${monto:.2f} correctamente.")
             
             # Regresar al menú de saldo
             self.Abrir_Saldo()
         
-        UIFactory.create_button(self.root, 
+        UIFactory.create_button(pantalla, 
                       text="Confirmar Recarga", 
                       command=confirmar_recarga).pack(pady=10)
 
         # Botón de regresar
-        UIFactory.create_button(self.root, 
+        UIFactory.create_button(pantalla, 
                       text="Regresar", 
                       command=self.Abrir_Saldo).pack(pady=20)
 
@@ -766,6 +1206,19 @@ class App:
         self.Menu_Principal()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kiosco AyVoy")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="mide imports y tiempo hasta el primer cuadro, y sale (ver startup.py)")
+    parser.add_argument("--profile-output", help="agrega el resultado como línea JSON a este archivo")
+    args = parser.parse_args()
+
+    if args.profile_startup and not importtime_enabled():
+        raise SystemExit(profile(os.path.abspath(__file__), args.profile_output))
+
     root = ctk.CTk()
+    marcas.mark("ventana creada")
     app = App(root)
+    marcas.mark("App lista")
+    if args.profile_startup:
+        root.after(0, partial(first_frame, root, marcas))
     root.mainloop()
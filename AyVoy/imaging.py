@@ -0,0 +1,102 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+from config import DOC_IMAGE_MAX_SIDE, DOC_IMAGE_QUALITY, DOC_THUMBNAIL_SIDE
+from docstore import DocumentStore
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+
+
+def _save_jpeg(image: Image.Image, path: str, quality: int):
+    temporal = f"{path}.{os.getpid()}.tmp"
+    # Sin exif=: el JPEG nuevo no lleva metadatos (ubicación, cámara, fecha)
+    image.save(temporal, format="JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(temporal, path)
+
+
+def normalize_image(origen: str, destino: str, miniatura: str, max_side: int,
+                    quality: int, thumb_side: int) -> Tuple[int, int]:
+    """Reduce ``origen`` a ``max_side`` pixeles por lado y lo guarda como JPEG sin EXIF.
+
+    Se corre en otro proceso. En un JPEG, ``draft`` hace que el decodificador
+    entregue la imagen ya reducida a la escala más cercana, sin expandir los
+    12 MP de la cámara en memoria. La rotación del EXIF se aplica antes de
+    descartarlo. Regresa (bytes antes, bytes después).
+    """
+    with Image.open(origen) as original:
+        original.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        _save_jpeg(image, destino, quality)
+        image.thumbnail((thumb_side, thumb_side), Image.LANCZOS)
+        _save_jpeg(image, miniatura, quality)
+    return os.path.getsize(origen), os.path.getsize(destino)
+
+
+class ImageProcessor:
+    """Normaliza en un pool de procesos las fotos recién subidas a un DocumentStore.
+
+    El blob original se sustituye por su versión reducida y se agrega una
+    miniatura; ambas conservan el digest del archivo subido, así una nueva
+    subida de la misma foto se sigue reconociendo. El pool se crea con la
+    primera foto para no pagar el arranque de procesos si nadie sube una.
+    """
+
+    def __init__(self, store: DocumentStore, workers: Optional[int] = None,
+                 max_side: int = DOC_IMAGE_MAX_SIDE, quality: int = DOC_IMAGE_QUALITY,
+                 thumb_side: int = DOC_THUMBNAIL_SIDE):
+        self.store = store
+        self.workers = workers
+        self.max_side = max_side
+        self.quality = quality
+        self.thumb_side = thumb_side
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._running: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def wants(nombre: str) -> bool:
+        return os.path.splitext(nombre)[1].lower() in IMAGE_EXTENSIONS
+
+    def submit(self, digest: str) -> Optional[Future]:
+        with self._lock:
+            if digest in self._running:
+                return None
+            self._running.add(digest)
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            futuro = self._pool.submit(normalize_image, self.store.blob_path(digest),
+                                       self.store.normalized_path(digest),
+                                       self.store.thumbnail_path(digest),
+                                       self.max_side, self.quality, self.thumb_side)
+        futuro.add_done_callback(partial(self._done, digest))
+        return futuro
+
+    def _done(self, digest: str, futuro: Future):
+        with self._lock:
+            self._running.discard(digest)
+        try:
+            futuro.result()
+        except Exception as e:
+            # Se queda el original: mejor una foto pesada que ninguna
+            print(f"No se pudo normalizar el documento {digest}: {e}")
+            return
+        try:
+            os.remove(self.store.blob_path(digest))
+        except OSError:
+            pass
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
@@ -0,0 +1,54 @@
+import io
+from typing import Optional, Tuple
+
+from PIL import Image, ImageTk
+from tkintermapview import TkinterMapView
+
+from tiles import TileCache, fetch_tile
+
+
+class CachedMapView(TkinterMapView):
+    """TkinterMapView que toma las teselas de una TileCache antes que de la red.
+
+    Sustituye ``request_image``, que tkintermapview llama desde sus hilos de
+    carga. Con ``offline`` verdadero las teselas que no estén en la caché
+    quedan vacías en lugar de esperar a una red que no hay. El mapa usa el
+    servidor de la caché y no acepta otro; sin caché va directo a la red.
+    """
+
+    def __init__(self, *args, tile_cache: Optional[TileCache], offline: bool = False, **kwargs):
+        self.tile_cache = tile_cache
+        self.offline = offline
+        super().__init__(*args, **kwargs)
+        if tile_cache is not None and tile_cache.server is not None:
+            self.set_tile_server(tile_cache.server)
+
+    def set_tile_server(self, tile_server: str, tile_size: int = 256, max_zoom: int = 19):
+        servidor = self.tile_cache.server if self.tile_cache is not None else None
+        if servidor is not None and tile_server != servidor:
+            raise ValueError(f"La caché de teselas es de {servidor}, no de {tile_server}")
+        super().set_tile_server(tile_server, tile_size, max_zoom)
+
+    def request_image(self, zoom: int, x: int, y: int, db_cursor=None) -> ImageTk.PhotoImage:
+        if self.tile_cache is None:
+            return super().request_image(zoom, x, y, db_cursor)
+        data = self.tile_cache.get(zoom, x, y)
+        if data is None and not self.offline:
+            data = fetch_tile(self.tile_server, zoom, x, y)
+            if data is not None:
+                self.tile_cache.put(zoom, x, y, data)
+        if data is None or not self.running:
+            return self.empty_tile_image
+        try:
+            image_tk = ImageTk.PhotoImage(Image.open(io.BytesIO(data)))
+        except Exception:
+            return self.empty_tile_image
+        self.tile_image_cache[f"{zoom}{x}{y}"] = image_tk
+        return image_tk
+
+    def viewport(self) -> Tuple[Tuple[float, float, float, float], int]:
+        """Rectángulo visible en Mercator normalizado (ver overlay.py) y zoom entero."""
+        zoom = round(self.zoom)
+        escala = 2 ** zoom
+        (x0, y0), (x1, y1) = self.upper_left_tile_pos, self.lower_right_tile_pos
+        return (x0 / escala, y0 / escala, x1 / escala, y1 / escala), zoom
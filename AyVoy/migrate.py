@@ -0,0 +1,62 @@
+"""Importa usuarios.txt, rutas.txt y destinos.txt a la base SQLite.
+
+Se corre una vez con los kioscos detenidos; las recargas que sigan en la
+bitácora se aplican sobre los saldos de la instantánea. Después basta con
+poner STORAGE_BACKEND = "sqlite" en config.py.
+
+    python migrate.py --db C:\\Python\\AyVoy\\USERS\\ayvoy.db
+"""
+import argparse
+import os
+import time
+
+from backends import SQLiteBackend
+from config import DATA_PATH, DB_PATH, ROUTES_PATH
+from storage import parse_user_line, pending_journal
+
+
+def leer_usuarios(path: str):
+    with open(path, "r") as archivo:
+        for linea in archivo:
+            usuario = parse_user_line(linea)
+            if usuario is not None:
+                yield usuario
+
+
+def leer_rutas(rutas_path: str, destinos_path: str):
+    descripciones = {}
+    with open(destinos_path, "r", encoding="utf-8") as archivo:
+        for linea in archivo:
+            nombre, separador, descripcion = linea.partition(":")
+            if separador:
+                descripciones[nombre.strip()] = descripcion.strip()
+    with open(rutas_path, "r") as archivo:
+        for linea in archivo:
+            nombre = linea.strip()
+            if nombre:
+                yield nombre, descripciones.get(nombre)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", default=f"{DATA_PATH}/usuarios.txt")
+    parser.add_argument("--rutas", default=f"{ROUTES_PATH}/rutas.txt")
+    parser.add_argument("--destinos", default=f"{ROUTES_PATH}/destinos.txt")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} ya existe; bórrala antes de volver a migrar")
+
+    inicio = time.perf_counter()
+    backend = SQLiteBackend(args.db)
+    usuarios = backend.import_users(leer_usuarios(args.usuarios))
+    backend.apply_deltas(pending_journal(args.usuarios))
+    rutas = backend.import_routes(leer_rutas(args.rutas, args.destinos))
+    backend.close()
+    print(f"{usuarios} usuarios y {rutas} rutas importados a {args.db} "
+          f"en {time.perf_counter() - inicio:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import heapq
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from storage import replace_file, shared_locks
+
+TRIP = "viaje"
+RECHARGE = "recarga"
+
+EXTEND_BLOCK = 1 << 16  # Movimientos que extend escribe por cada toma del candado
+
+SEGMENTS_DIR = "segmentos"
+INDEX_DIR = "indice"
+
+
+@dataclass
+class Movement:
+    fecha: float  # Segundos desde epoch
+    tipo: str  # TRIP o RECHARGE
+    monto: float
+    ruta: Optional[str] = None
+
+    def etiqueta(self) -> str:
+        """Texto de una fila de la pantalla de saldo."""
+        cuando = time.strftime("%d/%m/%Y %H:%M", time.localtime(self.fecha))
+        if self.tipo == RECHARGE:
+            return f"{cuando}  Recarga  +${self.monto:.2f}"
+        ruta = f" {self.ruta}" if self.ruta else ""
+        return f"{cuando}  Viaje{ruta}  -${abs(self.monto):.2f}"
+
+
+def segment_of(fecha: float) -> int:
+    """Segmento AAAAMM al que pertenece una fecha (hora local)."""
+    local = time.localtime(fecha)
+    return local.tm_year * 100 + local.tm_mon
+
+
+def parse_movement_line(linea: bytes) -> Tuple[str, Movement]:
+    """Convierte una línea ``fecha,folio,tipo,monto,ruta`` en (folio, Movement)."""
+    fecha, folio, tipo, monto, ruta = linea.decode("utf-8").rstrip("\n").split(",", 4)
+    return folio, Movement(float(fecha), tipo, float(monto), ruta or None)
+
+
+class MovementLog:
+    """Historial de movimientos por folio en segmentos mensuales de solo-anexado.
+
+    Cada movimiento es una línea ``fecha,folio,tipo,monto,ruta`` en
+    ``segmentos/AAAAMM.log``. Sólo se escribe en el segmento del mes en
+    curso, así los archivos quedan en orden de tiempo y los meses cerrados
+    ya no cambian (se pueden respaldar o archivar).
+
+    Cada folio tiene su índice ``indice/<folio>.idx`` con un registro de
+    ancho fijo por movimiento (fecha, segmento, offset, largo), en el mismo
+    orden. La página más reciente se lee desde el final del índice y el
+    inicio de "últimos N días" es una búsqueda binaria por fecha; ninguna
+    consulta recorre el historial completo del folio ni los segmentos.
+    """
+
+    RECORD = struct.Struct("<dIQI")
+
+    def __init__(self, root: str):
+        self.root = root
+        self.segments_dir = os.path.join(root, SEGMENTS_DIR)
+        self.index_dir = os.path.join(root, INDEX_DIR)
+        self._locks = None
+        self._lock = threading.Lock()
+
+    def segment_path(self, segmento: int) -> str:
+        return os.path.join(self.segments_dir, f"{segmento}.log")
+
+    def index_path(self, folio: str) -> str:
+        return os.path.join(self.index_dir, f"{folio}.idx")
+
+    def _get_locks(self):
+        with self._lock:
+            if self._locks is None:
+                os.makedirs(self.segments_dir, exist_ok=True)
+                os.makedirs(self.index_dir, exist_ok=True)
+                self._locks = shared_locks(os.path.join(self.root, "movimientos.lock"))
+            return self._locks
+
+    def append(self, folio: str, tipo: str, monto: float, ruta: Optional[str] = None,
+               fecha: Optional[float] = None) -> Movement:
+        """Anexa un movimiento; sin ``fecha`` se usa la hora actual.
+
+        El candado de anexado es entre procesos: con él cada escritor conoce
+        el offset de su línea y las fechas del índice quedan ordenadas.
+        """
+        locks = self._get_locks()
+        with locks.journal():
+            if fecha is None:
+                fecha = time.time()
+            movimiento = Movement(fecha, tipo, monto, ruta)
+            segmento = segment_of(fecha)
+            linea = f"{fecha:.3f},{folio},{tipo},{monto:.2f},{ruta or ''}\n".encode("utf-8")
+            fd = os.open(self.segment_path(segmento),
+                         os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                offset = os.lseek(fd, 0, os.SEEK_END)
+                os.write(fd, linea)
+            finally:
+                os.close(fd)
+            with open(self.index_path(folio), "ab") as indice:
+                indice.write(self.RECORD.pack(fecha, segmento, offset, len(linea)))
+        return movimiento
+
+    def extend(self, movimientos: Iterable[Tuple[str, Movement]]):
+        """Anexa muchos movimientos ya fechados, como los viajes de una liquidación.
+
+        Las líneas van al segmento del mes en curso aunque la fecha sea
+        anterior, así los meses cerrados no cambian. En el índice de cada
+        folio se intercalan por fecha con los que ya tenga (una recarga
+        posterior al viaje, por ejemplo), para que ``count`` siga valiendo.
+        Se escribe por bloques de EXTEND_BLOCK: entre uno y otro los kioscos
+        pueden anexar. Conviene que vengan agrupados por folio.
+        """
+        bloque: List[Tuple[str, Movement]] = []
+        for movimiento in movimientos:
+            bloque.append(movimiento)
+            if len(bloque) >= EXTEND_BLOCK:
+                self._extend_block(bloque)
+                bloque = []
+        if bloque:
+            self._extend_block(bloque)
+
+    def _extend_block(self, movimientos: List[Tuple[str, Movement]]):
+        locks = self._get_locks()
+        with locks.journal():
+            segmento = segment_of(time.time())
+            registros: Dict[str, List[Tuple[float, int, int, int]]] = {}
+            lineas = []
+            with open(self.segment_path(segmento), "ab") as archivo:
+                offset = archivo.tell()
+                for folio, m in movimientos:
+                    linea = f"{m.fecha:.3f},{folio},{m.tipo},{m.monto:.2f},{m.ruta or ''}\n".encode("utf-8")
+                    lineas.append(linea)
+                    registros.setdefault(folio, []).append((m.fecha, segmento, offset, len(linea)))
+                    offset += len(linea)
+                archivo.write(b"".join(lineas))
+            # El segmento ya está escrito cuando el índice apunta a él
+            for folio, nuevos in registros.items():
+                self._merge_index(folio, nuevos)
+
+    def _merge_index(self, folio: str, nuevos: List[Tuple[float, int, int, int]]):
+        nuevos.sort(key=lambda r: r[0])
+        size = self.RECORD.size
+        path = self.index_path(folio)
+        try:
+            with open(path, "rb") as indice:
+                data = indice.read()
+        except FileNotFoundError:
+            data = b""
+        total = len(data) // size
+        # Registros ya escritos que son más nuevos que el primer movimiento
+        inicio = total
+        while inicio > 0 and self.RECORD.unpack_from(data, (inicio - 1) * size)[0] > nuevos[0][0]:
+            inicio -= 1
+        if inicio == total:
+            with open(path, "ab") as indice:
+                indice.write(b"".join(self.RECORD.pack(*r) for r in nuevos))
+            return
+        # Intercalar cambia registros existentes: count y page leen sin candado,
+        # así que se escribe un índice completo aparte y se reemplaza
+        cola = self.RECORD.iter_unpack(data[inicio * size:total * size])
+        temporal = f"{path}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as indice:
+            indice.write(data[:inicio * size])
+            indice.write(b"".join(self.RECORD.pack(*r) for r in heapq.merge(cola, nuevos, key=lambda r: r[0])))
+        replace_file(temporal, path)
+
+    def count(self, folio: str, desde: Optional[float] = None) -> int:
+        """Movimientos del folio, o sólo los de ``desde`` en adelante."""
+        try:
+            indice = open(self.index_path(folio), "rb")
+        except FileNotFoundError:
+            return 0
+        with indice:
+            # Tamaño y búsqueda sobre el mismo archivo aunque extend lo reemplace
+            total = os.fstat(indice.fileno()).st_size // self.RECORD.size
+            if desde is None or total == 0:
+                return total
+            bajo, alto = 0, total
+            while bajo < alto:
+                medio = (bajo + alto) // 2
+                indice.seek(medio * self.RECORD.size)
+                if self.RECORD.unpack(indice.read(self.RECORD.size))[0] < desde:
+                    bajo = medio + 1
+                else:
+                    alto = medio
+        return total - bajo
+
+    def recent(self, folio: str, dias: int) -> int:
+        return self.count(folio, time.time() - dias * 86400)
+
+    def page(self, folio: str, offset: int, limit: int) -> List[Movement]:
+        """Movimientos del más reciente al más viejo, saltando los ``offset`` más nuevos."""
+        try:
+            with open(self.index_path(folio), "rb") as indice:
+                total = os.fstat(indice.fileno()).st_size // self.RECORD.size
+                fin = total - offset
+                inicio = max(0, fin - limit)
+                if fin <= inicio:
+                    return []
+                indice.seek(inicio * self.RECORD.size)
+                data = indice.read((fin - inicio) * self.RECORD.size)
+        except FileNotFoundError:
+            return []
+        registros = list(self.RECORD.iter_unpack(data))
+        registros.reverse()
+
+        # Una apertura por segmento aunque la página cruce varios meses
+        archivos: Dict[int, object] = {}
+        movimientos = []
+        try:
+            for _, segmento, posicion, largo in registros:
+                archivo = archivos.get(segmento)
+                if archivo is None:
+                    archivo = archivos[segmento] = open(self.segment_path(segmento), "rb")
+                archivo.seek(posicion)
+                movimientos.append(parse_movement_line(archivo.read(largo))[1])
+        finally:
+            for archivo in archivos.values():
+                archivo.close()
+        return movimientos
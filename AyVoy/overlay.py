@@ -0,0 +1,176 @@
+import math
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from geometry import LOD_PIXEL_TOLERANCE, TILE_SIZE, dp_significance
+
+Point = Tuple[float, float]
+# Rectángulo en coordenadas Mercator normalizadas: (x0, y0, x1, y1), de 0 a 1
+Box = Tuple[float, float, float, float]
+
+
+def mercator(lat: float, lon: float) -> Tuple[float, float]:
+    """Lat/lon a Mercator normalizado; multiplicado por 2**zoom da la tesela."""
+    lat = max(-85.05112878, min(85.05112878, lat))
+    seno = math.sin(math.radians(lat))
+    return (lon + 180.0) / 360.0, 0.5 - math.log((1 + seno) / (1 - seno)) / (4 * math.pi)
+
+
+class NetworkOverlay:
+    """Toda la red de rutas, partida en tramos para dibujar sólo lo que se ve.
+
+    Cada trazo se corta en tramos de hasta CHUNK_POINTS vértices (el último
+    vértice de un tramo es el primero del siguiente) y cada tramo se anota
+    en las cubetas Mercator que toca su caja. Para un rectángulo visible
+    sólo se consultan esas cubetas. Los vértices de un tramo se simplifican
+    por zoom con la significancia Douglas-Peucker de la ruta completa,
+    conservando siempre sus extremos para que los tramos sigan unidos.
+
+    Las paradas se agrupan en celdas de CLUSTER_PIXELS pixeles del zoom
+    pedido: lejos se ve un marcador por zona con el número de paradas y de
+    cerca cada parada queda sola. Cuando la celda es más grande que una
+    cubeta, cada cubeta entra completa con su suma precalculada. Tramos y
+    grupos tienen claves estables, así quien dibuja puede agregar y quitar
+    sólo lo que cambió.
+
+    Una consulta nunca recorre más cubetas que las ocupadas: de lejos la
+    vista cubre millones de cubetas vacías y se filtran las ocupadas.
+    """
+
+    CHUNK_POINTS = 128
+    GRID = 2.0 ** -14  # Cubeta de unos 2.4 km
+    CLUSTER_PIXELS = 48
+
+    def __init__(self, rutas: Iterable[Tuple[str, Sequence[Point], Sequence[Point]]]):
+        self.names: List[str] = []
+        self._chunk_route = array("i")
+        self._chunk_coords: List[array] = []  # lat, lon intercalados
+        self._chunk_significance: List[array] = []
+        self._chunk_grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._stops = array("d")  # x, y Mercator, lat, lon
+        self._stop_grid: Dict[Tuple[int, int], array] = {}
+        # Por cubeta: suma de x, y, lat, lon de sus paradas y cuántas son
+        self._stop_sums: Dict[Tuple[int, int], List[float]] = {}
+        for nombre, trazo, paradas in rutas:
+            indice = len(self.names)
+            self.names.append(nombre)
+            if len(trazo) >= 2:
+                self._add_path(indice, trazo)
+            for lat, lon in paradas:
+                x, y = mercator(lat, lon)
+                parada = len(self._stops) // 4
+                self._stops.extend((x, y, lat, lon))
+                celda = self._stop_grid.get(self._key(x, y))
+                if celda is None:
+                    celda = self._stop_grid[self._key(x, y)] = array("i")
+                celda.append(parada)
+                suma = self._stop_sums.setdefault(self._key(x, y), [0.0, 0.0, 0.0, 0.0, 0])
+                suma[0] += x
+                suma[1] += y
+                suma[2] += lat
+                suma[3] += lon
+                suma[4] += 1
+
+    def _key(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.GRID), int(y // self.GRID)
+
+    def _cells_in(self, grid: Dict[Tuple[int, int], object], caja: Box) -> Iterator[Tuple[Tuple[int, int], object]]:
+        """Cubetas ocupadas de ``grid`` que tocan ``caja``, con su contenido."""
+        (i0, j0), (i1, j1) = self._key(caja[0], caja[1]), self._key(caja[2], caja[3])
+        if (i1 - i0 + 1) * (j1 - j0 + 1) <= len(grid):
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    contenido = grid.get((i, j))
+                    if contenido is not None:
+                        yield (i, j), contenido
+            return
+        for (i, j), contenido in grid.items():
+            if i0 <= i <= i1 and j0 <= j <= j1:
+                yield (i, j), contenido
+
+    def _add_path(self, ruta: int, trazo: Sequence[Point]):
+        coords = array("d", (c for punto in trazo for c in punto))
+        significancia = dp_significance(coords)
+        n = len(trazo)
+        for inicio in range(0, n - 1, self.CHUNK_POINTS - 1):
+            fin = min(inicio + self.CHUNK_POINTS, n)
+            tramo = len(self._chunk_coords)
+            self._chunk_route.append(ruta)
+            self._chunk_coords.append(coords[2 * inicio:2 * fin])
+            parte = significancia[inicio:fin]
+            parte[0] = parte[-1] = math.inf
+            self._chunk_significance.append(parte)
+            xs, ys = zip(*(mercator(*trazo[i]) for i in range(inicio, fin)))
+            (i0, j0), (i1, j1) = self._key(min(xs), min(ys)), self._key(max(xs), max(ys))
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self._chunk_grid[(i, j)].append(tramo)
+
+    def __len__(self) -> int:
+        return len(self._chunk_coords)
+
+    def route_of(self, tramo: int) -> int:
+        """Número en ``names`` de la ruta a la que pertenece el tramo."""
+        return self._chunk_route[tramo]
+
+    def chunks_in(self, caja: Box) -> Set[int]:
+        """Tramos cuya cubeta toca ``caja``; pueden sobrar unos cuantos en la orilla."""
+        visibles: Set[int] = set()
+        for _, tramos in self._cells_in(self._chunk_grid, caja):
+            visibles.update(tramos)
+        return visibles
+
+    def chunk_points(self, tramo: int, zoom: int) -> List[Point]:
+        """Vértices del tramo a dibujar en ``zoom``, con error menor a un pixel.
+
+        Además de los que descarta Douglas-Peucker se saltan los que caen en
+        el mismo pixel que el anterior: un trazo con ruido de GPS se queda
+        con muchos vértices significativos a poca distancia.
+        """
+        tolerancia = LOD_PIXEL_TOLERANCE * 360 / (TILE_SIZE * 2 ** zoom)
+        coords = self._chunk_coords[tramo]
+        estira = 1 / max(math.cos(math.radians(coords[0])), 1e-6)
+        significancia = self._chunk_significance[tramo]
+        ultimo = len(significancia) - 1
+        puntos: List[Point] = []
+        py = px = math.inf
+        for i, s in enumerate(significancia):
+            if s < tolerancia:
+                continue
+            lat, lon = coords[2 * i], coords[2 * i + 1]
+            if i != ultimo and abs(lat * estira - py) < tolerancia and abs(lon - px) < tolerancia:
+                continue
+            puntos.append((lat, lon))
+            py, px = lat * estira, lon
+        return puntos
+
+    def clusters(self, caja: Box, zoom: int) -> Dict[Tuple[int, int, int], Tuple[float, float, int]]:
+        """Paradas dentro de ``caja`` agrupadas por celda: clave -> (lat, lon, cuántas)."""
+        escala = TILE_SIZE * 2 ** zoom / self.CLUSTER_PIXELS
+        grupos: Dict[Tuple[int, int, int], List[float]] = {}
+
+        def agregar(x: float, y: float, lat: float, lon: float, n: int):
+            clave = (zoom, int(x * escala), int(y * escala))
+            suma = grupos.get(clave)
+            if suma is None:
+                grupos[clave] = [lat, lon, n]
+            else:
+                suma[0] += lat
+                suma[1] += lon
+                suma[2] += n
+
+        if escala * self.GRID <= 1:
+            # La celda del grupo cubre al menos una cubeta: cada cubeta va
+            # entera a la celda de su centro, sin ver sus paradas
+            for _, (sx, sy, slat, slon, n) in self._cells_in(self._stop_sums, caja):
+                agregar(sx / n, sy / n, slat, slon, n)
+        else:
+            paradas = self._stops
+            for _, celda in self._cells_in(self._stop_grid, caja):
+                for parada in celda:
+                    k = 4 * parada
+                    x, y = paradas[k], paradas[k + 1]
+                    if caja[0] <= x <= caja[2] and caja[1] <= y <= caja[3]:
+                        agregar(x, y, paradas[k + 2], paradas[k + 3], 1)
+        return {clave: (lat / n, lon / n, int(n)) for clave, (lat, lon, n) in grupos.items()}
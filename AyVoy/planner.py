@@ -0,0 +1,226 @@
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from geometry import GeometryStore
+from spatial import LocalProjection, PointGrid
+
+WALK_SPEED = 1.2  # m/s
+WALK_FACTOR = 1.3  # Las calles no van en línea recta
+BUS_SPEED = 5.0  # m/s, unos 18 km/h contando paradas
+BOARDING_WAIT = 300.0  # s de espera al subir a una ruta
+TRANSFER_RADIUS = 300.0  # m a pie entre paradas para transbordar
+ACCESS_RADIUS = 800.0  # m a pie desde el origen o hasta el destino
+
+WALK = "caminar"
+RIDE = "ruta"
+
+Point = Tuple[float, float]
+XY = Tuple[float, float]
+
+
+@dataclass
+class TripLeg:
+    modo: str  # WALK o RIDE
+    ruta: Optional[str]
+    puntos: List[Point]  # Paradas recorridas, o inicio y fin de la caminata
+    segundos: float
+
+    @property
+    def paradas(self) -> int:
+        return len(self.puntos) - 1 if self.modo == RIDE else 0
+
+
+@dataclass
+class TripPlan:
+    tramos: List[TripLeg] = field(default_factory=list)
+    segundos: float = 0.0
+
+    @property
+    def transbordos(self) -> int:
+        return max(0, sum(1 for t in self.tramos if t.modo == RIDE) - 1)
+
+    def resumen(self) -> str:
+        rutas = [t.ruta for t in self.tramos if t.modo == RIDE]
+        camino = " → ".join(rutas) if rutas else "A pie"
+        transbordos = {0: "sin transbordos", 1: "1 transbordo"}.get(self.transbordos,
+                                                                   f"{self.transbordos} transbordos")
+        return f"{camino}: {self.segundos / 60:.0f} min, {transbordos}"
+
+
+class TransitGraph:
+    """Grafo de paradas de todas las rutas, compilado una vez para consultas rápidas.
+
+    Cada nodo es una parada de una ruta. Las aristas de viaje unen paradas
+    consecutivas de la misma ruta (en ambos sentidos si ``bidirectional``) y
+    el índice de transbordos, calculado al compilar, une cada parada con las
+    de otras rutas a menos de TRANSFER_RADIUS metros, con la caminata más la
+    espera del siguiente camión.
+
+    Las coordenadas se proyectan a metros con LocalProjection; la distancia
+    en línea recta en ese plano sirve como heurística de A*.
+    """
+
+    def __init__(self, rutas: Iterable[Tuple[str, Sequence[Point]]], bidirectional: bool = True):
+        rutas = [(nombre, list(paradas)) for nombre, paradas in rutas if len(paradas) >= 2]
+        self.projection = LocalProjection.around(lat for _, paradas in rutas for lat, _ in paradas)
+        self.grid = PointGrid(TRANSFER_RADIUS)
+        self.route_names: List[str] = []
+        self.node_route: List[int] = []
+        self.points: List[Point] = []
+        self.xy: List[XY] = []
+        self.rides: List[List[Tuple[int, float]]] = []
+        for nombre, paradas in rutas:
+            indice_ruta = len(self.route_names)
+            self.route_names.append(nombre)
+            primero = len(self.points)
+            for punto in paradas:
+                self.node_route.append(indice_ruta)
+                self.points.append(punto)
+                self.xy.append(self.projection.project(punto))
+                self.grid.add(*self.xy[-1])
+                self.rides.append([])
+            for nodo in range(primero, len(self.points) - 1):
+                segundos = self._distance(nodo, nodo + 1) / BUS_SPEED
+                self.rides[nodo].append((nodo + 1, segundos))
+                if bidirectional:
+                    self.rides[nodo + 1].append((nodo, segundos))
+
+        self.transfers: List[List[Tuple[int, float]]] = []
+        for nodo in range(len(self.points)):
+            self.transfers.append([
+                (otro, metros * WALK_FACTOR / WALK_SPEED + BOARDING_WAIT)
+                for otro, metros in self.near(self.xy[nodo], TRANSFER_RADIUS)
+                if self.node_route[otro] != self.node_route[nodo]])
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _distance(self, a: int, b: int) -> float:
+        return math.dist(self.xy[a], self.xy[b])
+
+    def near(self, xy: XY, radio: float) -> List[Tuple[int, float]]:
+        """Nodos a menos de ``radio`` metros del punto proyectado, con su distancia."""
+        return self.grid.near(xy[0], xy[1], radio)
+
+    def plan(self, origen: Point, destino: Point) -> Optional[TripPlan]:
+        """Viaje más rápido de ``origen`` a ``destino`` (A*), o None si no hay uno."""
+        inicio, fin = self.projection.project(origen), self.projection.project(destino)
+        directo = math.dist(inicio, fin) * WALK_FACTOR / WALK_SPEED
+        llegadas = dict(self.near(fin, ACCESS_RADIUS))
+
+        costo: Dict[int, float] = {}
+        previo: Dict[int, Tuple[int, str]] = {}  # nodo -> (anterior, RIDE/WALK); -1 es el origen
+        cola: List[Tuple[float, float, int]] = []
+        for nodo, metros in self.near(inicio, ACCESS_RADIUS):
+            segundos = metros * WALK_FACTOR / WALK_SPEED + BOARDING_WAIT
+            if segundos < costo.get(nodo, math.inf):
+                costo[nodo] = segundos
+                previo[nodo] = (-1, WALK)
+                heapq.heappush(cola, (segundos + math.dist(self.xy[nodo], fin) / BUS_SPEED, segundos, nodo))
+
+        mejor, ultimo = directo, None
+        cerrados = set()
+        while cola:
+            estimado, segundos, nodo = heapq.heappop(cola)
+            if estimado >= mejor:
+                break  # Ningún camino pendiente puede llegar antes
+            if nodo in cerrados:
+                continue
+            cerrados.add(nodo)
+            # Se baja del camión sólo en paradas a las que llegó a bordo, no tras caminar
+            if nodo in llegadas and previo[nodo][1] == RIDE:
+                total = segundos + llegadas[nodo] * WALK_FACTOR / WALK_SPEED
+                if total < mejor:
+                    mejor, ultimo = total, nodo
+            for aristas, modo in ((self.rides[nodo], RIDE), (self.transfers[nodo], WALK)):
+                for otro, paso in aristas:
+                    nuevo = segundos + paso
+                    if nuevo < costo.get(otro, math.inf):
+                        costo[otro] = nuevo
+                        previo[otro] = (nodo, modo)
+                        heapq.heappush(cola, (nuevo + math.dist(self.xy[otro], fin) / BUS_SPEED,
+                                              nuevo, otro))
+
+        if ultimo is None:
+            if directo > ACCESS_RADIUS * 2 * WALK_FACTOR / WALK_SPEED:
+                return None
+            return TripPlan([TripLeg(WALK, None, [origen, destino], directo)], directo)
+        return self._legs(origen, destino, ultimo, previo, costo, mejor)
+
+    def _legs(self, origen: Point, destino: Point, ultimo: int, previo: Dict[int, Tuple[int, str]],
+              costo: Dict[int, float], total: float) -> TripPlan:
+        camino = [ultimo]
+        while previo[camino[-1]][0] != -1:
+            camino.append(previo[camino[-1]][0])
+        camino.reverse()
+
+        tramos = [TripLeg(WALK, None, [origen, self.points[camino[0]]], costo[camino[0]] - BOARDING_WAIT)]
+        recorrido = [camino[0]]
+        for nodo in camino[1:]:
+            if previo[nodo][1] == WALK:
+                tramos.append(self._ride(recorrido, costo))
+                tramos.append(TripLeg(WALK, None, [self.points[recorrido[-1]], self.points[nodo]],
+                                      costo[nodo] - costo[recorrido[-1]] - BOARDING_WAIT))
+                recorrido = [nodo]
+            else:
+                recorrido.append(nodo)
+        tramos.append(self._ride(recorrido, costo))
+        tramos.append(TripLeg(WALK, None, [self.points[recorrido[-1]], destino],
+                              total - costo[recorrido[-1]]))
+        # Las esperas quedan sumadas al tramo en camión
+        return TripPlan([t for t in tramos if t.modo == RIDE or t.puntos[0] != t.puntos[1]], total)
+
+    def _ride(self, recorrido: List[int], costo: Dict[int, float]) -> TripLeg:
+        return TripLeg(RIDE, self.route_names[self.node_route[recorrido[0]]],
+                       [self.points[n] for n in recorrido],
+                       costo[recorrido[-1]] - costo[recorrido[0]] + BOARDING_WAIT)
+
+
+class TripPlanner:
+    """Planeador de viajes sobre el catálogo de rutas y sus paradas.
+
+    El grafo se compila en la primera consulta y otra vez sólo cuando
+    cambian las rutas o el archivo de geometrías. Los viajes consultados se
+    guardan en un LRU de ``cache_size`` pares origen/destino, redondeados a
+    unos 10 m, así los pares frecuentes (la central, el hospital) se
+    responden sin buscar.
+    """
+
+    def __init__(self, geometrias: GeometryStore, cache_size: int = 256):
+        self.geometrias = geometrias
+        self.cache_size = cache_size
+        self._graph: Optional[TransitGraph] = None
+        self._version = None
+        self._cache: "OrderedDict[Tuple[float, ...], Optional[TripPlan]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def graph(self, rutas: List[str]) -> TransitGraph:
+        version = (self.geometrias.version(), tuple(rutas))
+        with self._build_lock:
+            if self._graph is None or version != self._version:
+                paradas = ((nombre, self.geometrias.stops(nombre) or []) for nombre in rutas)
+                grafo = TransitGraph(paradas)
+                with self._lock:
+                    self._graph, self._version = grafo, version
+                    self._cache.clear()
+            return self._graph
+
+    def plan(self, rutas: List[str], origen: Point, destino: Point) -> Optional[TripPlan]:
+        grafo = self.graph(rutas)
+        clave = tuple(round(c, 4) for c in (*origen, *destino))
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return self._cache[clave]
+        viaje = grafo.plan(origen, destino)
+        with self._lock:
+            if grafo is self._graph:
+                self._cache[clave] = viaje
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return viaje
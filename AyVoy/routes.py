@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+from backends import StorageBackend
+from search import RouteSearchIndex
+
+
+class RouteManager:
+    """Catálogo de rutas compartido por todas las pantallas.
+
+    Las rutas y sus descripciones se cargan una vez, en el primer uso si
+    ``lazy`` es verdadero, y se vuelven a leer sólo cuando el almacenamiento
+    reporta otra versión. La versión se consulta a lo más cada
+    ``check_interval`` segundos, así escribir en el buscador o elegir una
+    ruta no toca el disco.
+    """
+
+    def __init__(self, backend: StorageBackend, lazy: bool = True, check_interval: float = 5.0):
+        self._backend = backend
+        self._check_interval = check_interval
+        self._routes: List[str] = []
+        self._index = RouteSearchIndex([])
+        self._descriptions: Dict[str, str] = {}
+        self._version = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        if not lazy:
+            self.refresh(force=True)
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            ahora = time.monotonic()
+            if self._loaded and not force and ahora - self._checked_at < self._check_interval:
+                return
+            version = self._backend.routes_version()
+            self._checked_at = ahora
+            if self._loaded and version == self._version:
+                return
+            self._routes = self._backend.routes()
+            self._descriptions = self._backend.descriptions()
+            self._index = RouteSearchIndex(self._routes, self._descriptions)
+            self._version = version
+            self._loaded = True
+
+    def routes(self) -> List[str]:
+        self.refresh()
+        return list(self._routes)
+
+    def description(self, ruta: str) -> Optional[str]:
+        self.refresh()
+        return self._descriptions.get(ruta)
+
+    def search_routes(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Rutas por relevancia: nombre, luego descripción, sin acentos y con errores de dedo."""
+        self.refresh()
+        return self._index.search(query, limit)
@@ -0,0 +1,224 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Tamaño máximo de los n-gramas del índice
+NGRAM = 3
+# Peso de una palabra según dónde aparece
+NAME_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+# Factor de una palabra que no es idéntica a la buscada
+PREFIX_FACTOR = 0.8
+MAX_PREFIX_EXPANSIONS = 20
+# Una palabra con más rutas que esto sólo reordena candidatos, no agrega nuevos
+COMMON_TOKEN_DF = 1000
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin acentos: "Asunción" -> "asuncion"."""
+    descompuesto = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def _trigrams(token: str) -> List[str]:
+    return [token[j:j + 3] for j in range(len(token) - 2)]
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> Optional[int]:
+    """Distancia de edición entre ``a`` y ``b``, o None si pasa de ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previa = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            actual[j] = min(previa[j] + 1, actual[j - 1] + 1, previa[j - 1] + (ca != cb))
+        if min(actual) > limit:
+            return None
+        previa = actual
+    return previa[-1] if previa[-1] <= limit else None
+
+
+class RouteSearchIndex:
+    """Búsqueda de rutas por nombre y descripción, sin acentos y tolerante a errores.
+
+    Todo se normaliza una vez al construir el índice. Primero van las rutas
+    cuyo nombre contiene la consulta, con un índice de n-gramas de 1 a 3
+    letras: una consulta corta es una sola búsqueda en el diccionario y una
+    larga intersecta las listas de sus trigramas. Si la consulta nueva
+    contiene a la anterior (lo normal al escribir) se filtra el resultado
+    anterior en lugar de ir al índice. El índice se comparte entre los
+    hilos de api.py, así que esa última consulta se lee y se guarda con
+    un candado.
+
+    Después van las demás rutas ordenadas por puntaje, con un índice
+    invertido de palabras de nombre y descripción ponderado por idf. Cada
+    palabra de la consulta cuenta también sus prefijos en el vocabulario y,
+    si no aparece tal cual, las palabras a distancia de edición 1 (2 si es
+    larga), halladas por trigramas compartidos.
+    """
+
+    def __init__(self, names: Sequence[str], descriptions: Optional[Dict[str, str]] = None):
+        descriptions = descriptions or {}
+        self._names = list(names)
+        self._norm = [normalize(n) for n in self._names]
+        self._grams: Dict[str, List[int]] = {}
+        for i, norm in enumerate(self._norm):
+            vistos = set()
+            for n in range(1, NGRAM + 1):
+                for j in range(len(norm) - n + 1):
+                    vistos.add(norm[j:j + n])
+            for gram in vistos:
+                self._grams.setdefault(gram, []).append(i)
+
+        self._postings: Dict[str, Dict[int, float]] = {}
+        for i, nombre in enumerate(self._names):
+            campos = ((self._norm[i], NAME_WEIGHT),
+                      (normalize(descriptions.get(nombre, "")), DESCRIPTION_WEIGHT))
+            for texto, peso in campos:
+                for token in _TOKEN.findall(texto):
+                    docs = self._postings.setdefault(token, {})
+                    docs[i] = max(docs.get(i, 0.0), peso)
+        total = len(self._names)
+        self._idf = {t: math.log(1 + total / len(docs)) for t, docs in self._postings.items()}
+        self._vocab = sorted(self._postings)
+        self._vocab_grams: Dict[str, List[str]] = {}
+        for token in self._vocab:
+            for gram in set(_trigrams(token)):
+                self._vocab_grams.setdefault(gram, []).append(token)
+
+        self._sorted: Dict[str, List[Tuple[float, int]]] = {}
+
+        self._last_query: Optional[str] = None
+        self._last_ids: List[int] = []
+        self._last_lock = threading.Lock()
+
+    def _lookup(self, query: str) -> List[int]:
+        if len(query) <= NGRAM:
+            return self._grams.get(query, [])
+        listas = sorted((self._grams.get(query[j:j + NGRAM], [])
+                         for j in range(len(query) - NGRAM + 1)), key=len)
+        candidatos = set(listas[0])
+        for lista in listas[1:]:
+            candidatos.intersection_update(lista)
+            if not candidatos:
+                return []
+        return [i for i in sorted(candidatos) if query in self._norm[i]]
+
+    def _substring_ids(self, query: str) -> List[int]:
+        # Consulta y resultado se toman juntos; filtrar se hace fuera del candado
+        with self._last_lock:
+            anterior, previos = self._last_query, self._last_ids
+        if anterior is not None and anterior in query:
+            ids = [i for i in previos if query in self._norm[i]]
+        else:
+            ids = self._lookup(query)
+        with self._last_lock:
+            self._last_query, self._last_ids = query, ids
+        return ids
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Palabras del vocabulario que cuentan para ``token`` y su factor."""
+        salida = []
+        if token in self._postings:
+            salida.append((token, 1.0))
+        i = bisect_left(self._vocab, token)
+        while (i < len(self._vocab) and self._vocab[i].startswith(token)
+               and len(salida) < MAX_PREFIX_EXPANSIONS):
+            if self._vocab[i] != token:
+                salida.append((self._vocab[i], PREFIX_FACTOR))
+            i += 1
+        if salida or len(token) < 3:
+            return salida
+
+        limite = 1 if len(token) <= 5 else 2
+        grams = _trigrams(token)
+        comunes = Counter()
+        for gram in set(grams):
+            comunes.update(self._vocab_grams.get(gram, ()))
+        # Cada edición destruye a lo más 3 trigramas
+        minimo = max(1, len(grams) - 3 * limite)
+        for candidato, n in comunes.items():
+            if n >= minimo:
+                distancia = bounded_levenshtein(token, candidato, limite)
+                if distancia is not None:
+                    salida.append((candidato, 0.7 - 0.15 * distancia))
+        return salida
+
+    def _sorted_postings(self, token: str) -> List[Tuple[float, int]]:
+        lista = self._sorted.get(token)
+        if lista is None:
+            lista = self._sorted[token] = sorted((-peso, i) for i, peso in self._postings[token].items())
+        return lista
+
+    def _top_single(self, expansion, excluir: set, limit: int) -> List[int]:
+        """Top-k de una sola palabra sin recorrer todas sus rutas.
+
+        Las listas ordenadas por puntaje se mezclan; la primera vez que sale
+        una ruta es con su mejor puntaje, así que basta con tomar las primeras.
+        """
+        def flujo(token, factor):
+            escala = self._idf[token] * factor
+            return ((p * escala, i) for p, i in self._sorted_postings(token))
+
+        flujos = [flujo(t, factor) for t, factor in expansion]
+        salida, vistos = [], set(excluir)
+        for _, i in heapq.merge(*flujos):
+            if i not in vistos:
+                vistos.add(i)
+                salida.append(i)
+                if len(salida) == limit:
+                    break
+        return salida
+
+    def _rank(self, query: str, excluir: set, limit: Optional[int]) -> List[int]:
+        expansiones = [self._expand(t) for t in _TOKEN.findall(query)]
+        expansiones = [e for e in expansiones if e]
+        if len(expansiones) == 1 and limit is not None:
+            return self._top_single(expansiones[0], excluir, limit)
+        # Las palabras raras primero: generan pocos candidatos
+        expansiones.sort(key=lambda e: sum(len(self._postings[t]) for t, _ in e))
+        puntajes: Dict[int, float] = {}
+        for k, expansion in enumerate(expansiones):
+            mejor: Dict[int, float] = {}
+            frecuencia = sum(len(self._postings[t]) for t, _ in expansion)
+            solo_candidatos = k > 0 and frecuencia > COMMON_TOKEN_DF
+            for token, factor in expansion:
+                escala = self._idf[token] * factor
+                docs = self._postings[token]
+                if solo_candidatos:
+                    pares = ((i, docs[i]) for i in puntajes if i in docs)
+                else:
+                    pares = docs.items()
+                for i, peso in pares:
+                    valor = peso * escala
+                    if valor > mejor.get(i, 0.0):
+                        mejor[i] = valor
+            for i, valor in mejor.items():
+                puntajes[i] = puntajes.get(i, 0.0) + valor
+        candidatos = ((p, i) for i, p in puntajes.items() if i not in excluir)
+        if limit is None:
+            orden = sorted(candidatos, key=lambda c: (-c[0], c[1]))
+        else:
+            orden = heapq.nsmallest(limit, candidatos, key=lambda c: (-c[0], c[1]))
+        return [i for _, i in orden]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        query = normalize(query).strip()
+        if not query:
+            ids = list(range(len(self._names)))
+        else:
+            ids = self._substring_ids(query)
+            if limit is None or len(ids) < limit:
+                restantes = None if limit is None else limit - len(ids)
+                ids = ids + self._rank(query, set(ids), restantes)
+        if limit is not None:
+            ids = ids[:limit]
+        return [self._names[i] for i in ids]
@@ -0,0 +1,125 @@
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from backends import StorageBackend, open_backend
+from config import GEOMETRY_PATH, MOVEMENTS_PATH
+from geometry import GeometryStore, RouteShape
+from movements import RECHARGE, Movement, MovementLog
+from overlay import NetworkOverlay
+from planner import TripPlan, TripPlanner
+from routes import RouteManager
+from spatial import RouteLocator
+
+# Radio por omisión de "rutas cerca de aquí", en metros
+NEAR_RADIUS = 400.0
+
+Index = TypeVar("Index")
+
+
+class InvalidInput(ValueError):
+    """Un dato de quien llama no es válido (un monto negativo, por ejemplo)."""
+
+
+class KioskService:
+    """Operaciones del kiosco sin interfaz: folios, saldo, recargas y rutas.
+
+    La App de Tk y el servidor HTTP (api.py) llaman a estos mismos métodos,
+    así las reglas (qué es un monto válido, qué queda en el historial) viven
+    en un solo lugar. Se pueden llamar desde varios hilos a la vez.
+
+    Los errores son los del almacenamiento: FileNotFoundError si faltan los
+    datos, UnknownFolio (un KeyError) si el folio no existe e InvalidInput (un
+    ValueError) si un dato no es válido.
+    """
+
+    def __init__(self, storage: Optional[StorageBackend] = None,
+                 historial: Optional[MovementLog] = None,
+                 geometrias: Optional[GeometryStore] = None):
+        self.storage = storage if storage is not None else open_backend()
+        self.historial = historial if historial is not None else MovementLog(MOVEMENTS_PATH)
+        self.geometrias = geometrias if geometrias is not None else GeometryStore(GEOMETRY_PATH)
+        self.route_manager = RouteManager(self.storage)  # Catálogo de rutas, se carga en el primer uso
+        self.planner = TripPlanner(self.geometrias)  # Grafo de paradas, se compila en el primer viaje
+        self._indices: Dict[Callable, Tuple[object, object]] = {}  # Índices sobre los trazos, ver _index
+        self._indices_lock = threading.Lock()
+
+    def start(self):
+        """Arranca el mantenimiento del almacenamiento en segundo plano."""
+        self.storage.start_compactor()
+
+    def close(self):
+        self.storage.close()
+
+    # Folios y saldo
+
+    def validate_folio(self, folio: str) -> bool:
+        folio = folio.strip()
+        return bool(folio) and self.storage.exists(folio)
+
+    def balance(self, folio: str) -> Optional[float]:
+        return self.storage.balance(folio)
+
+    def recharge(self, folio: str, monto: float) -> float:
+        """Recarga ``monto`` al folio, la anota en su historial y regresa el saldo nuevo."""
+        if not math.isfinite(monto) or monto <= 0:
+            raise InvalidInput("El monto debe ser mayor a 0.")
+        saldo = self.storage.recargar(folio, monto)
+        self.historial.append(folio, RECHARGE, monto)
+        return saldo
+
+    def movement_count(self, folio: str, dias: Optional[int] = None) -> int:
+        """Movimientos con fecha del folio, o sólo los de los últimos ``dias``."""
+        if dias is None:
+            return self.historial.count(folio)
+        return self.historial.recent(folio, dias)
+
+    def movements(self, folio: str, offset: int, limit: int) -> List[Movement]:
+        """Página del historial, del movimiento más reciente hacia atrás."""
+        return self.historial.page(folio, offset, limit)
+
+    def legacy_movement_count(self, folio: str) -> int:
+        """Movimientos de usuarios.txt anteriores al historial (sólo la hora)."""
+        return self.storage.movement_count(folio)
+
+    def legacy_movements(self, folio: str, offset: int, limit: int) -> List[str]:
+        return self.storage.movements(folio, offset, limit)
+
+    # Rutas
+
+    def routes(self) -> List[str]:
+        return self.route_manager.routes()
+
+    def search_routes(self, query: str, limit: Optional[int] = None) -> List[str]:
+        return self.route_manager.search_routes(query, limit)
+
+    def route_description(self, ruta: str) -> Optional[str]:
+        return self.route_manager.description(ruta)
+
+    def route_shape(self, ruta: str) -> Optional[RouteShape]:
+        return self.geometrias.get(ruta)
+
+    def _index(self, clase: Callable[..., Index]) -> Index:
+        """Índice ``clase(geometrias.paths())``, construido en el primer uso.
+
+        Se vuelve a construir sólo si cambia el archivo de geometrías.
+        """
+        with self._indices_lock:
+            version = self.geometrias.version()
+            anterior = self._indices.get(clase)
+            if anterior is None or anterior[0] != version:
+                anterior = self._indices[clase] = (version, clase(self.geometrias.paths()))
+            return anterior[1]
+
+    def routes_near(self, punto: Tuple[float, float],
+                    radio: float = NEAR_RADIUS) -> List[Tuple[str, float]]:
+        """Rutas que pasan a menos de ``radio`` metros, de la más cercana a la más lejana."""
+        return self._index(RouteLocator).routes_near(punto, radio)
+
+    def network_overlay(self) -> NetworkOverlay:
+        """Todos los trazos y paradas en tramos, para dibujar la red completa en el mapa."""
+        return self._index(NetworkOverlay)
+
+    def plan_trip(self, origen: Tuple[float, float], destino: Tuple[float, float]) -> Optional[TripPlan]:
+        """Viaje más rápido entre dos puntos combinando rutas, o None si no hay uno."""
+        return self.planner.plan(self.routes(), origen, destino)
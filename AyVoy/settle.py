@@ -0,0 +1,382 @@
+"""Liquidación de fin de día: cobra los viajes de usuarios.txt contra los saldos.
+
+    python settle.py --usuarios C:\\Python\\AyVoy\\USERS\\usuarios.txt --fecha 20261017
+
+Cada línea ``folio, saldo, hora, hora...`` trae las horas de los viajes
+del día. La liquidación cobra cada viaje según su franja horaria y el
+tipo de tarjeta del folio (tarjetas.txt, una línea ``folio,tipo``; los
+folios que no estén pagan tarifa general), deja las listas de viajes
+vacías y escribe todos los saldos en una sola instantánea, junto con las
+recargas pendientes en bitácora. Cada viaje cobrado pasa al historial de
+movimientos del folio con su fecha y tarifa. La instantánea anterior
+queda como ``usuarios.<fecha>.txt``; si ya existe, ese día ya se liquidó.
+De un folio repetido vale el saldo de su primera línea: los viajes de las
+demás se cobran ahí y esos renglones se quitan. Los saldos que quedan
+negativos se listan al terminar.
+
+El archivo se lee a columnas (saldos, conteos y minutos de cada viaje en
+arreglos) y las tarifas se aplican a todos los viajes de una vez con
+NumPy; sin NumPy se usa ``array`` viaje por viaje. Es para el texto
+plano: con STORAGE_BACKEND = "sqlite" los viajes viven en la base.
+"""
+import argparse
+import gc
+import os
+import time
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import CARDS_PATH, DATA_PATH, MOVEMENTS_PATH
+from movements import TRIP, Movement, MovementLog
+from storage import UserStore
+
+try:
+    import numpy
+except ImportError:  # Sin NumPy se cobra con array, viaje por viaje
+    numpy = None
+
+USERS_BLOCK = 1 << 14  # Usuarios cuyos viajes se convierten juntos con NumPy
+NEGATIVE_SAMPLE = 20  # Folios con saldo negativo que se listan al terminar
+_SIN_ESPACIOS = str.maketrans("", "", " \t\r\n")
+
+GENERAL = "general"
+# Los tipos de tarjeta son los trámites de DocumentManager.REQUIRED_DOCS
+CARD_TYPES = [GENERAL, "discapacitado", "estudiante", "adulto_mayor"]
+
+# Franjas horarias: (minuto del día en que empieza, nombre)
+BANDS = [(0, "nocturna"), (5 * 60, "diurna"), (22 * 60, "nocturna")]
+# Tarifa en centavos por tipo de tarjeta y franja
+FARES = {
+    GENERAL: {"diurna": 1100, "nocturna": 1400},
+    "discapacitado": {"diurna": 0, "nocturna": 0},
+    "estudiante": {"diurna": 550, "nocturna": 700},
+    "adulto_mayor": {"diurna": 550, "nocturna": 700},
+}
+
+
+@dataclass
+class SettlementReport:
+    usuarios: int = 0
+    viajes: int = 0
+    cobrado: float = 0.0
+    saldos_negativos: int = 0
+    folios_negativos: List[str] = field(default_factory=list)  # Los que quedaron debiendo
+    repetidos: int = 0  # Renglones de folios repetidos, cobrados junto con su primera línea
+    horas_invalidas: int = 0
+    por_tipo: Dict[str, int] = field(default_factory=dict)  # Viajes por tipo de tarjeta
+    # Lo liquidado, columnas y tarifa de cada viaje, hasta pasarlo al historial
+    cobros: Optional[Tuple["Columns", array]] = field(default=None, repr=False)
+
+
+@dataclass
+class Columns:
+    """usuarios.txt a columnas; ``minutos`` son los viajes de todos, uno tras otro."""
+    lineas: array = field(default_factory=lambda: array("I"))  # Renglón de cada usuario en el archivo
+    folios: List[str] = field(default_factory=list)
+    saldos: array = field(default_factory=lambda: array("q"))  # Centavos
+    tipos: array = field(default_factory=lambda: array("b"))  # Índice en CARD_TYPES
+    viajes: array = field(default_factory=lambda: array("I"))
+    minutos: array = field(default_factory=lambda: array("h"))  # -1 si la hora no es válida
+    repetidas: array = field(default_factory=lambda: array("I"))  # Renglones ya sumados a otra línea
+
+
+def read_cards(path: str) -> Dict[str, str]:
+    """Tipo de tarjeta por folio; un archivo que no existe es que nadie tiene descuento."""
+    tarjetas = {}
+    try:
+        with open(path, "r", encoding="utf-8") as archivo:
+            for linea in archivo:
+                if not linea.strip() or linea.startswith("#"):
+                    continue
+                folio, _, tipo = (c.strip() for c in linea.partition(","))
+                if tipo not in FARES:
+                    raise ValueError(f"Tipo de tarjeta desconocido para {folio}: {tipo!r}")
+                tarjetas[folio] = tipo
+    except FileNotFoundError:
+        pass
+    return tarjetas
+
+
+def _minute(hora: str) -> int:
+    """``H:MM`` a minutos del día; -1 para lo que no sea una hora."""
+    h, separador, m = hora.partition(":")
+    try:
+        h, m = int(h), int(m)
+    except ValueError:
+        return -1
+    return h * 60 + m if separador and 0 <= h < 24 and 0 <= m < 60 else -1
+
+
+def _trips_vector(restos: List[str]) -> Optional[Tuple[array, array]]:
+    """Viajes de un bloque de usuarios con NumPy: (cuántos por usuario, minutos).
+
+    ``restos`` es lo que sigue al saldo en cada línea. Todo el bloque se
+    revisa y convierte sobre los bytes, sin partir cadenas en Python;
+    regresa None si alguna hora no tiene la forma ``H:MM`` o ``HH:MM``.
+    """
+    texto = ";".join(restos).translate(_SIN_ESPACIOS)
+    crudo = numpy.frombuffer(texto.encode("latin-1", "replace"), dtype=numpy.uint8)
+    digito = (crudo >= ord("0")) & (crudo <= ord("9"))
+    separador = (crudo == ord(",")) | (crudo == ord(";"))
+    dos_puntos = numpy.flatnonzero(crudo == ord(":"))
+    if numpy.count_nonzero(digito) + numpy.count_nonzero(separador) + len(dos_puntos) != len(crudo):
+        return None
+    # Con un borde de separadores alrededor, cada hora es sep [d] d : d d sep
+    borde = numpy.ones(1, dtype=bool), numpy.ones(3, dtype=bool)
+    separador = numpy.concatenate((borde[0], separador, borde[1]))
+    digito = numpy.concatenate((~borde[0], digito, ~borde[1]))
+    cifra = numpy.concatenate((numpy.zeros(1, numpy.int16), crudo - ord("0"), numpy.zeros(3, numpy.int16)))
+    c = dos_puntos + 1
+    decenas = digito[c - 2]
+    inicio = numpy.where(decenas, c - 3, c - 2)
+    if not (digito[c - 1] & digito[c + 1] & digito[c + 2] & separador[c + 3] & separador[inicio]).all():
+        return None
+    # Ningún dígito fuera de una hora (un "7" suelto)
+    if numpy.count_nonzero(digito) != 3 * len(c) + numpy.count_nonzero(decenas):
+        return None
+    h = cifra[c - 1] + 10 * cifra[c - 2] * decenas
+    m = 10 * cifra[c + 1] + cifra[c + 2]
+    minutos = numpy.where((h < 24) & (m < 60), h * 60 + m, -1).astype(numpy.int16)
+    usuario = numpy.searchsorted(numpy.flatnonzero(crudo == ord(";")), dos_puntos)
+    conteos = numpy.bincount(usuario, minlength=len(restos)).astype(numpy.uint32)
+    return array("I", conteos.tobytes()), array("h", minutos.tobytes())
+
+
+def _trips(restos: List[str], columnas: Columns):
+    for inicio in range(0, len(restos), USERS_BLOCK):
+        bloque = restos[inicio:inicio + USERS_BLOCK]
+        rapido = _trips_vector(bloque) if numpy is not None else None
+        if rapido is not None:
+            columnas.viajes.extend(rapido[0])
+            columnas.minutos.extend(rapido[1])
+            continue
+        # Una hora mal escrita sólo hace lento su bloque
+        for resto in bloque:
+            horas = [_minute(h.strip()) for h in resto.split(",") if h.strip()]
+            columnas.viajes.append(len(horas))
+            columnas.minutos.extend(horas)
+
+
+def _cents(textos: List[str]) -> Optional[array]:
+    """Saldos en texto a centavos, todos a la vez; None si alguno no es un número."""
+    try:
+        if numpy is not None:
+            return array("q", numpy.rint(numpy.array(textos, dtype=numpy.float64) * 100)
+                         .astype(numpy.int64).tobytes())
+        return array("q", (round(float(t) * 100) for t in textos))
+    except ValueError:
+        return None
+
+
+def _is_number(texto: str) -> bool:
+    try:
+        float(texto)
+    except ValueError:
+        return False
+    return True
+
+
+def read_columns(lineas: List[str], deltas: Dict[str, float], tarjetas: Dict[str, str]) -> Columns:
+    """Las líneas válidas a columnas, con las recargas de ``deltas`` ya sumadas.
+
+    Por línea sólo se separan folio, saldo y resto; los saldos y las horas
+    se convierten por bloques (ver _cents y _trips_vector). Como en
+    UserStore, de un folio repetido sólo vale el saldo de su primera línea
+    válida; los viajes de las demás se suman a ella y sus renglones quedan
+    en ``repetidas``.
+    """
+    partes = [linea.split(",", 2) for linea in lineas]
+    filas = [n for n, p in enumerate(partes) if len(p) >= 2 and not p[0].startswith("#")]
+    saldos = _cents([partes[n][1] for n in filas])
+    if saldos is None:
+        # Algún renglón roto: se conserva tal cual y no se liquida
+        filas = [n for n in filas if _is_number(partes[n][1])]
+        saldos = _cents([partes[n][1] for n in filas])
+    folios = [partes[n][0].strip() for n in filas]
+    restos = [partes[n][2] if len(partes[n]) == 3 else "" for n in filas]
+    repetidas = array("I")
+    if len(set(folios)) != len(folios):
+        primera: Dict[str, int] = {}
+        unicas = []
+        for i, folio in enumerate(folios):
+            k = primera.get(folio)
+            if k is None:
+                primera[folio] = i
+                unicas.append(i)
+            else:
+                restos[k] = ",".join(r for r in (restos[k].rstrip(), restos[i]) if r.strip())
+                repetidas.append(filas[i])
+        filas = [filas[i] for i in unicas]
+        folios = [folios[i] for i in unicas]
+        restos = [restos[i] for i in unicas]
+        saldos = array("q", (saldos[i] for i in unicas))
+
+    columnas = Columns(lineas=array("I", filas), folios=folios, saldos=saldos,
+                       tipos=array("b", bytes(len(filas))), repetidas=repetidas)
+    # Sin tarjeta es tarifa general (0); recargas y tarjetas se buscan sólo si hay
+    if deltas or tarjetas:
+        tipos = {tipo: i for i, tipo in enumerate(CARD_TYPES)}
+        for i, folio in enumerate(columnas.folios):
+            if folio in deltas:
+                columnas.saldos[i] += round(deltas[folio] * 100)
+            if folio in tarjetas:
+                columnas.tipos[i] = tipos[tarjetas[folio]]
+    _trips(restos, columnas)
+    return columnas
+
+
+def _fare_table() -> List[List[int]]:
+    return [[FARES[tipo][banda] for _, banda in BANDS] for tipo in CARD_TYPES]
+
+
+def trip_fares(columnas: Columns) -> array:
+    """Centavos de cada viaje de ``columnas.minutos``; las horas no válidas no se cobran."""
+    tabla = _fare_table()
+    inicios = [inicio for inicio, _ in BANDS]
+    if numpy is not None:
+        minutos = numpy.frombuffer(columnas.minutos, dtype=numpy.int16)
+        usuario = numpy.repeat(numpy.arange(len(columnas.folios)),
+                               numpy.frombuffer(columnas.viajes, dtype=numpy.uint32))
+        banda = numpy.searchsorted(numpy.array(inicios), minutos, side="right") - 1
+        tipo = numpy.frombuffer(columnas.tipos, dtype=numpy.int8)[usuario]
+        tarifa = numpy.where(minutos >= 0, numpy.array(tabla, dtype=numpy.int64)[tipo, banda], 0)
+        return array("q", tarifa.astype(numpy.int64).tobytes())
+
+    tarifas = array("q")
+    k = 0
+    for tipo, viajes in zip(columnas.tipos, columnas.viajes):
+        tarifas.extend(tabla[tipo][bisect_right(inicios, minuto) - 1] if minuto >= 0 else 0
+                       for minuto in columnas.minutos[k:k + viajes])
+        k += viajes
+    return tarifas
+
+
+def charges(columnas: Columns, tarifas: array) -> array:
+    """Centavos a cobrar a cada usuario: la suma de las ``tarifas`` de sus viajes."""
+    if numpy is not None:
+        usuario = numpy.repeat(numpy.arange(len(columnas.folios)),
+                               numpy.frombuffer(columnas.viajes, dtype=numpy.uint32))
+        total = numpy.bincount(usuario, weights=numpy.frombuffer(tarifas, dtype=numpy.int64),
+                               minlength=len(columnas.folios))
+        return array("q", numpy.rint(total).astype(numpy.int64).tobytes())
+
+    cobros = array("q", bytes(8 * len(columnas.folios)))
+    k = 0
+    for i, viajes in enumerate(columnas.viajes):
+        cobros[i] = sum(tarifas[k:k + viajes])
+        k += viajes
+    return cobros
+
+
+def trip_movements(columnas: Columns, tarifas: array, fecha: str) -> Iterator[Tuple[str, Movement]]:
+    """Un movimiento TRIP por viaje cobrado, fechado el día ``fecha`` (AAAAMMDD) a su hora."""
+    dia = time.strptime(fecha, "%Y%m%d")
+    # Hora local de cada minuto del día; mktime resuelve el cambio de horario
+    epoca = [time.mktime((dia.tm_year, dia.tm_mon, dia.tm_mday, m // 60, m % 60, 0, 0, 0, -1))
+             for m in range(24 * 60)]
+    k = 0
+    for folio, viajes in zip(columnas.folios, columnas.viajes):
+        for minuto, tarifa in zip(columnas.minutos[k:k + viajes], tarifas[k:k + viajes]):
+            if minuto >= 0:
+                yield folio, Movement(epoca[minuto], TRIP, -tarifa / 100)
+        k += viajes
+
+
+def settle_lines(lineas: List[str], deltas: Dict[str, float], tarjetas: Dict[str, str],
+                 reporte: SettlementReport) -> List[str]:
+    """Transformación de UserStore.compact: saldos cobrados y listas de viajes vacías.
+
+    Los viajes cobrados quedan en ``reporte.cobros`` para trip_movements.
+    """
+    # Son millones de listas pequeñas sin ciclos: el recolector las revisaría en vano
+    recolector = gc.isenabled()
+    gc.disable()
+    try:
+        columnas = read_columns(lineas, deltas, tarjetas)
+    finally:
+        if recolector:
+            gc.enable()
+    tarifas = trip_fares(columnas)
+    cobros = charges(columnas, tarifas)
+    reporte.cobros = columnas, tarifas
+
+    reporte.usuarios = len(columnas.folios)
+    reporte.horas_invalidas = columnas.minutos.count(-1)
+    reporte.viajes = len(columnas.minutos) - reporte.horas_invalidas
+    reporte.cobrado = sum(cobros) / 100
+    por_tipo = [0] * len(CARD_TYPES)
+    for tipo, viajes in zip(columnas.tipos, columnas.viajes):
+        por_tipo[tipo] += viajes
+    reporte.por_tipo = {tipo: n for tipo, n in zip(CARD_TYPES, por_tipo) if n}
+
+    saldos = [saldo - cobro for saldo, cobro in zip(columnas.saldos, cobros)]
+    reporte.folios_negativos = [folio for folio, saldo in zip(columnas.folios, saldos) if saldo < 0]
+    reporte.saldos_negativos = len(reporte.folios_negativos)
+    reporte.repetidos = len(columnas.repetidas)
+    # Las líneas que no son de usuario (comentarios, renglones rotos) se conservan tal cual
+    salida = list(lineas)
+    for n, folio, saldo in zip(columnas.lineas, columnas.folios, saldos):
+        salida[n] = f"{folio}, {saldo / 100:.2f}\n"
+    # Sus viajes ya se cobraron en la primera línea del folio
+    for n in columnas.repetidas:
+        salida[n] = ""
+    return salida
+
+
+def settle(path: str, fecha: str, tarjetas: Dict[str, str],
+           historial: Optional[MovementLog] = None) -> SettlementReport:
+    """Liquida los viajes de ``path`` del día ``fecha`` (AAAAMMDD) en una sola instantánea.
+
+    Los viajes pasan al historial después de reemplazar la instantánea:
+    nunca queda en el historial un cobro que no llegó al saldo. Si el
+    proceso se cae en medio, los viajes siguen en ``usuarios.<fecha>.txt``.
+    """
+    time.strptime(fecha, "%Y%m%d")  # ValueError si la fecha no es AAAAMMDD
+    archivo = f"{os.path.splitext(path)[0]}.{fecha}.txt"
+    if os.path.exists(archivo):
+        raise ValueError(f"El {fecha} ya se liquidó ({archivo})")
+    historial = historial if historial is not None else MovementLog(MOVEMENTS_PATH)
+    reporte = SettlementReport()
+    store = UserStore(path)
+    try:
+        store.compact(lambda lineas, deltas: settle_lines(lineas, deltas, tarjetas, reporte), archivo)
+    finally:
+        store.close()
+    columnas, tarifas = reporte.cobros
+    reporte.cobros = None
+    historial.extend(trip_movements(columnas, tarifas, fecha))
+    return reporte
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", default=f"{DATA_PATH}/usuarios.txt")
+    parser.add_argument("--tarjetas", default=CARDS_PATH)
+    parser.add_argument("--movimientos", default=MOVEMENTS_PATH, help="historial donde quedan los viajes")
+    parser.add_argument("--fecha", default=time.strftime("%Y%m%d"), help="día que se liquida, AAAAMMDD")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    try:
+        reporte = settle(args.usuarios, args.fecha, read_cards(args.tarjetas), MovementLog(args.movimientos))
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    print(f"{reporte.usuarios} usuarios, {reporte.viajes} viajes, ${reporte.cobrado:,.2f} cobrados "
+          f"en {time.perf_counter() - inicio:.2f} s")
+    for tipo, viajes in reporte.por_tipo.items():
+        print(f"  {tipo:<14} {viajes} viajes")
+    if reporte.repetidos:
+        print(f"  {reporte.repetidos} renglones de folios repetidos, cobrados con su primera línea y quitados")
+    if reporte.saldos_negativos:
+        muestra = ", ".join(reporte.folios_negativos[:NEGATIVE_SAMPLE])
+        resto = reporte.saldos_negativos - NEGATIVE_SAMPLE
+        print(f"  AVISO: {reporte.saldos_negativos} saldos quedaron negativos: {muestra}"
+              + (f" y {resto} más" if resto > 0 else ""))
+    if reporte.horas_invalidas:
+        print(f"  {reporte.horas_invalidas} horas no válidas sin cobrar")
+
+
+if __name__ == "__main__":
+    main()
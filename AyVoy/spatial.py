@@ -0,0 +1,183 @@
+import math
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+EARTH_RADIUS = 6371000.0
+
+Point = Tuple[float, float]
+
+
+class LocalProjection:
+    """Lat/lon a metros en un plano (equirrectangular alrededor de ``lat0``).
+
+    En una ciudad el error es despreciable y las distancias quedan
+    euclidianas, que es lo que necesitan los índices de este módulo.
+    """
+
+    def __init__(self, lat0: float):
+        self.lat0 = lat0
+        self._kx = math.radians(1) * math.cos(math.radians(lat0)) * EARTH_RADIUS
+        self._ky = math.radians(1) * EARTH_RADIUS
+
+    @classmethod
+    def around(cls, latitudes: Iterable[float]) -> "LocalProjection":
+        latitudes = list(latitudes)
+        return cls(sum(latitudes) / len(latitudes) if latitudes else 0.0)
+
+    def project(self, punto: Point) -> Tuple[float, float]:
+        return punto[1] * self._kx, punto[0] * self._ky
+
+
+def _cells_within(x: float, y: float, radio: float, cell: float) -> Iterator[Tuple[float, Tuple[int, int]]]:
+    """Cubetas de lado ``cell`` que tocan el círculo, con su distancia mínima al punto.
+
+    Las esquinas del cuadrado que quedan fuera del círculo se saltan.
+    """
+    cx, cy = int(x // cell), int(y // cell)
+    alcance = math.ceil(radio / cell)
+    limite = radio * radio
+    for i in range(cx - alcance, cx + alcance + 1):
+        # Distancia del punto a la columna de cubetas (0 si está dentro)
+        dx = max(i * cell - x, 0.0, x - (i + 1) * cell)
+        for j in range(cy - alcance, cy + alcance + 1):
+            dy = max(j * cell - y, 0.0, y - (j + 1) * cell)
+            distancia = dx * dx + dy * dy
+            if distancia <= limite:
+                yield math.sqrt(distancia), (i, j)
+
+
+class PointGrid:
+    """Puntos en cubetas de ``cell`` metros; ``near`` revisa sólo las cubetas del radio."""
+
+    def __init__(self, cell: float):
+        self.cell = cell
+        self._cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._xy: List[Tuple[float, float]] = []
+
+    def __len__(self) -> int:
+        return len(self._xy)
+
+    def _key(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell), int(y // self.cell)
+
+    def add(self, x: float, y: float) -> int:
+        """Agrega un punto y regresa su número (el orden en que se agregó)."""
+        item = len(self._xy)
+        self._xy.append((x, y))
+        self._cells[self._key(x, y)].append(item)
+        return item
+
+    def near(self, x: float, y: float, radio: float) -> List[Tuple[int, float]]:
+        """Puntos a menos de ``radio`` metros, con su distancia, sin orden."""
+        cercanos = []
+        for _, celda in _cells_within(x, y, radio, self.cell):
+            for item in self._cells.get(celda, ()):
+                metros = math.dist((x, y), self._xy[item])
+                if metros <= radio:
+                    cercanos.append((item, metros))
+        return cercanos
+
+
+def _segment_distance(x: float, y: float, x1: float, y1: float, x2: float, y2: float) -> float:
+    dx, dy = x2 - x1, y2 - y1
+    largo = dx * dx + dy * dy
+    t = 0.0 if largo == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / largo))
+    return math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+
+
+class SegmentGrid:
+    """Segmentos de polilíneas en cubetas de ``cell`` metros, agrupados por dueño.
+
+    Cada segmento se anota en todas las cubetas que toca su caja, así un
+    tramo largo entre dos vértices lejanos también se encuentra. Los
+    extremos van en un ``array('d')``, 32 bytes por segmento.
+
+    ``near`` recorre las cubetas de la más cercana a la más lejana: cuando
+    un dueño ya tiene una distancia menor que la de la cubeta, sus segmentos
+    en ella ni se miden. Con muchas rutas encimadas cada una sólo se mide
+    cerca de su punto más próximo.
+    """
+
+    def __init__(self, cell: float):
+        self.cell = cell
+        self._cells: Dict[Tuple[int, int], Dict[int, array]] = {}
+        self._coords = array("d")
+
+    def __len__(self) -> int:
+        return len(self._coords) // 4
+
+    def add_polyline(self, owner: int, puntos: Sequence[Tuple[float, float]]):
+        for (x1, y1), (x2, y2) in zip(puntos, puntos[1:]):
+            segmento = len(self._coords) // 4
+            self._coords.extend((x1, y1, x2, y2))
+            for i in range(int(min(x1, x2) // self.cell), int(max(x1, x2) // self.cell) + 1):
+                for j in range(int(min(y1, y2) // self.cell), int(max(y1, y2) // self.cell) + 1):
+                    dueños = self._cells.get((i, j))
+                    if dueños is None:
+                        dueños = self._cells[(i, j)] = {}
+                    segmentos = dueños.get(owner)
+                    if segmentos is None:
+                        segmentos = dueños[owner] = array("i")
+                    segmentos.append(segmento)
+
+    def near(self, x: float, y: float, radio: float) -> Dict[int, float]:
+        """Dueños con algún segmento a menos de ``radio`` metros y su distancia mínima."""
+        distancias: Dict[int, float] = {}
+        coords = self._coords
+        for minima, celda in sorted(_cells_within(x, y, radio, self.cell)):
+            dueños = self._cells.get(celda)
+            if dueños is None:
+                continue
+            for owner, segmentos in dueños.items():
+                mejor = distancias.get(owner, math.inf)
+                if mejor <= minima:
+                    continue
+                for segmento in segmentos:
+                    k = 4 * segmento
+                    metros = _segment_distance(x, y, coords[k], coords[k + 1], coords[k + 2], coords[k + 3])
+                    if metros < mejor:
+                        mejor = metros
+                if mejor <= radio:
+                    distancias[owner] = mejor
+        return distancias
+
+
+class RouteLocator:
+    """Qué rutas pasan cerca de un punto, construido una vez sobre todos los trazos.
+
+    Indexa cada segmento de cada trazo y las paradas de cada ruta; una
+    consulta sólo mide contra los segmentos de las cubetas dentro del radio,
+    no contra todas las coordenadas de todas las rutas.
+    """
+
+    CELL = 100.0  # m
+
+    def __init__(self, rutas: Iterable[Tuple[str, Sequence[Point], Sequence[Point]]]):
+        rutas = list(rutas)
+        self.projection = LocalProjection.around(lat for _, trazo, _ in rutas for lat, _ in trazo[:1])
+        self.names: List[str] = []
+        self.segments = SegmentGrid(self.CELL)
+        self.stops = PointGrid(self.CELL)
+        self._stop_owner = array("i")
+        for nombre, trazo, paradas in rutas:
+            indice = len(self.names)
+            self.names.append(nombre)
+            puntos = [self.projection.project(p) for p in trazo]
+            if len(puntos) == 1:
+                puntos.append(puntos[0])
+            self.segments.add_polyline(indice, puntos)
+            for parada in paradas:
+                self.stops.add(*self.projection.project(parada))
+                self._stop_owner.append(indice)
+
+    def routes_near(self, punto: Point, radio: float) -> List[Tuple[str, float]]:
+        """Rutas a menos de ``radio`` metros de ``punto``, de la más cercana a la más lejana."""
+        x, y = self.projection.project(punto)
+        distancias = self.segments.near(x, y, radio)
+        # Una parada registrada fuera del trazo también cuenta como paso de la ruta
+        for parada, metros in self.stops.near(x, y, radio):
+            owner = self._stop_owner[parada]
+            if metros < distancias.get(owner, math.inf):
+                distancias[owner] = metros
+        return sorted(((self.names[i], m) for i, m in distancias.items()), key=lambda r: (r[1], r[0]))
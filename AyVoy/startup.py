@@ -0,0 +1,128 @@
+"""Medición del arranque del kiosco: imports y tiempo hasta el primer cuadro.
+
+    python iVoy.py --profile-startup
+    python iVoy.py --profile-startup --profile-output arranque.jsonl
+
+iVoy.py se vuelve a lanzar con ``-X importtime``; el proceso hijo anota
+marcas con perf_counter, pinta la primera pantalla y termina. El padre
+junta las marcas, el tiempo de reloj desde que lanzó al hijo y los imports
+más caros, y si se pide agrega una línea JSON al archivo para comparar
+entre versiones o entre kioscos.
+"""
+import importlib.util
+import json
+import sys
+import time
+from types import ModuleType
+from typing import List, Optional, Tuple
+
+# Prefijo de las líneas con marcas que el proceso hijo escribe en stdout
+MARK_PREFIX = "#arranque "
+FIRST_FRAME = "primer cuadro"
+TOP_IMPORTS = 15
+
+
+def lazy_import(nombre: str) -> ModuleType:
+    """Módulo que se carga de verdad hasta que se usa alguno de sus atributos.
+
+    Para dependencias pesadas que sólo necesita una pantalla: el import
+    queda escrito arriba del archivo pero su costo se paga al abrirla.
+    """
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    spec = importlib.util.find_spec(nombre)
+    if spec is None:
+        raise ModuleNotFoundError(f"No existe el módulo {nombre}", name=nombre)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre] = modulo
+    loader.exec_module(modulo)
+    return modulo
+
+
+class StartupMarks:
+    """Marcas de tiempo en ms desde que se creó el objeto."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.marcas: List[Tuple[str, float]] = []
+
+    def mark(self, nombre: str):
+        self.marcas.append((nombre, (time.perf_counter() - self.inicio) * 1000))
+
+    def emit(self):
+        for nombre, ms in self.marcas:
+            print(f"{MARK_PREFIX}{nombre},{ms:.1f}", flush=True)
+
+
+def importtime_enabled() -> bool:
+    return "importtime" in sys._xoptions
+
+
+def first_frame(root, marcas: StartupMarks):
+    """Para root.after(0, ...): espera a que se pinte la ventana, reporta y cierra."""
+    root.update()
+    marcas.mark(FIRST_FRAME)
+    marcas.emit()
+    root.destroy()
+
+
+def parse_importtime(texto: str) -> List[Tuple[str, int, int]]:
+    """Líneas de ``-X importtime`` como (módulo, µs propios, µs acumulados)."""
+    imports = []
+    for linea in texto.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        campos = linea[len("import time:"):].split("|")
+        if len(campos) != 3 or not campos[0].strip().isdigit():
+            continue  # Encabezado de la tabla
+        # El nombre va sangrado dos espacios por nivel de anidación
+        imports.append((campos[2][1:].rstrip(), int(campos[0]), int(campos[1])))
+    return imports
+
+
+def profile(script: str, output: Optional[str] = None) -> int:
+    import subprocess
+
+    inicio = time.perf_counter()
+    hijo = subprocess.Popen([sys.executable, "-X", "importtime", script, "--profile-startup"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    marcas, primer_cuadro = [], None
+    for linea in hijo.stdout:
+        if linea.startswith(MARK_PREFIX):
+            nombre, ms = linea[len(MARK_PREFIX):].rstrip("\n").rsplit(",", 1)
+            marcas.append((nombre, float(ms)))
+            if nombre == FIRST_FRAME and primer_cuadro is None:
+                primer_cuadro = (time.perf_counter() - inicio) * 1000
+    errores = hijo.stderr.read()
+    hijo.wait()
+    if hijo.returncode != 0 or primer_cuadro is None:
+        print(errores[-2000:], file=sys.stderr)
+        return hijo.returncode or 1
+
+    # Sólo los imports de primer nivel: los anidados ya cuentan en su padre
+    imports = parse_importtime(errores)
+    raiz = [i for i in imports if not i[0].startswith(" ")]
+    caros = sorted(raiz, key=lambda i: i[2], reverse=True)[:TOP_IMPORTS]
+    total_imports = sum(i[2] for i in raiz) / 1000
+
+    print(f"Primer cuadro a los {primer_cuadro:.0f} ms de lanzar el proceso")
+    print(f"Imports: {total_imports:.0f} ms en {len(imports)} módulos")
+    for nombre, ms in marcas:
+        print(f"  {nombre:<20} {ms:8.1f} ms")
+    print("Imports más caros (acumulado):")
+    for modulo, _, acumulado in caros:
+        print(f"  {modulo.strip():<30} {acumulado / 1000:8.1f} ms")
+
+    if output:
+        registro = {
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "primer_cuadro_ms": round(primer_cuadro, 1),
+            "imports_ms": round(total_imports, 1),
+            "marcas": {nombre: ms for nombre, ms in marcas},
+            "imports": {m.strip(): round(a / 1000, 1) for m, _, a in caros},
+        }
+        with open(output, "a", encoding="utf-8") as archivo:
+            archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return 0
@@ -0,0 +1,281 @@
+"""Caché local de teselas del mapa en un archivo MBTiles.
+
+El mapa de Abrir_Mapa pide cada tesela primero a la caché y sólo si falta a
+la red; con TILES_OFFLINE en config.py nunca sale a la red. Para llenar la
+caché antes de instalar un kiosco:
+
+    python tiles.py seed --zoom 11 17
+    python tiles.py seed --bbox 21.80 -102.36 21.96 -102.22 --zoom 11 17
+    python tiles.py import aguascalientes.mbtiles
+
+``import`` acepta MBTiles y también las bases de teselas que genera
+tkintermapview.OfflineLoader. La caché anota en sus metadatos de qué
+servidor son sus teselas y no acepta las de otro. Descargar a granel del servidor público de
+OpenStreetMap va contra su política de uso; para sembrar muchas teselas
+conviene usar un servidor propio con --server.
+"""
+import argparse
+import math
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+from config import TILE_SERVER, TILES_PATH
+
+# Centro de Aguascalientes y alrededores: sur, oeste, norte, este
+DEFAULT_BBOX = (21.80, -102.36, 21.96, -102.22)
+USER_AGENT = "AyVoy"
+
+
+def tile_xy(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """Tesela (x, y) del esquema XYZ que contiene a (lat, lon)."""
+    n = 2 ** zoom
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bbox(bbox: Tuple[float, float, float, float], zoom_min: int,
+                  zoom_max: int) -> Iterator[Tuple[int, int, int]]:
+    sur, oeste, norte, este = bbox
+    for zoom in range(zoom_min, zoom_max + 1):
+        x0, y0 = tile_xy(norte, oeste, zoom)
+        x1, y1 = tile_xy(sur, este, zoom)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield zoom, x, y
+
+
+def fetch_tile(server: str, zoom: int, x: int, y: int, timeout: float = 10.0) -> Optional[bytes]:
+    """Descarga una tesela; None si no hay red o el servidor no la tiene."""
+    url = server.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(zoom))
+    peticion = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            return respuesta.read()
+    except OSError:
+        return None
+
+
+class TileCache:
+    """Teselas en un MBTiles en disco con un LRU en memoria delante.
+
+    El LRU guarda los bytes comprimidos (unos 20 KB por tesela), así que
+    ``memory_size`` teselas caben en pocos MB. tkintermapview pide teselas
+    desde muchos hilos a la vez; cada hilo usa su propia conexión y la base
+    va en WAL para que leer y escribir no se bloqueen entre sí. En MBTiles
+    la fila va invertida (esquema TMS) respecto a la ``y`` del mapa.
+
+    Las teselas se guardan sólo por (zoom, x, y): con ``server`` la caché
+    queda ligada a ese servidor en ``metadata`` y abrirla con otro lanza
+    ValueError, en lugar de mezclar teselas de los dos.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+        CREATE TABLE IF NOT EXISTS tiles (
+            zoom_level INTEGER,
+            tile_column INTEGER,
+            tile_row INTEGER,
+            tile_data BLOB
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);
+    """
+    SQL_GET = "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?"
+    SQL_PUT = "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)"
+    SERVER_KEY = "tile_server"
+
+    def __init__(self, path: str, server: Optional[str] = None, memory_size: int = 512):
+        self.path = path
+        self.server = server
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[Tuple[int, int, int], bytes]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._local = threading.local()
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+        if server is not None:
+            self._bind_server(server)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _bind_server(self, server: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conn.execute("SELECT value FROM metadata WHERE name = ?", (self.SERVER_KEY,)).fetchone()
+            if fila is None:
+                # Una caché anterior a esta marca se queda con el servidor configurado
+                conn.execute("INSERT INTO metadata VALUES (?, ?)", (self.SERVER_KEY, server))
+        finally:
+            conn.execute("COMMIT")
+        if fila is not None and fila[0] != server:
+            raise ValueError(f"{self.path} tiene teselas de {fila[0]}, no de {server}")
+
+    @staticmethod
+    def _row(zoom: int, y: int) -> int:
+        return (2 ** zoom - 1) - y
+
+    def _remember(self, clave: Tuple[int, int, int], data: bytes):
+        with self._memory_lock:
+            self._memory[clave] = data
+            self._memory.move_to_end(clave)
+            if len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, zoom: int, x: int, y: int) -> Optional[bytes]:
+        clave = (zoom, x, y)
+        with self._memory_lock:
+            data = self._memory.get(clave)
+            if data is not None:
+                self._memory.move_to_end(clave)
+                return data
+        fila = self._conn().execute(self.SQL_GET, (zoom, x, self._row(zoom, y))).fetchone()
+        if fila is None:
+            return None
+        self._remember(clave, fila[0])
+        return fila[0]
+
+    def contains(self, zoom: int, x: int, y: int) -> bool:
+        with self._memory_lock:
+            if (zoom, x, y) in self._memory:
+                return True
+        return self._conn().execute(self.SQL_GET, (zoom, x, self._row(zoom, y))).fetchone() is not None
+
+    def put(self, zoom: int, x: int, y: int, data: bytes):
+        self._conn().execute(self.SQL_PUT, (zoom, x, self._row(zoom, y), data))
+        self._remember((zoom, x, y), data)
+
+    def put_many(self, teselas: Iterable[Tuple[int, int, int, bytes]]) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.executemany(self.SQL_PUT, ((z, x, self._row(z, y), data)
+                                                     for z, x, y, data in teselas))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return cursor.rowcount
+
+    def import_file(self, origen: str) -> int:
+        """Copia las teselas de un MBTiles o de una base de OfflineLoader.
+
+        Con ``server`` sólo se copian las de ese servidor: de OfflineLoader
+        las de su columna ``server`` y un MBTiles ligado a otro se rechaza.
+        """
+        conn = self._conn()
+        conn.execute("ATTACH DATABASE ? AS origen", (origen,))
+        try:
+            columnas = {fila[1] for fila in conn.execute("PRAGMA origen.table_info(tiles)")}
+            parametros = ()
+            if "tile_data" in columnas:
+                consulta = ("INSERT OR REPLACE INTO main.tiles SELECT zoom_level, tile_column, "
+                            "tile_row, tile_data FROM origen.tiles")
+                if self.server is not None and conn.execute(
+                        "SELECT 1 FROM origen.sqlite_master WHERE name = 'metadata'").fetchone():
+                    fila = conn.execute("SELECT value FROM origen.metadata WHERE name = ?",
+                                        (self.SERVER_KEY,)).fetchone()
+                    if fila is not None and fila[0] != self.server:
+                        raise ValueError(f"{origen} tiene teselas de {fila[0]}, no de {self.server}")
+            elif "tile_image" in columnas:
+                consulta = ("INSERT OR REPLACE INTO main.tiles SELECT zoom, x, "
+                            "(1 << zoom) - 1 - y, tile_image FROM origen.tiles")
+                if self.server is not None:
+                    consulta += " WHERE server = ?"
+                    parametros = (self.server,)
+            else:
+                raise ValueError(f"{origen} no tiene una tabla de teselas reconocible")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute(consulta, parametros).rowcount
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.execute("DETACH DATABASE origen")
+        return total
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def seed(cache: TileCache, server: str, bbox: Tuple[float, float, float, float],
+         zoom_min: int, zoom_max: int, workers: int = 2) -> Tuple[int, int]:
+    """Descarga las teselas del área que falten. Regresa (descargadas, fallidas)."""
+    faltantes = [t for t in tiles_in_bbox(bbox, zoom_min, zoom_max) if not cache.contains(*t)]
+    descargadas = fallidas = 0
+    lote = []
+    with ThreadPoolExecutor(workers) as pool:
+        for (zoom, x, y), data in zip(faltantes, pool.map(lambda t: fetch_tile(server, *t), faltantes)):
+            if data is None:
+                fallidas += 1
+                continue
+            lote.append((zoom, x, y, data))
+            if len(lote) >= 200:
+                descargadas += cache.put_many(lote)
+                lote = []
+    if lote:
+        descargadas += cache.put_many(lote)
+    return descargadas, fallidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cache", default=TILES_PATH, help="archivo MBTiles de la caché")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    sembrar = comandos.add_parser("seed", help="descarga un área y rango de zoom")
+    sembrar.add_argument("--bbox", type=float, nargs=4, default=DEFAULT_BBOX,
+                         metavar=("SUR", "OESTE", "NORTE", "ESTE"))
+    sembrar.add_argument("--zoom", type=int, nargs=2, default=(11, 17), metavar=("MIN", "MAX"))
+    sembrar.add_argument("--server", default=TILE_SERVER)
+    sembrar.add_argument("--workers", type=int, default=2)
+
+    importar = comandos.add_parser("import", help="copia teselas de un MBTiles u OfflineLoader")
+    importar.add_argument("origen")
+    importar.add_argument("--server", default=TILE_SERVER, help="sólo las teselas de este servidor")
+    args = parser.parse_args()
+
+    try:
+        cache = TileCache(args.cache, args.server)
+    except ValueError as e:
+        parser.error(str(e))
+    inicio = time.perf_counter()
+    if args.comando == "seed":
+        descargadas, fallidas = seed(cache, args.server, tuple(args.bbox),
+                                     args.zoom[0], args.zoom[1], args.workers)
+        print(f"{descargadas} teselas descargadas, {fallidas} fallidas", end="")
+    else:
+        try:
+            importadas = cache.import_file(args.origen)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"{importadas} teselas importadas", end="")
+    print(f" en {time.perf_counter() - inicio:.1f} s; la caché tiene {cache.count()}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
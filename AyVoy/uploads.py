@@ -0,0 +1,83 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+Progress = Callable[[int, int], None]
+
+
+@dataclass
+class UploadEvent:
+    job: int
+    etiqueta: str
+    copiados: int
+    total: int
+    estado: str  # "progreso", "listo" o "error"
+    error: Optional[str] = None
+    resultado: Any = None
+
+
+class UploadQueue:
+    """Subidas de documentos en un pool de hilos, con avance consultable desde Tk.
+
+    Cada subida es una tarea que recibe una función de avance ``(copiados,
+    total)``. Los hilos no tocan widgets: dejan UploadEvent en una cola y la
+    interfaz la vacía con ``poll`` desde ``root.after``. Se pueden encolar
+    varios documentos; corren ``workers`` a la vez y el resto espera su turno.
+    """
+
+    def __init__(self, workers: int = 2):
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="subida")
+        self._events: "queue.Queue[UploadEvent]" = queue.Queue()
+        self._ids = itertools.count(1)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, etiqueta: str, tarea: Callable[[Progress], Any]) -> int:
+        job = next(self._ids)
+        with self._lock:
+            self._pending += 1
+        self._pool.submit(self._run, job, etiqueta, tarea)
+        return job
+
+    def _run(self, job: int, etiqueta: str, tarea: Callable[[Progress], Any]):
+        avance = [0, 0]
+
+        def progreso(copiados: int, total: int):
+            avance[:] = [copiados, total]
+            self._events.put(UploadEvent(job, etiqueta, copiados, total, "progreso"))
+
+        try:
+            resultado = tarea(progreso)
+            evento = UploadEvent(job, etiqueta, avance[1], avance[1], "listo", resultado=resultado)
+        except Exception as e:
+            evento = UploadEvent(job, etiqueta, avance[0], avance[1], "error", str(e))
+        with self._lock:
+            self._pending -= 1
+        self._events.put(evento)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def poll(self) -> List[UploadEvent]:
+        """Eventos desde la última consulta; del avance de cada subida sólo el último."""
+        eventos: List[UploadEvent] = []
+        avance: Dict[int, int] = {}
+        while True:
+            try:
+                evento = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if evento.estado == "progreso" and evento.job in avance:
+                eventos[avance[evento.job]] = evento
+            else:
+                if evento.estado == "progreso":
+                    avance[evento.job] = len(eventos)
+                eventos.append(evento)
+        return eventos
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait)